@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: per-format dict formatting versus the single-pass RepoCompiler catalog."""
+import argparse
+from collections import defaultdict
+import json
+import os
+import sys
+import time
+from typing import Dict, List
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from compile_repository import AppRecord, Catalog, CONFIG, RepoCompiler  # noqa: E402
+
+REPO_CONFIG = {"name": "Bench", "iconURL": "https://example.invalid/icon.png"}
+
+
+def synthetic_apps(count: int, versions: int = 10) -> List[Dict]:
+    return [
+        {
+            "name": f"App{i}",
+            "bundleID": f"com.example.app{i}",
+            "devName": f"Developer {i % 50}",
+            "subtitle": "Synthetic app",
+            "description": "Lorem ipsum " * 20,
+            "category": ("utilities", "games", "tweaks")[i % 3],
+            "icon": "" if i % 4 == 0 else f"https://example.invalid/{i}/icon.png",
+            "screenshots": [f"https://example.invalid/{i}/IMG_{n}.png" for n in range(1, 6)],
+            "versions": [
+                {"version": f"1.{v}", "date": f"2024-01-{v % 28 + 1:02d}", "size": 1000 + v,
+                 "url": f"https://example.invalid/{i}/{v}.ipa"}
+                for v in range(versions)
+            ],
+            "scarletDebs": [],
+            "scarletBackup": True,
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_entry(app: Dict, fmt: str) -> Dict:
+    """The pre-catalog formatter: every format re-reads and re-defaults the raw app.json dict."""
+    icon = app.get('icon') or CONFIG["NO_ICON_PATH"]
+    if fmt == 'scarlet':
+        versions = app.get('versions', [{}])
+        version_data = versions[0] if versions else {}
+        entry = {
+            'name': app.get('name', 'Unnamed App'),
+            'version': version_data.get('version', 'Unknown'),
+            'down': version_data.get('url', ''),
+            'category': app.get('category', 'Other'),
+            'description': app.get('description', ''),
+            'bundleID': app.get('bundleID', 'Unknown'),
+            'icon': icon
+        }
+        if app.get('scarletDebs'):
+            entry['debs'] = app['scarletDebs']
+        if app.get('devName'):
+            entry['dev'] = app['devName']
+        if app.get('screenshots'):
+            entry['screenshots'] = app['screenshots'][:4]
+        if 'scarletBackup' in app:
+            entry['enableBackup'] = app['scarletBackup']
+        return entry
+    entry = {
+        'name': app.get('name', 'Unnamed App'),
+        'bundleIdentifier': app.get('bundleID', 'Unknown'),
+        'developerName': app.get('devName', 'Unknown Developer'),
+        'subtitle': app.get('subtitle', ''),
+        'localizedDescription': app.get('description', ''),
+        'iconURL': icon,
+    }
+    if fmt != 'trollapps':
+        entry['category'] = app.get('category', 'Other')
+    entry['versions'] = [
+        {"version": v.get("version", "Unknown"), "date": v.get("date", ""), "downloadURL": v.get("url", ""),
+         "size": v.get("size", 0)}
+        for v in app.get('versions', [])
+    ]
+    if fmt == 'altstore':
+        entry['screenshots'] = app.get('screenshots', [])[:4]
+    else:
+        entry['screenshotURLs'] = app.get('screenshots', [])[:4]
+        entry['appPermissions'] = {}
+    return entry
+
+
+def legacy_feeds(apps: List[Dict]) -> Dict:
+    categories = defaultdict(list)
+    for app in apps:
+        categories[app.get("category", "Other")].append(legacy_entry(app, 'scarlet'))
+    return {
+        'altstore': [legacy_entry(app, 'altstore') for app in apps],
+        'trollapps': [legacy_entry(app, 'trollapps') for app in apps],
+        'scarlet': dict(categories),
+    }
+
+
+def catalog_feeds(compiler: RepoCompiler, apps: List[Dict]) -> Dict:
+    catalog = Catalog(REPO_CONFIG, [AppRecord.from_config(app) for app in apps], [])
+    scarlet = compiler._format_scarlet(catalog)
+    scarlet.pop("META")
+    return {
+        'altstore': list(compiler._format_altstore(catalog)["apps"]),
+        'trollapps': list(compiler._format_trollapps(catalog)["apps"]),
+        'scarlet': {category: list(entries) for category, entries in scarlet.items()},
+    }
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=str, default="100,1000,10000", help="Comma-separated app counts")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    compiler = RepoCompiler()
+    results = []
+    for size in (int(n) for n in args.sizes.split(",")):
+        apps = synthetic_apps(size)
+        if legacy_feeds(apps) != catalog_feeds(compiler, apps):
+            raise SystemExit(f"Catalog output differs from the legacy formatter at {size} apps")
+        legacy = best_of(args.repeat, legacy_feeds, apps)
+        catalog = best_of(args.repeat, catalog_feeds, compiler, apps)
+        results.append({"apps": size, "legacy_s": legacy, "catalog_s": catalog, "speedup": legacy / catalog})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'apps':>8} {'legacy ms':>10} {'catalog ms':>11} {'speedup':>8}")
+    for r in results:
+        print(f"{r['apps']:>8} {r['legacy_s'] * 1000:>10.1f} {r['catalog_s'] * 1000:>11.1f} {r['speedup']:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
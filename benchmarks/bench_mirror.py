@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""Benchmark IPAMirror against a local download stand-in: concurrency, deduplication, resume and pruning."""
+import argparse
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import logging
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from app_store import AppStore  # noqa: E402
+from ipa_mirror import DOWNLOAD_CHUNK_SIZE, IPAMirror  # noqa: E402
+
+RANGE = re.compile(r"^bytes=(\d+)-$")
+# Interrupted responses stop no earlier than this, two of the mirror's read chunks in
+CUT_MIN = 2 * DOWNLOAD_CHUNK_SIZE
+
+
+class DownloadServer:
+    """Serves /<app>/<tag>/<file> with ETags, Range/If-Range support, latency and optional mid-body disconnects."""
+
+    def __init__(self, size: int, latency: float, shared_every: int):
+        self.size = size
+        self.latency = latency
+        self.shared_every = shared_every
+        # Cut this many responses short after half their body, as a dropped connection would
+        self.truncate = 0
+        self.counts = {"requests": 0, "ranged": 0, "bytes": 0}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_counts(self) -> Dict:
+        with self.lock:
+            counts, self.counts = self.counts, dict.fromkeys(self.counts, 0)
+        return counts
+
+    def body(self, path: str) -> bytes:
+        """Deterministic content; every shared_every-th tag of an app repeats its first release byte for byte."""
+        app, tag, _ = path.strip("/").split("/")
+        if self.shared_every and int(tag) % self.shared_every == 0:
+            tag = "0"
+        return random.Random(f"{app}/{tag}").randbytes(self.size)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                body = server.body(urlparse(self.path).path)
+                etag = '"%s"' % hashlib.sha1(body).hexdigest()
+                start = 0
+                match = RANGE.match(self.headers.get("Range", ""))
+                if match and self.headers.get("If-Range", etag) == etag:
+                    start = int(match.group(1))
+                    if start >= len(body):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(body)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+                else:
+                    self.send_response(200)
+                self.send_header("ETag", etag)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Length", str(len(body) - start))
+                self.end_headers()
+                payload = body[start:]
+                with server.lock:
+                    server.counts["requests"] += 1
+                    server.counts["ranged"] += bool(start)
+                    cut = server.truncate > 0
+                    server.truncate -= cut
+                if cut:
+                    # The client may lose its last partial read, so leave it at least one whole chunk to resume from
+                    payload = payload[:max(len(payload) // 2, CUT_MIN)]
+                    self.close_connection = True
+                self.wfile.write(payload)
+                with server.lock:
+                    server.counts["bytes"] += len(payload)
+
+        return Handler
+
+
+def generate_tree(root: str, server: DownloadServer, apps: int, versions: int):
+    for i in range(apps):
+        app_dir = os.path.join(root, "Apps", f"App{i:04d}")
+        os.makedirs(app_dir)
+        config = {"name": f"App{i:04d}", "bundleID": f"com.example.app{i:04d}", "versions": [
+            {"version": f"1.{n}", "date": f"2024-01-{n % 28 + 1:02d}", "size": 0,
+             "url": f"{server.url}/App{i:04d}/{n}/App.ipa"} for n in range(versions - 1, -1, -1)]}
+        with open(os.path.join(app_dir, "app.json"), "w") as f:
+            json.dump(config, f, indent=4)
+
+
+def run(root: str, workers: int, rewrite: bool = False) -> Dict:
+    mirror = IPAMirror(os.path.join(root, "static", "IPA"), base_url="https://mirror.invalid/IPA", workers=workers)
+    store = AppStore(os.path.join(root, "Apps"))
+    started = time.perf_counter()
+    mirror.mirror(store, rewrite=rewrite)
+    mirror.prune(store)
+    store.save()
+    mirror.save()
+    return {"seconds": time.perf_counter() - started, **mirror.stats}
+
+
+def check_store(root: str, server: DownloadServer):
+    """Every manifest record must name a file whose bytes hash to its recorded SHA-256 and match the source."""
+    mirror_dir = os.path.join(root, "static", "IPA")
+    with open(os.path.join(mirror_dir, "mirror.json")) as f:
+        manifest = json.load(f)
+    for url, record in manifest["urls"].items():
+        with open(os.path.join(mirror_dir, record["file"]), "rb") as f:
+            data = f.read()
+        if hashlib.sha256(data).hexdigest() != record["sha256"] or data != server.body(urlparse(url).path):
+            raise SystemExit(f"Mirrored file for {url} does not match its source")
+    return manifest
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--apps", type=int, default=20, help="Number of synthetic apps")
+    parser.add_argument("--versions", type=int, default=6, help="Versions per app")
+    parser.add_argument("--size", type=int, default=2_000_000, help="Size in bytes of each synthetic IPA")
+    parser.add_argument("--shared-every", type=int, default=3, help="Every n-th release repeats the first one's file")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Latency added to every download")
+    parser.add_argument("--workers", type=str, default="1,8", help="Comma-separated worker counts to compare")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    if args.size <= CUT_MIN:
+        parser.error(f"--size must exceed {CUT_MIN} bytes so interrupted downloads leave something to resume")
+
+    logging.disable(logging.INFO)
+    results = {"cold": []}
+    with DownloadServer(args.size, args.latency_ms / 1000, args.shared_every) as server:
+        for workers in (int(n) for n in args.workers.split(",")):
+            root = tempfile.mkdtemp(prefix="bench-mirror-")
+            try:
+                generate_tree(root, server, args.apps, args.versions)
+                server.reset_counts()
+                cold = run(root, workers)
+                manifest = check_store(root, server)
+                distinct = len({record["sha256"] for record in manifest["urls"].values()})
+                if cold["downloaded"] != distinct or len(os.listdir(os.path.join(root, "static", "IPA"))) != distinct + 2:
+                    raise SystemExit("Identical downloads were not stored once")
+                results["cold"].append({"workers": workers, **cold, "server": server.reset_counts()})
+            finally:
+                shutil.rmtree(root)
+
+        root = tempfile.mkdtemp(prefix="bench-mirror-")
+        try:
+            workers = max(int(n) for n in args.workers.split(","))
+            generate_tree(root, server, args.apps, args.versions)
+            server.truncate = args.apps * args.versions // 2
+            logging.disable(logging.ERROR)
+            interrupted = run(root, workers)
+            logging.disable(logging.INFO)
+            server.reset_counts()
+            resumed = run(root, workers)
+            resumed["server"] = server.reset_counts()
+            check_store(root, server)
+            if resumed["resumed"] != interrupted["failed"] or resumed["failed"]:
+                raise SystemExit("Interrupted downloads were not all resumed")
+            warm = run(root, workers, rewrite=True)
+            for entry in AppStore(os.path.join(root, "Apps")).load().select():
+                del entry.data["versions"][2:]
+                with open(entry.config_path, "w") as f:
+                    json.dump(entry.data, f, indent=4)
+            pruned = run(root, workers)
+            check_store(root, server)
+            results.update({"interrupted": interrupted, "resumed": resumed, "warm": warm, "pruned": pruned})
+        finally:
+            shutil.rmtree(root)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    total = args.apps * args.versions
+    print(f"{total} versions of {args.size} bytes, {args.latency_ms:.0f} ms latency")
+    print(f"{'workers':>8} {'seconds':>8} {'stored':>7} {'deduped':>8} {'MB fetched':>11}")
+    for r in results["cold"]:
+        print(f"{r['workers']:>8} {r['seconds']:>8.2f} {r['downloaded']:>7} {r['deduplicated']:>8} "
+              f"{r['bytes_downloaded'] / 1e6:>11.1f}")
+    resumed = results["resumed"]
+    print(f"\ninterrupted run: {results['interrupted']['failed']} failed; resumed run: {resumed['resumed']} resumed, "
+          f"{resumed['server']['ranged']} ranged requests, {resumed['bytes_downloaded'] / 1e6:.1f} MB fetched")
+    print(f"warm run with --rewrite-urls: {results['warm']['cached']} cached, {results['warm']['seconds']:.2f} s")
+    print(f"after trimming to 2 versions per app: {results['pruned']['pruned']} files pruned")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""End-to-end benchmark: run VersionManager, AssetManager and RepoCompiler over a synthetic Apps/ tree."""
+import argparse
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import io
+import json
+import logging
+import os
+import platform
+import plistlib
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
+import zipfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+from PIL import Image  # noqa: E402
+
+from compile_repository import RepoCompiler  # noqa: E402
+from ipa_metadata import IPAMetadataExtractor  # noqa: E402
+from manage_assets import AssetManager  # noqa: E402
+from manage_versions import VersionManager  # noqa: E402
+
+CATEGORIES = ("utilities", "games", "tweaks", "entertainment", "developer")
+RULES_YAML = """exclude_patterns:
+excluded_extensions:
+- .zip
+- .tar.gz
+- .deb
+preferred_extensions:
+- .tipa
+- .ipa
+remove_chars:
+- -beta
+replace_chars:
+strip_v_prefix: true
+"""
+RELEASES_PATH = re.compile(r"^/repos/([^/]+)/([^/]+)/releases$")
+DOWNLOAD_PATH = re.compile(r"^/(download|objects)/([^/]+)/([^/]+)/([^/]+)/([^/]+)$")
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+
+def parse_size(value: str) -> tuple:
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def noisy_png(size: tuple, seed: int) -> bytes:
+    """A tinted gradient with light noise, so encode times and file sizes resemble real screenshots."""
+    gradient = Image.linear_gradient("L").resize(size)
+    tint = Image.merge("RGB", [gradient.point(lambda v, c=c: (v + seed * c) % 256) for c in (67, 131, 29)])
+    noise = Image.effect_noise(size, 48).convert("RGB")
+    buffer = io.BytesIO()
+    Image.blend(tint, noise, 0.04).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def generate_tree(root: str, apps: int, screenshots: int, icon_size: tuple, screenshot_size: tuple,
+                  palette: int = 8) -> Dict:
+    """Write repo-info.json plus Apps/<name>/{app.json,.rules.yaml,icon.png,screenshots/} for every synthetic app."""
+    shutil.copy(os.path.join(ROOT, "repo-info.json"), os.path.join(root, "repo-info.json"))
+    # Encoding is the slow part, so a small palette of images is rendered once and shared between apps
+    icons = [noisy_png(icon_size, seed) for seed in range(palette)]
+    shots = [noisy_png(screenshot_size, seed) for seed in range(palette)]
+    total_bytes = 0
+    for i in range(apps):
+        name = f"App{i:05d}"
+        app_dir = os.path.join(root, "Apps", name)
+        os.makedirs(os.path.join(app_dir, "screenshots"))
+        config = {
+            "gitURLs": [f"https://github.com/bench{i % 97}/{name}"],
+            "name": name,
+            "bundleID": f"com.bench.{name.lower()}",
+            "devName": f"Developer {i % 97}",
+            "subtitle": "Synthetic benchmark app",
+            "description": "Lorem ipsum dolor sit amet. " * 12,
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "icon": "",
+            "screenshots": [],
+            "versions": [{
+                "version": "1.0",
+                "date": EPOCH.strftime("%Y-%m-%d"),
+                "size": 1_000_000,
+                "url": f"https://github.com/bench{i % 97}/{name}/releases/download/v1.0/{name}.tipa"
+            }],
+            "scarletDebs": [],
+            "scarletBackup": True
+        }
+        with open(os.path.join(app_dir, "app.json"), "w") as f:
+            json.dump(config, f, indent=4)
+        with open(os.path.join(app_dir, ".rules.yaml"), "w") as f:
+            f.write(RULES_YAML)
+        files = [("icon.png", icons[i % palette])]
+        files += [(os.path.join("screenshots", f"shot_{n}.png"), shots[(i + n) % palette]) for n in range(screenshots)]
+        for relative, payload in files:
+            with open(os.path.join(app_dir, relative), "wb") as f:
+                f.write(payload)
+            total_bytes += len(payload)
+    return {"apps": apps, "asset_bytes": total_bytes}
+
+
+@lru_cache(maxsize=64)
+def synthetic_ipa(name: str, tag: str, payload_size: int) -> bytes:
+    """A stored app binary followed by a deflated binary Info.plist, so the plist sits near the end like in real IPAs."""
+    plist = plistlib.dumps({
+        "CFBundleIdentifier": f"com.bench.{name.lower()}",
+        "CFBundleShortVersionString": tag.lstrip("v"),
+        "CFBundleVersion": tag.rsplit(".", 1)[-1],
+        "MinimumOSVersion": "14.0",
+    }, fmt=plistlib.FMT_BINARY)
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        block = random.Random(f"{name}/{tag}").randbytes(64 * 1024)
+        payload = (block * (payload_size // len(block) + 1))[:payload_size]
+        archive.writestr(f"Payload/{name}.app/{name}", payload, compress_type=zipfile.ZIP_STORED)
+        archive.writestr(f"Payload/{name}.app/Info.plist", plist, compress_type=zipfile.ZIP_DEFLATED)
+    return buffer.getvalue()
+
+
+class ReleasesServer:
+    """A stand-in for the GitHub REST and GraphQL release endpoints with paging, ETags and injected latency.
+
+    With ipa_size set, release assets point at range-capable downloads on this server that redirect like
+    GitHub's do, instead of at github.com.
+    """
+
+    def __init__(self, releases: int, per_page: int, latency: float, ipa_size: int = 0):
+        self.releases = releases
+        self.per_page = per_page
+        self.latency = latency
+        self.ipa_size = ipa_size
+        self.counts = {"rest": 0, "not_modified": 0, "graphql": 0, "downloads": 0, "download_bytes": 0}
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_address[1]}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def reset_counts(self) -> Dict:
+        with self.lock:
+            counts, self.counts = self.counts, dict.fromkeys(self.counts, 0)
+        return counts
+
+    def count(self, key: str, amount: int = 1):
+        with self.lock:
+            self.counts[key] += amount
+
+    def ipa_length(self, name: str, tag: str) -> int:
+        # Stored entries make the archive size linear in the payload, so listings need not build every IPA
+        return len(synthetic_ipa(name, tag, 0)) + self.ipa_size
+
+    def release_list(self, owner: str, name: str, start: int, limit: int) -> List[Dict]:
+        """Releases newest first; release n is tagged v1.n so the oldest one matches the generated app.json."""
+        result = []
+        for index in range(start, min(start + limit, self.releases)):
+            n = self.releases - index - 1
+            tag = f"v1.{n}"
+            published = (EPOCH + timedelta(days=n)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            if self.ipa_size:
+                download, size = f"{self.url}/download/{owner}/{name}/{tag}", self.ipa_length(name, tag)
+            else:
+                download, size = f"https://github.com/{owner}/{name}/releases/download/{tag}", 1_000_000 + n
+            result.append({
+                "id": n + 1,
+                "tag_name": tag,
+                "published_at": published,
+                "assets": [
+                    {"name": f"{name}.tipa", "size": size, "browser_download_url": f"{download}/{name}.tipa"},
+                    {"name": f"{name}.ipa", "size": size, "browser_download_url": f"{download}/{name}.ipa"},
+                    {"name": f"{name}-src.zip", "size": 50_000, "browser_download_url": f"{download}/{name}-src.zip"},
+                ]
+            })
+        return result
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def send_json(self, payload, headers: Optional[Dict] = None):
+                body = json.dumps(payload).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.send_header("X-RateLimit-Limit", "1000000")
+                self.send_header("X-RateLimit-Remaining", "999999")
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def send_download(self, kind: str, name: str, tag: str, head: bool = False):
+                if kind == "download":
+                    self.send_response(302)
+                    self.send_header("Location", f"{server.url}{self.path.replace('/download/', '/objects/', 1)}")
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                body = synthetic_ipa(name, tag, server.ipa_size)
+                start, end = 0, len(body) - 1
+                match = RANGE.match(self.headers.get("Range", ""))
+                if match and (match.group(1) or match.group(2)):
+                    first, last = match.groups()
+                    if not first:
+                        start = max(0, len(body) - int(last))
+                    else:
+                        start, end = int(first), min(end, int(last)) if last else end
+                    if start > end:
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(body)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+                else:
+                    self.send_response(200)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Type", "application/octet-stream")
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                if head:
+                    return
+                self.wfile.write(body[start:end + 1])
+                server.count("downloads")
+                server.count("download_bytes", end - start + 1)
+
+            def do_HEAD(self):
+                time.sleep(server.latency)
+                download = DOWNLOAD_PATH.match(urlparse(self.path).path)
+                if not (download and server.ipa_size):
+                    self.send_error(404)
+                    return
+                kind, _, name, tag, _ = download.groups()
+                self.send_download(kind, name, tag, head=True)
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                parsed = urlparse(self.path)
+                download = DOWNLOAD_PATH.match(parsed.path)
+                if download and server.ipa_size:
+                    kind, _, name, tag, _ = download.groups()
+                    self.send_download(kind, name, tag)
+                    return
+                match = RELEASES_PATH.match(parsed.path)
+                if not match:
+                    self.send_error(404)
+                    return
+                page = int(parse_qs(parsed.query).get("page", ["1"])[0])
+                owner, name = match.groups()
+                releases = server.release_list(owner, name, (page - 1) * server.per_page, server.per_page)
+                etag = '"%s"' % hashlib.sha1(json.dumps(releases).encode()).hexdigest()
+                if self.headers.get("If-None-Match") == etag:
+                    server.count("not_modified")
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                    return
+                server.count("rest")
+                headers = {"ETag": etag}
+                if page * server.per_page < server.releases:
+                    headers["Link"] = f'<{server.url}{parsed.path}?page={page + 1}>; rel="next"'
+                self.send_json(releases, headers)
+
+            def do_POST(self):
+                time.sleep(server.latency)
+                server.count("graphql")
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                variables = payload.get("variables", {})
+                first = int(re.search(r"releases\(first: (\d+)", payload["query"]).group(1))
+                data = {}
+                for key in variables:
+                    if not key.startswith("o"):
+                        continue
+                    index = key[1:]
+                    owner, name = variables[key], variables[f"n{index}"]
+                    nodes = [
+                        {
+                            "databaseId": r["id"], "tagName": r["tag_name"], "publishedAt": r["published_at"],
+                            "releaseAssets": {"pageInfo": {"hasNextPage": False}, "nodes": [
+                                {"name": a["name"], "size": a["size"], "downloadUrl": a["browser_download_url"]}
+                                for a in r["assets"]
+                            ]}
+                        }
+                        for r in server.release_list(owner, name, 0, first)
+                    ]
+                    data[f"r{index}"] = {"releases": {"pageInfo": {"hasNextPage": server.releases > first},
+                                                      "nodes": nodes}}
+                self.send_json({"data": data})
+
+        return Handler
+
+
+def timed(name: str, func) -> Dict:
+    started = time.perf_counter()
+    extra = func()
+    return {"stage": name, "seconds": round(time.perf_counter() - started, 4), **extra}
+
+
+def run_versions(root: str, args, server: ReleasesServer, backend: str) -> Dict:
+    ipa_metadata = None
+    if args.ipa_metadata:
+        ipa_metadata = IPAMetadataExtractor(os.path.join(root, ".cache", "ipa_metadata.json"), workers=args.workers)
+    manager = VersionManager(os.path.join(root, "Apps"), workers=args.workers, backend=backend,
+                             cache_path=os.path.join(root, ".cache", "releases_http_cache.json"),
+                             state_path=os.path.join(root, ".cache", "releases_state.json"), ipa_metadata=ipa_metadata)
+    manager.manage("update", keep=args.keep)
+    manager.finish()
+    return {"requests": server.reset_counts(), "counters": manager.metrics.report()["counters"]}
+
+
+def run_assets(root: str, args) -> Dict:
+    manager = AssetManager(os.path.join(root, "Apps"), jobs=args.jobs)
+    manager.manage_icons()
+    manager.finish()
+    return {"counters": manager.metrics.report()["counters"]}
+
+
+def run_compile(root: str, incremental: bool) -> Dict:
+    compiler = RepoCompiler(root_dir=root, output_dir=root, incremental=incremental)
+    compiler.compile_repos()
+    return {"counters": compiler.metrics.report()["counters"]}
+
+
+def run_stages(root: str, args) -> List[Dict]:
+    results = []
+    started = time.perf_counter()
+    tree = generate_tree(root, args.apps, args.screenshots, parse_size(args.icon_size), parse_size(args.screenshot_size))
+    results.append({"stage": "generate", "seconds": round(time.perf_counter() - started, 4), **tree})
+
+    stages = set(args.stages.split(","))
+    os.environ["GITHUB_TOKEN"] = os.environ.get("GITHUB_TOKEN") or "benchmark"
+    ipa_size = args.ipa_size if args.ipa_metadata else 0
+    with ReleasesServer(args.releases, args.per_page, args.latency_ms / 1000, ipa_size=ipa_size) as server:
+        os.environ["GITHUB_API_URL"] = server.url
+        os.environ["GITHUB_GRAPHQL_URL"] = f"{server.url}/graphql"
+        if "versions" in stages:
+            # The second pass exercises the ETag cache and per-repo high-water marks
+            for name in ("versions_cold", "versions_warm"):
+                results.append(timed(name, lambda: run_versions(root, args, server, args.backend)))
+    if "assets" in stages:
+        for name in ("assets_cold", "assets_warm"):
+            results.append(timed(name, lambda: run_assets(root, args)))
+    if "compile" in stages:
+        results.append(timed("compile_full", lambda: run_compile(root, False)))
+        results.append(timed("compile_incremental", lambda: run_compile(root, True)))
+    return results
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results: List[Dict], baseline: Optional[Dict]):
+    previous = {r["stage"]: r["seconds"] for r in baseline["stages"]} if baseline else {}
+    print(f"{'stage':<22} {'seconds':>9} {'baseline':>9} {'change':>8}")
+    for r in results:
+        before = previous.get(r["stage"])
+        if before:
+            print(f"{r['stage']:<22} {r['seconds']:>9.3f} {before:>9.3f} {(r['seconds'] / before - 1) * 100:>+7.1f}%")
+        else:
+            print(f"{r['stage']:<22} {r['seconds']:>9.3f} {'-':>9} {'-':>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--apps", type=int, default=1000, help="Number of synthetic apps")
+    parser.add_argument("--screenshots", type=int, default=3, help="Screenshots per app")
+    parser.add_argument("--icon-size", type=str, default="512x512")
+    parser.add_argument("--screenshot-size", type=str, default="390x844")
+    parser.add_argument("--releases", type=int, default=30, help="Releases published by every synthetic repo")
+    parser.add_argument("--per-page", type=int, default=10, help="Releases per page served by the stand-in API")
+    parser.add_argument("--latency-ms", type=float, default=20, help="Latency added to every stand-in API response")
+    parser.add_argument("--backend", choices=["rest", "graphql"], default="rest")
+    parser.add_argument("--ipa-metadata", action="store_true", help="Serve synthetic IPAs and read their Info.plist via Range requests")
+    parser.add_argument("--ipa-size", type=int, default=20_000_000, help="Size in bytes of each synthetic IPA")
+    parser.add_argument("--workers", type=int, default=8, help="VersionManager workers")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="AssetManager processes")
+    parser.add_argument("--keep", type=int, default=5, help="Versions kept per app")
+    parser.add_argument("--stages", type=str, default="versions,assets,compile", help="Comma-separated stages to run")
+    parser.add_argument("--output", type=str, help="Write results as JSON to this file")
+    parser.add_argument("--compare", type=str, help="Results JSON from an earlier run to compare against")
+    parser.add_argument("--keep-tree", action="store_true", help="Leave the generated tree on disk")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Show the scripts' own logging")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        logging.disable(logging.INFO)
+    root = tempfile.mkdtemp(prefix="bench-pipeline-")
+    try:
+        results = run_stages(root, args)
+    finally:
+        if args.keep_tree:
+            print(f"Synthetic tree kept at {root}", file=sys.stderr)
+        else:
+            shutil.rmtree(root, ignore_errors=True)
+
+    report = {
+        "revision": git_revision(),
+        "created": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "parameters": {k: v for k, v in vars(args).items() if k not in ("output", "compare", "keep_tree", "verbose")},
+        "stages": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if baseline.get("parameters") != report["parameters"]:
+            print(f"Warning: {args.compare} was run with different parameters", file=sys.stderr)
+    print_table(results, baseline)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: per-asset .rules.yaml list scans versus CompiledRules matchers on large release lists."""
+import argparse
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict, List
+
+import yaml
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from release_rules import CompiledRules, RulesCache, TEMPLATE  # noqa: E402
+
+RULE_SETS = {
+    "template": TEMPLATE,
+    "chained": {"strip_v_prefix": True, "replace_chars": {"-": "_", "_": "."}, "remove_chars": ["-rc"],
+                "exclude_patterns": ["nightly", "Debug"]},
+    "empty": {},
+}
+SUFFIXES = [".ipa", ".tipa", ".zip", ".tar.gz", ".deb", ".IPA", ".dSYM.zip"]
+TAG_SUFFIXES = ["", "-beta", "-beta.2", "-alpha", "_hotfix", "-dev", "-nightly", "-debug", "-rc1"]
+
+
+def synthetic_releases(count: int, assets: int, seed: int = 0) -> List[Dict]:
+    rng = random.Random(seed)
+    return [
+        {
+            "tag_name": f"{rng.choice(['v', 'V', ''])}{i // 100}.{i // 10 % 10}.{i % 10}{rng.choice(TAG_SUFFIXES)}",
+            "published_at": f"2024-01-{i % 28 + 1:02d}T00:00:00Z",
+            "assets": [{"name": f"App-{i}-{n}{rng.choice(SUFFIXES)}", "size": rng.randint(1, 10 ** 8),
+                        "browser_download_url": f"https://example.invalid/{i}/{n}"} for n in range(assets)],
+        }
+        for i in range(count)
+    ]
+
+
+def legacy_scan(releases: List[Dict], rules: Dict) -> List:
+    """The previous VersionManager checks, evaluated per asset."""
+    def include(asset):
+        name = asset['name'].lower()
+        if rules.get('excluded_extensions') and any(name.endswith(ext) for ext in rules['excluded_extensions']):
+            return False
+        if rules.get('preferred_extensions'):
+            return any(name.endswith(ext) for ext in rules['preferred_extensions'])
+        return name.endswith(('.tipa', '.ipa'))
+
+    def format_version(version):
+        if rules.get('strip_v_prefix', False) and version.lower().startswith('v'):
+            version = version[1:]
+        if rules.get('remove_chars'):
+            for char in rules['remove_chars']:
+                version = version.replace(char, '')
+        if rules.get('replace_chars'):
+            for char, replacement in rules['replace_chars'].items():
+                version = version.replace(char, replacement)
+        return version.strip()
+
+    found = []
+    for release in releases:
+        for asset in release['assets']:
+            if include(asset):
+                version = format_version(release['tag_name'])
+                if rules.get('exclude_patterns') and any(p.lower() in version.lower() for p in rules['exclude_patterns']):
+                    continue
+                found.append((version, asset['browser_download_url']))
+    return found
+
+
+def compiled_scan(releases: List[Dict], rules: CompiledRules) -> List:
+    """The same checks as VersionManager._scan_releases now makes them: filter assets, then one tag per release."""
+    found = []
+    for release in releases:
+        assets = [asset for asset in release['assets'] if rules.include_asset(asset['name'])]
+        if not assets:
+            continue
+        version = rules.format_version(release['tag_name'])
+        if rules.excludes(version):
+            continue
+        found.extend((version, asset['browser_download_url']) for asset in assets)
+    return found
+
+
+def load_rules(apps: int) -> Dict:
+    """Time loading one identical .rules.yaml per app with PyYAML versus a cold and a warm RulesCache."""
+    root = tempfile.mkdtemp(prefix="bench-rules-")
+    try:
+        for i in range(apps):
+            app_dir = os.path.join(root, f"App{i:05d}")
+            os.makedirs(app_dir)
+            with open(os.path.join(app_dir, ".rules.yaml"), "w") as f:
+                yaml.dump(TEMPLATE if i % 10 else {**TEMPLATE, "exclude_patterns": [f"skip{i}"]}, f)
+        dirs = sorted(os.path.join(root, name) for name in os.listdir(root))
+        started = time.perf_counter()
+        for app_dir in dirs:
+            with open(os.path.join(app_dir, ".rules.yaml")) as f:
+                CompiledRules(yaml.safe_load(f) or {})
+        pyyaml = time.perf_counter() - started
+        cache_path = os.path.join(root, "rules_cache.json")
+        timings = []
+        for _ in range(2):
+            cache = RulesCache(cache_path)
+            started = time.perf_counter()
+            for app_dir in dirs:
+                cache.load(app_dir)
+            timings.append(time.perf_counter() - started)
+            cache.save()
+        return {"apps": apps, "pyyaml_s": pyyaml, "cache_cold_s": timings[0], "cache_warm_s": timings[1]}
+    finally:
+        shutil.rmtree(root)
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--releases", type=int, default=2000, help="Releases per synthetic repo")
+    parser.add_argument("--assets", type=int, default=6, help="Assets per release")
+    parser.add_argument("--apps", type=int, default=500, help="Apps for the rules loading comparison")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    releases = synthetic_releases(args.releases, args.assets)
+    results = []
+    for name, rules in RULE_SETS.items():
+        if legacy_scan(releases, rules) != compiled_scan(releases, CompiledRules(rules)):
+            raise SystemExit(f"Compiled rules disagree with the legacy checks for the {name} rule set")
+        legacy = best_of(args.repeat, legacy_scan, releases, rules)
+        # A fresh CompiledRules per run, so compiling and the cold tag memo are part of the timing
+        compiled = best_of(args.repeat, lambda: compiled_scan(releases, CompiledRules(rules)))
+        results.append({"rules": name, "assets": args.releases * args.assets, "legacy_s": legacy,
+                        "compiled_s": compiled, "speedup": legacy / compiled})
+    loading = load_rules(args.apps)
+
+    if args.json:
+        print(json.dumps({"scan": results, "load": loading}, indent=2))
+        return
+    print(f"{'rules':>9} {'assets':>7} {'legacy ms':>10} {'compiled ms':>12} {'speedup':>8}")
+    for r in results:
+        print(f"{r['rules']:>9} {r['assets']:>7} {r['legacy_s'] * 1000:>10.1f} {r['compiled_s'] * 1000:>12.1f} "
+              f"{r['speedup']:>7.2f}x")
+    print(f"\nloading {loading['apps']} rules files: PyYAML {loading['pyyaml_s'] * 1000:.1f} ms, "
+          f"cache cold {loading['cache_cold_s'] * 1000:.1f} ms, warm {loading['cache_warm_s'] * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
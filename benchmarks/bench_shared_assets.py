@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Benchmark: AssetManager with per-app copies versus the shared asset store on apps that ship as variants."""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from typing import Dict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from PIL import Image  # noqa: E402
+
+from manage_assets import AssetManager  # noqa: E402
+
+
+def noisy_jpeg(path: str, size: tuple, seed: int):
+    """A screenshot-like image whose bytes depend only on the seed."""
+    rng = random.Random(seed)
+    img = Image.new("RGB", size, tuple(rng.randrange(256) for _ in range(3)))
+    noise = Image.frombytes("RGB", (size[0] // 8, size[1] // 8), rng.randbytes(size[0] // 8 * size[1] // 8 * 3))
+    img.paste(noise.resize(size, Image.Resampling.NEAREST), (0, 0), Image.new("L", size, 48))
+    img.save(path, "JPEG", quality=90)
+
+
+def generate_tree(root: str, groups: int, variants: int, screenshots: int, size: tuple):
+    """groups x variants apps; the variants of a group upload byte-identical screenshots, as forks of one app do."""
+    for group in range(groups):
+        sources = []
+        for n in range(screenshots):
+            path = os.path.join(root, "sources", f"{group}_{n}.jpg")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            noisy_jpeg(path, size, group * 100 + n)
+            sources.append(path)
+        for variant in range(variants):
+            name = f"App{group:03d}({variant})"
+            shots_dir = os.path.join(root, "Apps", name, "screenshots")
+            os.makedirs(shots_dir)
+            for n, source in enumerate(sources):
+                shutil.copyfile(source, os.path.join(shots_dir, f"shot{n}.jpg"))
+            with open(os.path.join(root, "Apps", name, "app.json"), "w") as f:
+                json.dump({"name": name, "bundleID": f"com.example.app{group}.v{variant}", "versions": []}, f, indent=4)
+
+
+def tree_bytes(path: str) -> int:
+    """Bytes of regular files under path, not following symlinks."""
+    return sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(path) for f in files
+               if not os.path.islink(os.path.join(d, f)))
+
+
+def run(root: str, shared: bool, jobs: int, variant: str) -> Dict:
+    manager = AssetManager(os.path.join(root, "Apps"), jobs=jobs, variant=variant,
+                           shared_dir=os.path.join(root, "static", "shared") if shared else None)
+    started = time.perf_counter()
+    manager.manage_icons()
+    manager.finish()
+    seconds = time.perf_counter() - started
+    result = {"seconds": seconds, "apps_bytes": tree_bytes(os.path.join(root, "Apps")),
+              "shared_bytes": tree_bytes(os.path.join(root, "static", "shared")), **manager.stats}
+    if shared:
+        result.update(reused=manager.shared.stats["reused_conversions"], saved=manager.shared.bytes_saved())
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--groups", type=int, default=6, help="Distinct apps")
+    parser.add_argument("--variants", type=int, default=3, help="Variants of every app, sharing its screenshots")
+    parser.add_argument("--screenshots", type=int, default=4, help="Screenshots per app")
+    parser.add_argument("--size", type=str, default="390x844", help="Screenshot size")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="AssetManager processes")
+    parser.add_argument("--variant", choices=["webp", "jpeg"], default="webp", help="Lossy variant to publish")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    size = tuple(int(n) for n in args.size.lower().split("x"))
+    results = {}
+    for mode in ("per_app", "shared"):
+        root = tempfile.mkdtemp(prefix="bench-shared-assets-")
+        try:
+            generate_tree(root, args.groups, args.variants, args.screenshots, size)
+            results[mode] = run(root, mode == "shared", args.jobs, args.variant)
+        finally:
+            shutil.rmtree(root)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    apps = args.groups * args.variants
+    print(f"{apps} apps in groups of {args.variants}, {args.screenshots} screenshots of {args.size} each")
+    print(f"{'mode':>8} {'seconds':>8} {'converted':>10} {'reused':>7} {'Apps/ MB':>9} {'shared MB':>10}")
+    for mode, r in results.items():
+        print(f"{mode:>8} {r['seconds']:>8.2f} {r['converted'] - r.get('reused', 0):>10} {r.get('reused', 0):>7} "
+              f"{r['apps_bytes'] / 1e6:>9.2f} {r['shared_bytes'] / 1e6:>10.2f}")
+    print(f"\nshared store reports {results['shared']['saved'] / 1e6:.2f} MB saved")
+
+
+if __name__ == "__main__":
+    main()
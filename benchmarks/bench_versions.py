@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""Micro-benchmark: date-sorted list merging versus VersionIndex for apps with thousands of releases."""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+from version_index import VersionIndex, version_key  # noqa: E402
+
+
+def synthetic_versions(count: int, seed: int = 0) -> List[Dict]:
+    """Releases newest first, several per day, with pre-release and zero-padded tags mixed in."""
+    rng = random.Random(seed)
+    versions = []
+    for i in range(count):
+        major, minor, patch = i // 400, i // 20 % 20, i % 20
+        tag = f"{major}.{minor}.{patch}"
+        if i % 7 == 0:
+            tag += f".rc{i % 3 + 1}"
+        elif i % 11 == 0:
+            tag += ".0"
+        day = i // 3
+        versions.append({
+            "version": tag,
+            "date": f"{2015 + day // 336}-{day // 28 % 12 + 1:02d}-{day % 28 + 1:02d}",
+            "size": rng.randint(1_000_000, 90_000_000),
+            "url": f"https://example.invalid/releases/{tag}/App.ipa",
+        })
+    versions.reverse()
+    return versions
+
+
+def split(versions: List[Dict], existing: int) -> Tuple[List[Dict], List[Dict]]:
+    """The oldest `existing` releases are already in app.json; the rest arrive as new."""
+    return versions[-existing:], versions[:-existing]
+
+
+def legacy_merge(existing: List[Dict], new: List[Dict], keep: int) -> Tuple[List[Dict], int]:
+    """The previous _process_versions: sort by date string only, then count additions with a list scan."""
+    kept = sorted(existing + new, key=lambda x: x['date'], reverse=True)[:keep]
+    return kept, len([v for v in kept if v in new])
+
+
+def index_merge(existing: List[Dict], new: List[Dict], keep: int) -> Tuple[List[Dict], int]:
+    index = VersionIndex(existing)
+    added = [v for v in new if index.add(v)]
+    kept = index.newest(keep)
+    retained = {id(v) for v in kept}
+    return kept, len([v for v in added if id(v) in retained])
+
+
+def best_of(repeat: int, func, *args) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(*args)
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--releases", type=str, default="100,1000,5000", help="Comma-separated release counts per app")
+    parser.add_argument("--keep", type=int, default=5000, help="Versions kept after merging")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    results = []
+    for count in (int(n) for n in args.releases.split(",")):
+        existing, new = split(synthetic_versions(count), count // 2)
+        kept, _ = index_merge(existing, new, args.keep)
+        keys = [version_key(v['version']) for v in kept]
+        if keys != sorted(keys, reverse=True):
+            raise SystemExit(f"VersionIndex retention is not ordered by version at {count} releases")
+        legacy = best_of(args.repeat, legacy_merge, existing, new, args.keep)
+        indexed = best_of(args.repeat, index_merge, existing, new, args.keep)
+        results.append({"releases": count, "legacy_s": legacy, "index_s": indexed, "speedup": legacy / indexed})
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'releases':>9} {'legacy ms':>10} {'index ms':>9} {'speedup':>8}")
+    for r in results:
+        print(f"{r['releases']:>9} {r['legacy_s'] * 1000:>10.2f} {r['index_s'] * 1000:>9.2f} {r['speedup']:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
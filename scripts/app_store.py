@@ -0,0 +1,120 @@
+"""In-memory store of every Apps/<name>/app.json, shared by the pipeline stages and written back once."""
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import json_io
+
+
+class AppEntry:
+    """One app's parsed config plus the fingerprint of the bytes it was loaded from or last saved as."""
+    __slots__ = ('name', 'dir', 'config_path', 'data', 'fingerprint', 'dirty')
+
+    def __init__(self, name: str, app_dir: str, config_path: str, data: Dict, fingerprint: Dict):
+        self.name = name
+        self.dir = app_dir
+        self.config_path = config_path
+        self.data = data
+        self.fingerprint = fingerprint
+        self.dirty = False
+
+
+class AppStore:
+    def __init__(self, apps_root: str, workers: Optional[int] = None):
+        self.apps_root = apps_root
+        self.workers = workers
+        self.logger = logging.getLogger("AppStore")
+        self.lock = threading.Lock()
+        self.entries: Dict[str, AppEntry] = {}
+        self.loaded = False
+        self.stats = {'loaded': 0, 'written': 0, 'bytes_read': 0, 'bytes_written': 0}
+
+    def load(self) -> 'AppStore':
+        """Read and parse every app.json once, in parallel; later calls are no-ops."""
+        if self.loaded:
+            return self
+        names = [name for name in sorted(os.listdir(self.apps_root))
+                 if os.path.isfile(os.path.join(self.apps_root, name, 'app.json'))]
+        for entry, size in json_io.map_ordered(self._read, names, self.workers):
+            if entry:
+                self.entries[entry.name] = entry
+                self.stats['bytes_read'] += size
+        self.stats['loaded'] = len(self.entries)
+        self.loaded = True
+        return self
+
+    def _read(self, name: str) -> Tuple[Optional[AppEntry], int]:
+        app_dir = os.path.join(self.apps_root, name)
+        config_path = os.path.join(app_dir, 'app.json')
+        try:
+            with open(config_path, 'rb') as f:
+                raw = f.read()
+                stat = os.fstat(f.fileno())
+            data = json_io.loads(raw)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self.logger.error(f"Invalid JSON in config for {name}: {str(e)}")
+            return None, 0
+        except (IOError, PermissionError) as e:
+            self.logger.error(f"Error reading config for {name}: {str(e)}")
+            return None, 0
+        if not isinstance(data, dict):
+            self.logger.error(f"Invalid config for {name}: expected a JSON object")
+            return None, 0
+        fingerprint = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': hashlib.sha256(raw).hexdigest()}
+        return AppEntry(name, app_dir, config_path, data, fingerprint), len(raw)
+
+    def get(self, name: str) -> Optional[AppEntry]:
+        return self.entries.get(name)
+
+    def select(self, target: Optional[str] = None) -> List[AppEntry]:
+        """Entries in name order, or just the target app when one is given."""
+        if target:
+            return [self.entries[target]] if target in self.entries else []
+        return list(self.entries.values())
+
+    def mark_dirty(self, name: str):
+        with self.lock:
+            self.entries[name].dirty = True
+
+    def save(self) -> int:
+        """Atomically write each dirty app.json whose serialized form changed; return how many were written."""
+        dirty = [entry for entry in self.entries.values() if entry.dirty]
+        sizes = [size for size in json_io.map_ordered(self._write, dirty, self.workers) if size is not None]
+        self.stats['bytes_written'] += sum(sizes)
+        self.stats['written'] += len(sizes)
+        return len(sizes)
+
+    def _write(self, entry: AppEntry) -> Optional[int]:
+        """Bytes written for one entry, or None when it was unchanged or could not be saved."""
+        raw = json_io.dumps_bytes(entry.data, indent=4)
+        digest = hashlib.sha256(raw).hexdigest()
+        entry.dirty = False
+        if digest == entry.fingerprint['sha256']:
+            return None
+        tmp_path = os.path.join(entry.dir, '.app.json.tmp')
+        try:
+            with open(tmp_path, 'wb') as f:
+                f.write(raw)
+            os.replace(tmp_path, entry.config_path)
+        except (IOError, PermissionError) as e:
+            self.logger.error(f"Failed to save config {entry.config_path}: {str(e)}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return None
+        stat = os.stat(entry.config_path)
+        entry.fingerprint = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest}
+        return len(raw)
+
+
+def stage_store(apps_root: str, store: Optional[AppStore] = None) -> Tuple[AppStore, bool]:
+    """The store a stage works on and whether the stage owns it.
+
+    A store passed in belongs to the caller (the pipeline), which writes it back after every stage has run;
+    otherwise the stage reads Apps/ itself and writes its changes back in finish().
+    """
+    if store is not None:
+        return store, False
+    return AppStore(apps_root), True
@@ -0,0 +1,198 @@
+"""Content-addressed store under static/shared for processed images that several apps publish.
+
+Each distinct image is kept once as <sha256>.<ext>; the per-app copies AssetManager works on become
+relative symlinks to it and every app publishes the shared URL. index.json records which app
+assets use each stored image and which source images were already converted with which options.
+"""
+import logging
+import os
+import shutil
+from typing import Dict, Optional, Tuple
+
+from PIL import Image, ImageChops
+
+import json_io
+
+SHARED_BASE_URL = "https://raw.githubusercontent.com/DRKCTRL/DRKSRC/main/static/shared"
+INDEX_NAME = 'index.json'
+# 16x16 difference hash: 256 bits, fine enough that distinct screenshots of one app rarely come close
+HASH_SIZE = 16
+# Near-duplicate candidates are confirmed on grayscale thumbnails: no pixel may differ by more than this
+THUMBNAIL_SIZE = (128, 128)
+PIXEL_TOLERANCE = 24
+
+
+def perceptual_hash(path: str) -> str:
+    """Difference hash of an image as a hex string; re-encodes and small resizes land within a few bits."""
+    with Image.open(path) as img:
+        gray = img.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX)
+    pixels = gray.tobytes()
+    value = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            value = value << 1 | (pixels[offset + col] > pixels[offset + col + 1])
+    return f"{value:0{HASH_SIZE * HASH_SIZE // 4}x}"
+
+
+def hash_distance(a: str, b: str) -> int:
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+def same_picture(path: str, other: str) -> bool:
+    """Whether two images look the same at thumbnail scale, which tells re-encodes apart from similar screens."""
+    with Image.open(path) as a, Image.open(other) as b:
+        if a.size != b.size:
+            return False
+        thumbs = [img.convert('L').resize(THUMBNAIL_SIZE, Image.Resampling.BOX) for img in (a, b)]
+    return ImageChops.difference(*thumbs).getextrema()[1] <= PIXEL_TOLERANCE
+
+
+class SharedAssetStore:
+    def __init__(self, store_dir: str, base_url: str = SHARED_BASE_URL, near_duplicates: Optional[int] = None):
+        if near_duplicates is not None and near_duplicates < 0:
+            raise ValueError("near_duplicates must be a non-negative number of bits")
+        self.store_dir = store_dir
+        self.base_url = base_url.rstrip('/')
+        self.near_duplicates = near_duplicates
+        self.index_path = os.path.join(store_dir, INDEX_NAME)
+        self.logger = logging.getLogger("SharedAssetStore")
+        self.index = self._load()
+        self.stats = {'stored': 0, 'linked': 0, 'near_duplicates': 0, 'reused_conversions': 0, 'pruned': 0}
+
+    def _load(self) -> Dict:
+        index = json_io.read_json(self.index_path, self.logger, 'shared asset index')
+        if isinstance(index, dict) and isinstance(index.get('assets'), dict):
+            index.setdefault('sources', {})
+            return index
+        return {'assets': {}, 'sources': {}}
+
+    def save(self) -> bool:
+        return json_io.write_json(self.index_path, self.index, indent=4, sort_keys=True) is not None
+
+    def _path(self, asset: Dict) -> str:
+        return os.path.join(self.store_dir, asset['file'])
+
+    @staticmethod
+    def _record(asset: Dict) -> Dict:
+        return {key: asset[key] for key in ('sha256', 'size', 'mode')}
+
+    def _existing(self, digest: str) -> Optional[Dict]:
+        asset = self.index['assets'].get(digest)
+        return asset if asset and os.path.isfile(self._path(asset)) else None
+
+    def _near_duplicate(self, path: str, record: Dict, phash: str) -> Optional[Dict]:
+        """A stored image of the same format and dimensions whose hash is within the threshold and whose pixels agree."""
+        ext = os.path.splitext(path)[1].lower()
+        for asset in self.index['assets'].values():
+            if asset['size'] != record['size'] or not asset['file'].endswith(ext) or not os.path.isfile(self._path(asset)):
+                continue
+            if 'phash' not in asset:
+                asset['phash'] = perceptual_hash(self._path(asset))
+            if hash_distance(phash, asset['phash']) <= self.near_duplicates and same_picture(path, self._path(asset)):
+                return asset
+        return None
+
+    def _store(self, path: str, record: Dict, phash: Optional[str] = None) -> Dict:
+        os.makedirs(self.store_dir, exist_ok=True)
+        digest = record['sha256']
+        name = f"{digest}{os.path.splitext(path)[1].lower()}"
+        tmp_path = os.path.join(self.store_dir, f".{name}.tmp")
+        shutil.copyfile(path, tmp_path)
+        os.replace(tmp_path, os.path.join(self.store_dir, name))
+        asset = {'sha256': digest, 'size': record['size'], 'mode': record['mode'], 'file': name,
+                 'bytes': os.path.getsize(os.path.join(self.store_dir, name)), 'users': []}
+        if phash:
+            asset['phash'] = phash
+        self.index['assets'][digest] = asset
+        self.stats['stored'] += 1
+        return asset
+
+    def _link(self, path: str, target: str):
+        """Replace a per-app file with a relative symlink to the stored copy; where links fail the copy stays."""
+        if os.path.islink(path) and os.path.realpath(path) == os.path.realpath(target):
+            return
+        link_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.link")
+        try:
+            if os.path.lexists(link_path):
+                os.remove(link_path)
+            os.symlink(os.path.relpath(target, os.path.dirname(path)), link_path)
+            os.replace(link_path, path)
+            self.stats['linked'] += 1
+        except OSError as e:
+            self.logger.warning(f"Keeping a copy of {path}: {str(e)}")
+
+    def share(self, app_name: str, relative_path: str, path: str, record: Dict) -> Tuple[str, Dict]:
+        """Publish a processed image from the store; returns its shared URL and the record of the stored image.
+
+        The record differs from the one passed in only when a near-duplicate replaced the app's image.
+        """
+        asset = self._existing(record['sha256'])
+        phash = None
+        if asset is None and self.near_duplicates is not None:
+            phash = perceptual_hash(path)
+            asset = self._near_duplicate(path, record, phash)
+            if asset is not None:
+                self.stats['near_duplicates'] += 1
+                self.logger.info(f"{app_name}/{relative_path} is a near-duplicate of {asset['file']}")
+        if asset is None:
+            asset = self._store(path, record, phash)
+        self._link(path, self._path(asset))
+        user = f"{app_name}/{relative_path}"
+        if user not in asset['users']:
+            asset['users'] = sorted(asset['users'] + [user])
+        return f"{self.base_url}/{asset['file']}", self._record(asset)
+
+    def release(self, app_name: str):
+        """Forget an app's claims before it publishes again, so images it dropped can be pruned."""
+        prefix = f"{app_name}/"
+        for asset in self.index['assets'].values():
+            asset['users'] = [user for user in asset['users'] if not user.startswith(prefix)]
+
+    def conversion(self, source_key: str) -> Optional[Tuple[Dict, Optional[Dict]]]:
+        """Stored (record, variant record) produced earlier from the same source image and options, if still stored."""
+        entry = self.index['sources'].get(source_key)
+        if not entry:
+            return None
+        record = self._existing(entry['record'])
+        variant = self._existing(entry['variant']) if entry.get('variant') else None
+        if record is None or (entry.get('variant') and variant is None):
+            return None
+        return self._record(record), self._record(variant) if variant else None
+
+    def remember_conversion(self, source_key: str, record: Dict, variant_record: Optional[Dict] = None):
+        self.index['sources'][source_key] = {'record': record['sha256'],
+                                             'variant': variant_record['sha256'] if variant_record else None}
+
+    def stored_path(self, record: Dict) -> str:
+        return self._path(self.index['assets'][record['sha256']])
+
+    def prune(self, apps_root: str) -> int:
+        """Delete stored images no existing app uses any more; return how many were removed."""
+        removed = 0
+        for digest, asset in list(self.index['assets'].items()):
+            asset['users'] = [user for user in asset['users']
+                              if os.path.isdir(os.path.join(apps_root, user.split('/', 1)[0]))]
+            if asset['users']:
+                continue
+            if os.path.isfile(self._path(asset)):
+                os.remove(self._path(asset))
+            del self.index['assets'][digest]
+            removed += 1
+        assets = self.index['assets']
+        self.index['sources'] = {key: entry for key, entry in self.index['sources'].items()
+                                 if entry['record'] in assets and (not entry.get('variant') or entry['variant'] in assets)}
+        self.stats['pruned'] += removed
+        return removed
+
+    def bytes_saved(self) -> int:
+        """Bytes the apps' references would take as separate copies, minus the one stored copy of each image."""
+        return sum(asset['bytes'] * (len(asset['users']) - 1) for asset in self.index['assets'].values() if asset['users'])
+
+    def summary(self) -> str:
+        assets = self.index['assets'].values()
+        references = sum(len(asset['users']) for asset in assets)
+        return (f"Shared assets: {references} references to {len(self.index['assets'])} stored images "
+                f"({self.stats['stored']} new, {self.stats['near_duplicates']} near-duplicates, "
+                f"{self.stats['reused_conversions']} conversions reused, {self.stats['pruned']} pruned), "
+                f"{self.bytes_saved()} bytes saved")
@@ -1,14 +1,24 @@
 #!/usr/bin/env python3
 import argparse
 from collections import defaultdict
-from datetime import datetime
+from collections.abc import Iterator
+from datetime import datetime, timezone
+import gzip
+import hashlib
 import json
 import logging
 import os
 from pathlib import Path
 import random
+import re
 import sys
-from typing import Dict, List, Optional, Tuple
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app_store import AppEntry, AppStore
+import json_io
+from metrics import Metrics, profiled
+from upstream_feeds import UpstreamFeeds
 
 CONFIG = {
     "NO_ICON_PATH": "https://raw.githubusercontent.com/DRKCTRL/DRKSRC/main/static/assets/no-icon.png",
@@ -16,7 +26,11 @@ CONFIG = {
         "altstore": "altstore.json",
         "trollapps": "trollapps.json",
         "scarlet": "scarlet.json"
-    }
+    },
+    # Optional per-app output: SHARD_DIR/index.json, SHARD_DIR/changes.json and SHARD_DIR/apps/<bundleID>.json
+    "SHARD_DIR": "shards",
+    # Bump whenever AppRecord changes so cached records from older builds are discarded
+    "BUILD_CACHE_VERSION": 3
 }
 
 def configure_logging(verbose: bool = False) -> logging.Logger:
@@ -27,82 +41,391 @@ def configure_logging(verbose: bool = False) -> logging.Logger:
     )
     return logging.getLogger(__name__)
 
+class JSONFragment(str):
+    """Feed entry that is already serialized at list depth and is written verbatim."""
+
+class AppRecord:
+    """One app.json normalized once, with every default applied, for all output formats to project from."""
+    __slots__ = ('name', 'bundle_id', 'developer', 'dev_name', 'subtitle', 'description', 'category', 'icon',
+                 'versions', 'plain_versions', 'screenshots', 'scarlet_debs', 'has_scarlet_backup', 'scarlet_backup')
+
+    def __init__(self, name: str, bundle_id: str, developer: str, dev_name: Optional[str], subtitle: str,
+                 description: str, category: str, icon: str, versions: List[Dict], plain_versions: List[Dict],
+                 screenshots: List[str], scarlet_debs: Optional[List], has_scarlet_backup: bool,
+                 scarlet_backup: Optional[bool]):
+        self.name = name
+        self.bundle_id = bundle_id
+        self.developer = developer
+        self.dev_name = dev_name
+        self.subtitle = subtitle
+        self.description = description
+        self.category = category
+        self.icon = icon
+        # Already in feed shape; AltStore serializes versions, TrollApps the same dicts unless checksums had to be dropped
+        self.versions = versions
+        self.plain_versions = plain_versions
+        self.screenshots = screenshots
+        self.scarlet_debs = scarlet_debs
+        self.has_scarlet_backup = has_scarlet_backup
+        self.scarlet_backup = scarlet_backup
+
+    @classmethod
+    def from_config(cls, app: Dict) -> 'AppRecord':
+        get = app.get
+        versions = [
+            {
+                "version": v.get("version", "Unknown"),
+                "date": v.get("date", ""),
+                "downloadURL": v.get("url", ""),
+                "size": v.get("size", 0)
+            }
+            for v in get('versions', [])
+        ]
+        # Only the AltStore format defines a per-version sha256
+        plain_versions = versions
+        for version, source in zip(versions, get('versions', [])):
+            if source.get("sha256"):
+                version["sha256"] = source["sha256"]
+                plain_versions = None
+        if plain_versions is None:
+            plain_versions = [{k: v for k, v in version.items() if k != "sha256"} for version in versions]
+        return cls(
+            get('name', 'Unnamed App'),
+            get('bundleID', 'Unknown'),
+            get('devName', 'Unknown Developer'),
+            get('devName') or None,
+            get('subtitle', ''),
+            get('description', ''),
+            get('category', 'Other'),
+            get('icon') or CONFIG["NO_ICON_PATH"],
+            versions,
+            plain_versions,
+            get('screenshots', [])[:4],  # Limit to 4 screenshots
+            get('scarletDebs') or None,
+            'scarletBackup' in app,
+            get('scarletBackup')
+        )
+
+    def to_cache(self) -> List:
+        # plain_versions usually aliases versions; store it once
+        return [None if slot == 'plain_versions' and self.plain_versions is self.versions else getattr(self, slot)
+                for slot in self.__slots__]
+
+    @classmethod
+    def from_cache(cls, values: List) -> 'AppRecord':
+        record = cls(*values)
+        if record.plain_versions is None:
+            record.plain_versions = record.versions
+        return record
+
+class Catalog:
+    __slots__ = ('name', 'subtitle', 'description', 'icon_url', 'header_url', 'website', 'tint_color', 'featured', 'apps')
+
+    def __init__(self, repo_config: Dict, apps: List[AppRecord], featured: List[str]):
+        self.name = repo_config.get("name", "Unnamed Repository")
+        self.subtitle = repo_config.get("subtitle", "")
+        self.description = repo_config.get("description", "")
+        self.icon_url = repo_config.get("iconURL", "")
+        self.header_url = repo_config.get("headerURL", "")
+        self.website = repo_config.get("website", "")
+        self.tint_color = repo_config.get("tintColor", "")
+        self.featured = featured
+        self.apps = apps
+
+class BuildCache:
+    def __init__(self, path: Path):
+        self.path = path
+        self.data = self._load()
+        self.apps: Dict[str, Dict] = {}
+
+    def _load(self) -> Dict:
+        data = json_io.read_json(str(self.path))
+        if isinstance(data, dict) and data.get('version') == CONFIG["BUILD_CACHE_VERSION"]:
+            return data
+        return {'version': CONFIG["BUILD_CACHE_VERSION"], 'apps': {}, 'outputs': {}}
+
+    def fingerprint(self, key: str, path: Path, previous: Optional[Dict]) -> Tuple[Dict, Optional[bytes]]:
+        """Return the file's fingerprint and its bytes, or None for the bytes when it is unchanged."""
+        stat = path.stat()
+        if previous and previous.get('mtime_ns') == stat.st_mtime_ns and previous.get('size') == stat.st_size:
+            return previous, None
+        raw = path.read_bytes()
+        digest = hashlib.sha256(raw).hexdigest()
+        fingerprint = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size, 'sha256': digest}
+        if previous and previous.get('sha256') == digest:
+            return {**previous, **fingerprint}, None
+        return fingerprint, raw
+
+    def output_signature(self, fmt: str, repo_digest: str, keys: List[str], featured: List[str]) -> str:
+        parts = [fmt, repo_digest, json.dumps(featured)] + [f"{k}:{self.apps[k]['sha256']}" for k in keys]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def output_current(self, fmt: str, path: Path, signature: str) -> bool:
+        record = self.data['outputs'].get(fmt)
+        if not record or record.get('signature') != signature:
+            return False
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return False
+        return record.get('mtime_ns') == stat.st_mtime_ns and record.get('size') == stat.st_size
+
+    def record_output(self, fmt: str, path: Path, signature: str):
+        stat = path.stat()
+        self.data['outputs'][fmt] = {'signature': signature, 'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+    def save(self) -> bool:
+        self.data['apps'] = self.apps
+        return json_io.write_json(str(self.path), self.data, ensure_ascii=False) is not None
+
 class RepoCompiler:
-    def __init__(self, root_dir: str = '.', featured_count: int = 5, output_dir: str = '.'):
+    def __init__(self, root_dir: str = '.', featured_count: int = 5, output_dir: str = '.', incremental: bool = False,
+                 cache_path: Optional[str] = None, compact: bool = False, gzip_output: bool = False,
+                 metrics_path: Optional[str] = None, store: Optional[AppStore] = None, workers: Optional[int] = None,
+                 upstreams: bool = True, upstream_cache_path: Optional[str] = None, shards: bool = False):
         self.root_dir = Path(root_dir).resolve()
         self.apps_dir = self.root_dir / 'Apps'
         self.output_dir = Path(output_dir).resolve()
         self.featured_count = featured_count
         self.logger = configure_logging()
+        self.incremental = incremental
+        self.cache_path = Path(cache_path).resolve() if cache_path else self.root_dir / '.cache' / 'compile_cache.json'
+        self.build_cache: Optional[BuildCache] = None
+        self.compact = compact
+        self.gzip_output = gzip_output
+        self.metrics = Metrics('compile_repository')
+        # When run from the pipeline, app configs come from its already-loaded store instead of disk
+        self.store = store
+        self.workers = workers
+        # Feeds listed under "upstreams" in repo-info.json are merged in unless disabled (e.g. offline runs)
+        self.upstreams = upstreams
+        self.upstream_cache_path = Path(upstream_cache_path) if upstream_cache_path else self.root_dir / '.cache' / 'upstreams.json'
+        self.shards = shards
+        self.metrics_path = Path(metrics_path) if metrics_path else self.root_dir / '.cache' / 'metrics' / 'compile_repository.json'
 
     def load_config(self, path: Path) -> Optional[Dict]:
         try:
-            return json.loads(path.read_text(encoding='utf-8'))
-        except (FileNotFoundError, json.JSONDecodeError, PermissionError) as e:
+            return json_io.loads(path.read_bytes())
+        except (FileNotFoundError, json.JSONDecodeError, UnicodeDecodeError, PermissionError) as e:
             self.logger.error(f"Failed to load {path}: {e}")
             return None
 
-    def save_config(self, path: Path, data: Dict, dry_run: bool = False) -> bool:
+    def save_config(self, path: Path, fmt: str, catalog: Catalog, dry_run: bool = False) -> bool:
         if dry_run:
             self.logger.info(f"Dry run: Would save to {path}")
             return True
+        tmp_path = path.with_name(f".{path.name}.tmp")
         try:
             path.parent.mkdir(parents=True, exist_ok=True)
-            path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding='utf-8')
-            self.logger.info(f"Saved to {path}")
+            digest = hashlib.sha256()
+            size = 0
+            with open(tmp_path, 'wb') as f:
+                def write(text: str):
+                    nonlocal size
+                    chunk = text.encode('utf-8')
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                self.render(fmt, catalog, write)
+
+            # Readers only ever see the old feed or the complete new one
+            if path.is_file() and path.stat().st_size == size and self._file_digest(path) == digest.hexdigest():
+                tmp_path.unlink()
+                self.logger.info(f"Unchanged, not rewriting {path}")
+            else:
+                tmp_path.replace(path)
+                self.metrics.incr('bytes_written', size)
+                self.logger.info(f"Saved to {path}")
+            if self.gzip_output:
+                self._save_gzip(path)
             return True
         except Exception as e:
+            if tmp_path.exists():
+                tmp_path.unlink()
             self.logger.error(f"Failed to save {path}: {e}")
             return False
 
-    def _load_app_data(self, target_fmt: str) -> Tuple[List[Dict], List[str]]:
+    def build_catalog(self, repo_config: Dict, apps: List[AppRecord]) -> Tuple[Catalog, List[AppRecord], List[str]]:
+        """The catalog every feed is rendered from: the given local apps followed by any imported from the
+        upstreams in repo_config, with this week's featured picks. Also returns the imported records and one
+        digest per upstream for build signatures."""
+        imported, digests = [], []
+        if self.upstreams and repo_config.get('upstreams'):
+            imported, digests = self._import_upstreams(repo_config['upstreams'], apps)
+        apps = apps + imported
+        return Catalog(repo_config, apps, self._pick_featured([app.bundle_id for app in apps])), imported, digests
+
+    def render(self, fmt: str, catalog: Catalog, write: Callable[[str], None]):
+        """Stream one feed format ('altstore', 'trollapps' or 'scarlet') of the catalog as JSON text."""
+        formatters = {'altstore': self._format_altstore, 'trollapps': self._format_trollapps,
+                      'scarlet': self._format_scarlet}
+        self._stream_json(formatters[fmt](catalog), write)
+
+    def _json_fragment(self, value, depth: int) -> str:
+        if self.compact:
+            return json_io.dumps(value, ensure_ascii=False)
+        # Matches json.dumps(data, indent=2): nested output is re-indented to its depth
+        return json_io.dumps(value, indent=2, ensure_ascii=False).replace('\n', '\n' + '  ' * depth)
+
+    def _stream_json(self, data: Dict, write: Callable[[str], None]):
+        """Serialize a feed top-level key by key, writing iterator values (the app lists) one entry at a time."""
+        newline, indent, key_sep = ('', '', ':') if self.compact else ('\n', '  ', ': ')
+        write('{')
+        for i, (key, value) in enumerate(data.items()):
+            write(f"{',' if i else ''}{newline}{indent}{json_io.dumps(key, ensure_ascii=False)}{key_sep}")
+            if not isinstance(value, Iterator):
+                write(self._json_fragment(value, 1))
+                continue
+            write('[')
+            count = 0
+            for item in value:
+                fragment = item if isinstance(item, JSONFragment) else self._json_fragment(item, 2)
+                write(f"{',' if count else ''}{newline}{indent * 2}{fragment}")
+                count += 1
+            write(f"{newline}{indent}]" if count else ']')
+        write(f"{newline}}}" if data else '}')
+
+    def _file_digest(self, path: Path) -> str:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def _save_gzip(self, path: Path):
+        gz_path = path.with_name(path.name + '.gz')
+        tmp_path = gz_path.with_name(f".{gz_path.name}.tmp")
+        with open(path, 'rb') as src, open(tmp_path, 'wb') as raw:
+            # Fixed header fields keep the archive byte-stable for identical feeds
+            with gzip.GzipFile(filename='', mode='wb', fileobj=raw, compresslevel=9, mtime=0) as gz:
+                for chunk in iter(lambda: src.read(1024 * 1024), b''):
+                    gz.write(chunk)
+        if gz_path.is_file() and self._file_digest(gz_path) == self._file_digest(tmp_path):
+            tmp_path.unlink()
+            return
+        tmp_path.replace(gz_path)
+        self.metrics.incr('bytes_written', gz_path.stat().st_size)
+        self.logger.info(f"Saved to {gz_path}")
+
+    def _load_app_data(self, target_fmt: str) -> Tuple[List[AppRecord], List[str]]:
         if not self.apps_dir.exists():
             self.logger.error(f"Apps directory not found: {self.apps_dir}")
             return [], []
 
-        apps, bundle_ids = [], []
-        for app_dir in sorted(self.apps_dir.iterdir()):
-            if not app_dir.is_dir():
-                self.logger.debug(f"Skipping non-directory: {app_dir}")
-                continue
+        if self.store:
+            app_dirs = [Path(entry.dir) for entry in self.store.load().select()]
+        else:
+            app_dirs = []
+            for app_dir in sorted(self.apps_dir.iterdir()):
+                if app_dir.is_dir():
+                    app_dirs.append(app_dir)
+                else:
+                    self.logger.debug(f"Skipping non-directory: {app_dir}")
 
-            app_config = self.load_config(app_dir / 'app.json')
-            if not app_config or not (bid := app_config.get("bundleID")):
+        # Stored configs are already parsed; from disk, reads and parses of separate apps overlap
+        loaded = json_io.map_ordered(self._load_app, app_dirs, 1 if self.store else self.workers)
+        if self.build_cache:
+            # Workers finish out of order; the output signature depends on the cache's key order
+            self.build_cache.apps = dict(sorted(self.build_cache.apps.items()))
+            self.rebuilt.sort()
+
+        apps, bundle_ids = [], []
+        for app_dir, app in zip(app_dirs, loaded):
+            if not app:
                 self.logger.warning(f"Skipping invalid app config in {app_dir}")
                 continue
-            app_config.setdefault("name", "Unnamed App")
-            apps.append(app_config)
-            bundle_ids.append(bid)
-            self.logger.info(f"Loaded app: {app_config['name']} ({bid})")
+            apps.append(app)
+            bundle_ids.append(app.bundle_id)
+            self.logger.info(f"Loaded app: {app.name} ({app.bundle_id})")
 
         if not bundle_ids:
             self.logger.warning("No valid apps found")
             return apps, []
 
+        self.logger.info(f"Loaded {len(apps)} apps")
+        return apps, self._pick_featured(bundle_ids)
+
+    def _pick_featured(self, bundle_ids: List[str]) -> List[str]:
         current_week = datetime.now().isocalendar().week
         # Seed random with year and week to ensure featured apps are consistent within a week but change weekly
         random.seed(f"{datetime.now().year}-{current_week}")
         featured = random.sample(bundle_ids, min(self.featured_count, len(bundle_ids)))
         random.seed()
+        return featured
 
-        self.logger.info(f"Loaded {len(apps)} apps")
-        return apps, featured
+    def _import_upstreams(self, upstreams, local_apps: List[AppRecord]) -> Tuple[List[AppRecord], List[str]]:
+        if not isinstance(upstreams, list):
+            self.logger.error("Ignoring upstreams in repo config: expected a list")
+            return [], []
+        feeds = UpstreamFeeds(str(self.upstream_cache_path))
+        with self.metrics.stage('import_upstreams'):
+            configs, digests = feeds.import_apps(upstreams, {app.bundle_id for app in local_apps})
+            imported = [AppRecord.from_config(config) for config in configs]
+        if not feeds.save():
+            self.logger.error(f"Failed to save upstream cache {self.upstream_cache_path}")
+        for stat in ('fetched', 'not_modified', 'failed'):
+            self.metrics.incr(f'upstreams_{stat}', feeds.stats[stat])
+        self.metrics.incr('apps_imported', len(imported))
+        self.logger.info(f"{feeds.summary()}; imported {len(imported)} apps")
+        return imported, digests
+
+    def _load_app(self, app_dir: Path) -> Optional[AppRecord]:
+        with self.metrics.stage('load_app', app_dir.name):
+            if self.store:
+                return self._load_stored_app(self.store.get(app_dir.name))
+            if self.build_cache:
+                return self._load_cached_app(app_dir)
+            app_config = self.load_config(app_dir / 'app.json')
+            return AppRecord.from_config(app_config) if isinstance(app_config, dict) and app_config.get("bundleID") else None
+
+    def _load_cached_app(self, app_dir: Path) -> Optional[AppRecord]:
+        key = app_dir.name
+        config_path = app_dir / 'app.json'
+        previous = self.build_cache.data['apps'].get(key)
+        try:
+            fingerprint, raw = self.build_cache.fingerprint(key, config_path, previous)
+        except (FileNotFoundError, PermissionError) as e:
+            self.logger.error(f"Failed to load {config_path}: {e}")
+            return None
+
+        if raw is None:
+            self.build_cache.apps[key] = fingerprint
+            return AppRecord.from_cache(previous['record']) if previous.get('record') else None
+
+        try:
+            app_config = json_io.loads(raw)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self.logger.error(f"Failed to load {config_path}: {e}")
+            app_config = None
+        app = AppRecord.from_config(app_config) if isinstance(app_config, dict) and app_config.get("bundleID") else None
+        self.build_cache.apps[key] = {**fingerprint, 'record': app.to_cache() if app else None}
+        self.rebuilt.append(key)
+        return app
+
+    def _load_stored_app(self, entry: AppEntry) -> Optional[AppRecord]:
+        app = AppRecord.from_config(entry.data) if entry.data.get("bundleID") else None
+        if self.build_cache:
+            # The store already fingerprinted the bytes it loaded or saved, so the cache stays valid for standalone runs
+            previous = self.build_cache.data['apps'].get(entry.name)
+            if not previous or previous.get('sha256') != entry.fingerprint['sha256']:
+                self.rebuilt.append(entry.name)
+            self.build_cache.apps[entry.name] = {**entry.fingerprint, 'record': app.to_cache() if app else None}
+        return app
 
     def compile_repos(self, target_fmt: Optional[str] = None, verbose: bool = False) -> Dict:
-        self.logger.info(f"Compiling for: {target_fmt or 'all'}")
-        repo_config = self.load_config(self.root_dir / 'repo-info.json')
+        self.logger.info(f"Compiling for: {target_fmt or 'all'} (JSON backend: {json_io.BACKEND})")
+        started = time.perf_counter()
+        repo_path = self.root_dir / 'repo-info.json'
+        repo_config = self.load_config(repo_path)
         if not repo_config:
             return {'success': False, 'error': 'Missing/invalid repo config'}
 
-        apps, featured = self._load_app_data(target_fmt)
-        if not apps:
-            return {'success': False, 'error': 'No valid apps found'}
+        if self.incremental:
+            self.build_cache = BuildCache(self.cache_path)
+            self.rebuilt = []
+            repo_digest = hashlib.sha256(repo_path.read_bytes()).hexdigest()
 
-        formats = {
-            'altstore': (self.output_dir / CONFIG["OUTPUT_FILES"]["altstore"], self._format_altstore),
-            'trollapps': (self.output_dir / CONFIG["OUTPUT_FILES"]["trollapps"], self._format_trollapps),
-            'scarlet': (self.output_dir / CONFIG["OUTPUT_FILES"]["scarlet"], self._format_scarlet)
-        }
+        formats = {fmt: self.output_dir / name for fmt, name in CONFIG["OUTPUT_FILES"].items()}
 
         target_fmt = target_fmt.lower() if target_fmt else None
         if target_fmt and target_fmt in formats:
@@ -110,119 +433,236 @@ class RepoCompiler:
         elif target_fmt:
             return {'success': False, 'error': f'Invalid format: {target_fmt}'}
 
-        for fmt, (path, formatter) in formats.items():
-            repo_data = formatter(repo_config, apps, featured) if fmt != 'scarlet' else formatter(repo_config, apps)
-            if not self.save_config(path, repo_data):
+        apps, _ = self._load_app_data(target_fmt)
+        catalog, _, digests = self.build_catalog(repo_config, apps)
+        if self.build_cache and self.upstreams and repo_config.get('upstreams'):
+            repo_digest = hashlib.sha256('\n'.join([repo_digest] + digests).encode('utf-8')).hexdigest()
+        if not catalog.apps:
+            return {'success': False, 'error': 'No valid apps found'}
+        featured = catalog.featured
+        self.metrics.incr('apps_loaded', len(catalog.apps))
+
+        for fmt, path in formats.items():
+            if self.build_cache:
+                signature = self.build_cache.output_signature(f"{fmt}:{self.compact}", repo_digest, list(self.build_cache.apps), featured)
+                gz_missing = self.gzip_output and not path.with_name(path.name + '.gz').is_file()
+                if not gz_missing and self.build_cache.output_current(fmt, path, signature):
+                    self.logger.info(f"Inputs unchanged, skipping {path.name}")
+                    self.metrics.incr('feeds_skipped')
+                    continue
+            # Entries are generated while the feed streams to disk, so this covers formatting and writing
+            with self.metrics.stage(f'write_{fmt}'):
+                saved = self.save_config(path, fmt, catalog)
+            if not saved:
                 return {'success': False, 'error': f'Failed to save {path.name}'}
+            self.metrics.incr('feeds_written')
+            if self.build_cache:
+                self.build_cache.record_output(fmt, path, signature)
+
+        if self.shards:
+            with self.metrics.stage('write_shards'):
+                saved = self._write_shards(catalog)
+            if not saved:
+                return {'success': False, 'error': 'Failed to save shards'}
 
+        if self.build_cache:
+            if not self.build_cache.save():
+                self.logger.error(f"Failed to save build cache {self.cache_path}")
+            self.metrics.incr('apps_rebuilt', len(self.rebuilt))
+            rebuilt = ', '.join(self.rebuilt) if self.rebuilt else 'none'
+            self.logger.info(f"Rebuilt {len(self.rebuilt)} apps ({rebuilt}), reused {len(self.build_cache.apps) - len(self.rebuilt)} cached "
+                             f"in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+        self.logger.info(self.metrics.summary())
+        if not self.metrics.save(str(self.metrics_path)):
+            self.logger.error(f"Failed to save metrics {self.metrics_path}")
         self.logger.info("Compilation completed")
         return {'success': True}
 
-    def _format_altstore(self, repo_config: Dict, apps: List[Dict], featured: List[str]) -> Dict:
+    def _shard_name(self, bundle_id: str) -> str:
+        name = re.sub(r'[^A-Za-z0-9._-]', '_', bundle_id)
+        if name != bundle_id or name.startswith('.'):
+            # Keep rewritten IDs from colliding with each other or with a real ID
+            name = f"{name.lstrip('.')}-{hashlib.sha256(bundle_id.encode('utf-8')).hexdigest()[:8]}"
+        return f"{name}.json"
+
+    def _write_bytes(self, path: Path, raw: bytes):
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_bytes(raw)
+        tmp_path.replace(path)
+        self.metrics.incr('bytes_written', len(raw))
+
+    def _write_shards(self, catalog: Catalog) -> bool:
+        """Write one shard per bundle ID with its entry for every format, a bundleID -> hash index, and a delta.
+
+        index.json and changes.json are only rewritten when a shard was added, updated or removed, so
+        changes.json always describes the step from the index generated at its "since" to the current one.
+        """
+        shard_dir = self.output_dir / CONFIG["SHARD_DIR"]
+        index_path = shard_dir / 'index.json'
+        previous = self.load_config(index_path) if index_path.is_file() else None
+        previous_apps = previous.get('apps', {}) if isinstance(previous, dict) else {}
+
+        shards: Dict[str, Dict] = {}
+        for app in catalog.apps:
+            # Bundle IDs are not unique across app directories, so each format holds a list
+            shard = shards.setdefault(app.bundle_id, {'bundleID': app.bundle_id, **{fmt: [] for fmt in CONFIG["OUTPUT_FILES"]}})
+            for fmt in CONFIG["OUTPUT_FILES"]:
+                shard[fmt].append(self._create_entry(app, fmt))
+
+        now = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        apps, added, updated = {}, [], []
+        try:
+            (shard_dir / 'apps').mkdir(parents=True, exist_ok=True)
+            for bundle_id, shard in shards.items():
+                raw = json_io.dumps_bytes(shard, ensure_ascii=False)
+                digest = hashlib.sha256(raw).hexdigest()
+                relative = f"apps/{self._shard_name(bundle_id)}"
+                old = previous_apps.get(bundle_id)
+                unchanged = isinstance(old, dict) and old.get('sha256') == digest and old.get('path') == relative
+                if unchanged and (shard_dir / relative).is_file():
+                    apps[bundle_id] = old
+                    continue
+                self._write_bytes(shard_dir / relative, raw)
+                self.metrics.incr('shards_written')
+                if unchanged:
+                    apps[bundle_id] = old  # Restored a deleted shard; consumers saw no change
+                    continue
+                apps[bundle_id] = {'sha256': digest, 'changed': now, 'path': relative}
+                (updated if old else added).append(bundle_id)
+
+            live = {entry['path'] for entry in apps.values()}
+            removed = sorted(set(previous_apps) - set(shards))
+            for bundle_id in removed:
+                old = previous_apps[bundle_id]
+                path = old.get('path') if isinstance(old, dict) else None
+                if path and path not in live and (shard_dir / path).parent == shard_dir / 'apps':
+                    (shard_dir / path).unlink(missing_ok=True)
+                self.metrics.incr('shards_removed')
+
+            if previous is not None and not (added or updated or removed):
+                self.logger.info(f"Shards unchanged, not rewriting {index_path}")
+                return True
+            changes = {
+                'since': previous.get('generated') if isinstance(previous, dict) else None,
+                'generated': now,
+                'added': sorted(added),
+                'updated': sorted(updated),
+                'removed': removed,
+            }
+            # The delta lands before the index so a consumer that sees the new index also finds its delta
+            self._write_bytes(shard_dir / 'changes.json', json_io.dumps_bytes(changes, ensure_ascii=False))
+            self._write_bytes(index_path, json_io.dumps_bytes({'generated': now, 'apps': apps}, ensure_ascii=False))
+        except (IOError, PermissionError) as e:
+            self.logger.error(f"Failed to save shards in {shard_dir}: {e}")
+            return False
+        self.logger.info(f"Shards: {len(added)} added, {len(updated)} updated, {len(removed)} removed, "
+                         f"{len(apps) - len(added) - len(updated)} unchanged")
+        return True
+
+    def _repo_header(self, catalog: Catalog) -> Dict:
+        return {
+            "name": catalog.name,
+            "subtitle": catalog.subtitle,
+            "description": catalog.description,
+            "iconURL": catalog.icon_url,
+            "headerURL": catalog.header_url,
+            "website": catalog.website,
+            "tintColor": catalog.tint_color,
+            "featuredApps": catalog.featured,
+        }
+
+    def _format_altstore(self, catalog: Catalog) -> Dict:
         return {
-            "name": repo_config.get("name", "Unnamed Repository"),
-            "subtitle": repo_config.get("subtitle", ""),
-            "description": repo_config.get("description", ""),
-            "iconURL": repo_config.get("iconURL", ""),
-            "headerURL": repo_config.get("headerURL", ""),
-            "website": repo_config.get("website", ""),
-            "tintColor": repo_config.get("tintColor", ""),
-            "featuredApps": featured,
-            "apps": [self._create_entry(app, 'altstore') for app in apps],
+            **self._repo_header(catalog),
+            "apps": (self._create_entry(app, 'altstore') for app in catalog.apps),
         }
 
-    def _format_trollapps(self, repo_config: Dict, apps: List[Dict], featured: List[str]) -> Dict:
+    def _format_trollapps(self, catalog: Catalog) -> Dict:
         return {
-            "name": repo_config.get("name", "Unnamed Repository"),
-            "subtitle": repo_config.get("subtitle", ""),
-            "description": repo_config.get("description", ""),
-            "iconURL": repo_config.get("iconURL", ""),
-            "headerURL": repo_config.get("headerURL", ""),
-            "website": repo_config.get("website", ""),
-            "tintColor": repo_config.get("tintColor", ""),
-            "featuredApps": featured,
-            "apps": [self._create_entry(app, 'trollapps') for app in apps],
+            **self._repo_header(catalog),
+            "apps": (self._create_entry(app, 'trollapps') for app in catalog.apps),
             "news": []  # Added empty news array
         }
 
-    def _format_scarlet(self, repo_config: Dict, apps: List[Dict]) -> Dict:
+    def _format_scarlet(self, catalog: Catalog) -> Dict:
         categories = defaultdict(list)
-        for app in apps:
-            category = app.get("category", "Other")
-            categories[category].append(self._create_entry(app, 'scarlet'))
+        for app in catalog.apps:
+            categories[app.category].append(app)
 
         return {
             "META": {
-                "repoName": repo_config.get("name", "Unnamed Repository"),
-                "repoIcon": repo_config.get("iconURL", ""),
+                "repoName": catalog.name,
+                "repoIcon": catalog.icon_url,
             },
-            **categories
+            **{category: self._scarlet_entries(apps) for category, apps in categories.items()}
         }
 
-    def _create_entry(self, app: Dict, fmt: str) -> Dict:
-        icon = app.get('icon')
-        if not icon:
-            icon = CONFIG["NO_ICON_PATH"]
+    def _scarlet_entries(self, apps: List[AppRecord]) -> Iterator:
+        return (self._create_entry(app, 'scarlet') for app in apps)
 
+    def _create_entry(self, app: AppRecord, fmt: str) -> Dict:
         if fmt == 'scarlet':
-            versions = app.get('versions', [{}])
-            version_data = versions[0] if versions else {}
+            latest = app.versions[0] if app.versions else None
             entry = {
-                'name': app.get('name', 'Unnamed App'),
-                'version': version_data.get('version', 'Unknown'),
-                'down': version_data.get('url', ''),
-                'category': app.get('category', 'Other'),
-                'description': app.get('description', ''),
-                'bundleID': app.get('bundleID', 'Unknown'),
-                'icon': icon
+                'name': app.name,
+                'version': latest['version'] if latest else 'Unknown',
+                'down': latest['downloadURL'] if latest else '',
+                'category': app.category,
+                'description': app.description,
+                'bundleID': app.bundle_id,
+                'icon': app.icon
             }
-            if app.get('scarletDebs'):
-                entry['debs'] = app['scarletDebs']
-            if app.get('devName'):
-                entry['dev'] = app['devName']
-            if app.get('screenshots'):
-                entry['screenshots'] = app['screenshots'][:4]  # Limit to 4 screenshots
-            if 'scarletBackup' in app:
-                entry['enableBackup'] = app['scarletBackup']
+            if app.scarlet_debs:
+                entry['debs'] = app.scarlet_debs
+            if app.dev_name:
+                entry['dev'] = app.dev_name
+            if app.screenshots:
+                entry['screenshots'] = app.screenshots
+            if app.has_scarlet_backup:
+                entry['enableBackup'] = app.scarlet_backup
             return entry
 
         entry = {
-            'name': app.get('name', 'Unnamed App'),
-            'bundleIdentifier': app.get('bundleID', 'Unknown'),
-            'developerName': app.get('devName', 'Unknown Developer'),
-            'subtitle': app.get('subtitle', ''),
-            'localizedDescription': app.get('description', ''),
-            'iconURL': icon,
+            'name': app.name,
+            'bundleIdentifier': app.bundle_id,
+            'developerName': app.developer,
+            'subtitle': app.subtitle,
+            'localizedDescription': app.description,
+            'iconURL': app.icon,
         }
         if fmt != 'trollapps':  # Only include category for non-TrollApps formats
-            entry['category'] = app.get('category', 'Other')
-        entry['versions'] = [self._format_version(v, fmt) for v in app.get('versions', [])]
+            entry['category'] = app.category
+        entry['versions'] = app.versions if fmt == 'altstore' else app.plain_versions
         if fmt == 'altstore':
-            entry['screenshots'] = app.get('screenshots', [])[:4]  # Limit to 4 screenshots
+            entry['screenshots'] = app.screenshots
         elif fmt == 'trollapps':
-            entry['screenshotURLs'] = app.get('screenshots', [])[:4]  # Limit to 4 screenshots
+            entry['screenshotURLs'] = app.screenshots
             entry['appPermissions'] = {}  # Added empty appPermissions object
         return entry
 
-    def _format_version(self, version: Dict, fmt: str) -> Dict:
-        version_entry = {
-            "version": version.get("version", "Unknown"),
-            "date": version.get("date", ""),
-            "downloadURL": version.get("url", ""),
-            "size": version.get("size", 0)
-        }
-        return version_entry
-
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
     parser.add_argument('-f', '--format', type=str, choices=['altstore', 'trollapps', 'scarlet'])
     parser.add_argument('-v', '--verbose', action='store_true')
+    parser.add_argument('-i', '--incremental', action='store_true', help='Reuse cached app records for unchanged apps')
+    parser.add_argument('--compact', action='store_true', help='Write feeds without indentation')
+    parser.add_argument('--gzip', action='store_true', help='Also write a precompressed .json.gz next to each feed')
+    parser.add_argument('--metrics', type=str, help='Where to write the JSON metrics report (default: .cache/metrics/compile_repository.json)')
+    parser.add_argument('--profile', action='store_true', help='Write a cProfile dump next to the metrics report')
+    parser.add_argument('--workers', type=int, dest='read_workers', help='Number of threads reading app configs (default: one per CPU, at most 8)')
+    parser.add_argument('--no-upstreams', action='store_true', help='Skip importing apps from the upstream feeds in repo-info.json')
+    parser.add_argument('--shards', action='store_true', help='Also write per-app shards, an index and a delta under shards/')
+    parser.set_defaults(cache_dir=None)
     args = parser.parse_args()
 
-    compiler = RepoCompiler()
-    result = compiler.compile_repos(args.format, args.verbose)
     logger = configure_logging(args.verbose)
-    if not result['success']:
-        logger.error(f"Compilation Failed: {result['error']}")
+    # Run as the compile stage of pipeline.py, so both entry points share one wiring
+    from pipeline import Paths, run_pipeline
+    root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    metrics_path = Paths(root_dir).metrics(args, "compile_repository.json")
+    with profiled(os.path.splitext(metrics_path)[0] + ".prof" if args.profile else None):
+        success = run_pipeline(root_dir, ['compile'], [None], args)
+    if not success:
         sys.exit(1)
-    logger.info("Compilation Completed")
\ No newline at end of file
+    logger.info("Compilation Completed")
@@ -0,0 +1,15 @@
+"""The pooled requests session the scripts' HTTP clients share across their worker threads."""
+import requests
+from requests.adapters import HTTPAdapter
+
+
+def pooled_session(pool_maxsize: int, pool_connections: int = 10, pool_block: bool = False) -> requests.Session:
+    """A session whose keep-alive pool holds pool_maxsize connections per host, for both http and https.
+
+    With pool_block, callers wait for a free connection instead of opening extra ones past the limit.
+    """
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, pool_block=pool_block)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
@@ -0,0 +1,239 @@
+"""Read an IPA's Info.plist with a few HTTP Range requests instead of downloading the whole archive."""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import plistlib
+import re
+import struct
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+import zlib
+
+import requests
+from requests.exceptions import RequestException
+
+from http_session import pooled_session
+import json_io
+
+INFO_PLIST = re.compile(r'^Payload/[^/]+\.app/Info\.plist$')
+# The end-of-central-directory record is 22 bytes plus a comment of at most 64 KiB; IPAs rarely carry a
+# comment, so a short tail usually holds the record and, for small apps, the whole central directory
+INITIAL_TAIL = 16 * 1024
+EOCD_SEARCH = 22 + 0xFFFF
+EOCD = struct.Struct('<4sHHHHIIH')
+ZIP64_LOCATOR = struct.Struct('<4sIQI')
+ZIP64_EOCD = struct.Struct('<4sQHHIIQQQQ')
+CENTRAL_ENTRY = struct.Struct('<4sHHHHHHIIIHHHHHII')
+LOCAL_HEADER = struct.Struct('<4sHHHHHIIIHH')
+# Local extra fields usually match the central ones; this slack avoids a second request when they do not
+LOCAL_SLACK = 1024
+PLIST_FIELDS = {
+    'CFBundleIdentifier': 'bundleID',
+    'CFBundleShortVersionString': 'shortVersion',
+    'CFBundleVersion': 'buildVersion',
+    'MinimumOSVersion': 'minOSVersion',
+}
+
+
+class IPAMetadataError(Exception):
+    """The archive was readable but is not an IPA we can take metadata from; cached so it is not retried."""
+
+
+class RangeFile:
+    """Random access to a remote file through Range requests, following the download redirect only once."""
+
+    def __init__(self, session: requests.Session, url: str, timeout: int = 30):
+        self.session = session
+        self.url = url
+        self.timeout = timeout
+        self.size: Optional[int] = None
+        self.bytes_read = 0
+        self.requests = 0
+
+    def read(self, start: int, end: Optional[int] = None) -> bytes:
+        """Bytes start..end inclusive; a negative start with no end reads that many bytes from the tail."""
+        spec = f"bytes={start}" if end is None and start < 0 else f"bytes={start}-{'' if end is None else end}"
+        response = self.session.get(self.url, headers={'Range': spec}, timeout=self.timeout, stream=True)
+        self.requests += 1
+        try:
+            if response.status_code != 206:
+                response.raise_for_status()
+                raise IPAMetadataError(f"Server ignored the Range header (HTTP {response.status_code})")
+            # Signed download URLs stay valid for minutes, so later ranges skip the redirect
+            self.url = response.url
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+            if total.isdigit():
+                self.size = int(total)
+            data = response.content
+        finally:
+            response.close()
+        self.bytes_read += len(data)
+        return data
+
+
+def _zip64_extra(extra: bytes, sizes: list) -> list:
+    """Replace 0xFFFFFFFF placeholders in [uncompressed, compressed, offset] from the Zip64 extra field."""
+    pos = 0
+    while pos + 4 <= len(extra):
+        header_id, length = struct.unpack_from('<HH', extra, pos)
+        if header_id == 0x0001:
+            field = pos + 4
+            for i, value in enumerate(sizes):
+                if value == 0xFFFFFFFF:
+                    sizes[i] = struct.unpack_from('<Q', extra, field)[0]
+                    field += 8
+            break
+        pos += 4 + length
+    return sizes
+
+
+def _central_directory(archive: RangeFile) -> bytes:
+    tail = archive.read(-INITIAL_TAIL)
+    pos = tail.rfind(b'PK\x05\x06')
+    if pos < 0 and (archive.size or 0) > len(tail):
+        tail = archive.read(-EOCD_SEARCH)
+        pos = tail.rfind(b'PK\x05\x06')
+    tail_start = (archive.size or len(tail)) - len(tail)
+    if pos < 0:
+        raise IPAMetadataError("Not a zip archive: end of central directory not found")
+    _, _, _, _, entries, cd_size, cd_offset, _ = EOCD.unpack_from(tail, pos)
+    if 0xFFFFFFFF in (cd_size, cd_offset) or entries == 0xFFFF:
+        locator = pos - ZIP64_LOCATOR.size
+        if locator < 0 or tail[locator:locator + 4] != b'PK\x06\x07':
+            raise IPAMetadataError("Zip64 archive without a Zip64 locator")
+        record_offset = ZIP64_LOCATOR.unpack_from(tail, locator)[2]
+        if record_offset >= tail_start:
+            record = tail[record_offset - tail_start:record_offset - tail_start + ZIP64_EOCD.size]
+        else:
+            record = archive.read(record_offset, record_offset + ZIP64_EOCD.size - 1)
+        _, _, _, _, _, _, _, _, cd_size, cd_offset = ZIP64_EOCD.unpack(record)
+    if cd_offset >= tail_start:
+        return tail[cd_offset - tail_start:cd_offset - tail_start + cd_size]
+    return archive.read(cd_offset, cd_offset + cd_size - 1)
+
+
+def _find_info_plist(directory: bytes) -> Tuple[int, int, int, int, str]:
+    pos = 0
+    while pos + CENTRAL_ENTRY.size <= len(directory):
+        (signature, _, _, flags, method, _, _, _, comp_size, uncomp_size,
+         name_len, extra_len, comment_len, _, _, _, offset) = CENTRAL_ENTRY.unpack_from(directory, pos)
+        if signature != b'PK\x01\x02':
+            break
+        name_start = pos + CENTRAL_ENTRY.size
+        name = directory[name_start:name_start + name_len].decode('utf-8', 'replace')
+        if INFO_PLIST.match(name):
+            extra = directory[name_start + name_len:name_start + name_len + extra_len]
+            uncomp_size, comp_size, offset = _zip64_extra(extra, [uncomp_size, comp_size, offset])
+            if flags & 0x1:
+                raise IPAMetadataError(f"{name} is encrypted")
+            return offset, comp_size, uncomp_size, method, name
+        pos = name_start + name_len + extra_len + comment_len
+    raise IPAMetadataError("No Payload/*.app/Info.plist in archive")
+
+
+def read_info_plist(archive: RangeFile) -> Dict:
+    """Fetch and parse the app's Info.plist: tail, central directory (usually in the tail) and one local entry."""
+    offset, comp_size, uncomp_size, method, name = _find_info_plist(_central_directory(archive))
+    chunk = archive.read(offset, offset + LOCAL_HEADER.size + len(name.encode()) + LOCAL_SLACK + comp_size - 1)
+    signature, _, _, _, _, _, _, _, _, name_len, extra_len = LOCAL_HEADER.unpack_from(chunk)
+    if signature != b'PK\x03\x04':
+        raise IPAMetadataError(f"Corrupt local header for {name}")
+    data_start = LOCAL_HEADER.size + name_len + extra_len
+    if data_start + comp_size > len(chunk):
+        chunk += archive.read(offset + len(chunk), offset + data_start + comp_size - 1)
+    data = chunk[data_start:data_start + comp_size]
+    if method == 8:
+        data = zlib.decompressobj(-zlib.MAX_WBITS).decompress(data, uncomp_size)
+    elif method != 0:
+        raise IPAMetadataError(f"Unsupported compression method {method} for {name}")
+    try:
+        plist = plistlib.loads(data)
+    except Exception as e:
+        # plistlib surfaces malformed input as ExpatError, ValueError, struct.error, IndexError, ... depending on
+        # the format; the bytes are what the server holds, so any parse failure is permanent
+        raise IPAMetadataError(f"Unreadable {name}: {str(e) or type(e).__name__}") from e
+    if not isinstance(plist, dict):
+        raise IPAMetadataError(f"Unexpected {name} contents")
+    return plist
+
+
+class IPAMetadataExtractor:
+    """Concurrent, URL-keyed cache of IPA Info.plist fields read through Range requests."""
+
+    def __init__(self, cache_path: Optional[str] = None, workers: int = 4, session: Optional[requests.Session] = None):
+        self.cache_path = cache_path
+        self.workers = max(1, workers)
+        self.logger = logging.getLogger("IPAMetadata")
+        self.lock = threading.Lock()
+        self.cache = self._load()
+        self.session = session or pooled_session(max(10, self.workers))
+        self.stats = {'extracted': 0, 'cached': 0, 'failed': 0, 'requests': 0, 'bytes_read': 0}
+
+    def _load(self) -> Dict:
+        cache = json_io.read_json(self.cache_path, self.logger, 'IPA metadata cache') if self.cache_path else None
+        return cache if isinstance(cache, dict) else {}
+
+    def save(self) -> bool:
+        if not self.cache_path:
+            return True
+        with self.lock:
+            return json_io.write_json(self.cache_path, self.cache, indent=2, sort_keys=True) is not None
+
+    def extract(self, url: str) -> Optional[Dict]:
+        """Metadata for one IPA, or None when it could not be read; permanent failures are cached as well."""
+        with self.lock:
+            cached = self.cache.get(url)
+        if cached is not None:
+            with self.lock:
+                self.stats['cached'] += 1
+            return None if 'error' in cached else cached
+
+        archive = RangeFile(self.session, url)
+        try:
+            plist = read_info_plist(archive)
+            result = {field: plist[key] for key, field in PLIST_FIELDS.items() if isinstance(plist.get(key), str)}
+        except IPAMetadataError as e:
+            self.logger.warning(f"Cannot read metadata from {url}: {str(e)}")
+            result = {'error': str(e)}
+        except (RequestException, struct.error, zlib.error) as e:
+            # Network trouble and truncated responses are worth retrying next run, so they are not cached
+            self.logger.error(f"Failed to fetch metadata from {url}: {str(e)}")
+            result = None
+        with self.lock:
+            self.stats['requests'] += archive.requests
+            self.stats['bytes_read'] += archive.bytes_read
+            if result is None or 'error' in result:
+                self.stats['failed'] += 1
+            else:
+                self.stats['extracted'] += 1
+            if result is not None:
+                self.cache[url] = result
+        return None if result is None or 'error' in result else result
+
+    def extract_many(self, urls: Iterable[str]) -> Dict[str, Optional[Dict]]:
+        urls = list(dict.fromkeys(urls))
+        if self.workers == 1 or len(urls) < 2:
+            return {url: self.extract(url) for url in urls}
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return dict(zip(urls, executor.map(self.extract, urls)))
+
+    def summary(self) -> str:
+        return (f"IPA metadata: {self.stats['extracted']} extracted, {self.stats['cached']} cached, "
+                f"{self.stats['failed']} failed, {self.stats['requests']} range requests, "
+                f"{self.stats['bytes_read']} bytes read")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Print Info.plist metadata of remote IPAs without downloading them")
+    parser.add_argument("urls", nargs="+", help="IPA download URLs")
+    parser.add_argument("--workers", type=int, default=4, help="Number of IPAs read concurrently")
+    parser.add_argument("--cache", type=str, help="JSON file caching results by URL")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    extractor = IPAMetadataExtractor(args.cache, workers=args.workers)
+    print(json.dumps(extractor.extract_many(args.urls), indent=2))
+    extractor.save()
+    logging.getLogger("IPAMetadata").info(extractor.summary())
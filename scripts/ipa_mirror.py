@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""Mirror the release assets app.json versions point at into static/IPA, deduplicated by SHA-256.
+
+Downloads run concurrently over a bounded connection pool and stream into .partial/, so an
+interrupted run resumes with a Range request. mirror.json in the mirror directory records which
+files the mirror owns; hand-maintained files next to them are never pruned.
+"""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+import requests
+from requests.exceptions import RequestException
+
+from app_store import AppEntry, AppStore
+from http_session import pooled_session
+import json_io
+
+CHUNK_SIZE = 256 * 1024
+# Bytes of a network read that are lost when the connection drops mid-read, so kept small: every
+# chunk is on disk before the next is requested and a resume continues from the last one written
+DOWNLOAD_CHUNK_SIZE = 16 * 1024
+MANIFEST = 'mirror.json'
+PARTIAL_DIR = '.partial'
+MIRROR_BASE_URL = "https://raw.githubusercontent.com/DRKCTRL/DRKSRC/main/static/IPA"
+UNSAFE_CHARS = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def mirror_filename(url: str, sha256: str) -> str:
+    """The URL's file name plus a short content hash, so equal names from different releases never collide."""
+    name = UNSAFE_CHARS.sub('_', unquote(os.path.basename(urlparse(url).path))).strip('._') or 'download.ipa'
+    stem, ext = os.path.splitext(name)
+    return f"{stem}-{sha256[:12]}{ext.lower()}"
+
+
+class IPAMirror:
+    """Pooled, resumable downloads of version URLs into a local store holding each distinct file once."""
+
+    def __init__(self, mirror_dir: str, base_url: str = MIRROR_BASE_URL, workers: int = 4,
+                 session: Optional[requests.Session] = None):
+        self.mirror_dir = mirror_dir
+        self.base_url = base_url.rstrip('/')
+        self.manifest_path = os.path.join(mirror_dir, MANIFEST)
+        self.partial_dir = os.path.join(mirror_dir, PARTIAL_DIR)
+        self.workers = max(1, workers)
+        self.logger = logging.getLogger("IPAMirror")
+        self.lock = threading.Lock()
+        self.manifest = self._load()
+        self.by_sha256 = {record['sha256']: record for record in self.manifest['urls'].values()
+                          if os.path.isfile(os.path.join(self.mirror_dir, record['file']))}
+        # A blocking pool caps open connections per host at `workers` however many downloads are queued
+        self.session = session or pooled_session(self.workers, pool_connections=self.workers, pool_block=True)
+        self.stats = {'downloaded': 0, 'resumed': 0, 'deduplicated': 0, 'cached': 0, 'failed': 0,
+                      'pruned': 0, 'bytes_downloaded': 0}
+
+    def _load(self) -> Dict:
+        manifest = json_io.read_json(self.manifest_path, self.logger, 'mirror manifest')
+        if isinstance(manifest, dict) and isinstance(manifest.get('urls'), dict):
+            return manifest
+        return {'urls': {}}
+
+    def save(self) -> bool:
+        with self.lock:
+            return json_io.write_json(self.manifest_path, self.manifest, indent=2, sort_keys=True) is not None
+
+    def _count(self, stat: str, amount: int = 1):
+        with self.lock:
+            self.stats[stat] += amount
+
+    def _partial_paths(self, url: str) -> Tuple[str, str]:
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()[:24]
+        return os.path.join(self.partial_dir, f"{key}.part"), os.path.join(self.partial_dir, f"{key}.json")
+
+    def _resume_offset(self, part_path: str, meta_path: str) -> Tuple[int, Dict]:
+        """Bytes already downloaded and the headers to continue from there, or (0, {}) to start over."""
+        offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+        try:
+            with open(meta_path, 'r') as f:
+                validator = json.load(f).get('validator')
+        except (FileNotFoundError, json.JSONDecodeError):
+            validator = None
+        # Without a validator the remote file may have changed since, so the partial bytes cannot be trusted
+        if not offset or not validator:
+            return 0, {}
+        return offset, {'Range': f"bytes={offset}-", 'If-Range': validator}
+
+    def _download(self, url: str) -> Tuple[str, int, str, bool]:
+        """Stream url into its partial file; return (path, size, sha256, resumed) once the file is complete."""
+        part_path, meta_path = self._partial_paths(url)
+        os.makedirs(self.partial_dir, exist_ok=True)
+        offset, headers = self._resume_offset(part_path, meta_path)
+        # Identity encoding keeps byte offsets and Content-Length about the file itself
+        response = self.session.get(url, headers={**headers, 'Accept-Encoding': 'identity'}, timeout=60, stream=True)
+        if response.status_code == 416 and offset:
+            # The partial reaches past the end of the remote file, so it is not a prefix of it
+            response.close()
+            os.remove(part_path)
+            offset = 0
+            response = self.session.get(url, headers={'Accept-Encoding': 'identity'}, timeout=60, stream=True)
+
+        with response:
+            response.raise_for_status()
+            digest = hashlib.sha256()
+            if offset and response.status_code == 206:
+                if not response.headers.get('Content-Range', '').startswith(f"bytes {offset}-"):
+                    raise ValueError(f"unexpected Content-Range {response.headers.get('Content-Range')!r}")
+                with open(part_path, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        digest.update(chunk)
+                total = response.headers['Content-Range'].rpartition('/')[2]
+            else:
+                # A 200 to a Range request means the file changed (If-Range failed), so start over
+                offset = 0
+                with open(meta_path, 'w') as f:
+                    json.dump({'url': url, 'validator': response.headers.get('ETag')
+                               or response.headers.get('Last-Modified')}, f)
+                total = response.headers.get('Content-Length', '')
+
+            size = offset
+            with open(part_path, 'ab' if offset else 'wb') as f:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+                    digest.update(chunk)
+                    size += len(chunk)
+                    self._count('bytes_downloaded', len(chunk))
+        if total.isdigit() and int(total) != size:
+            raise ValueError(f"incomplete download ({size} of {total} bytes)")
+        return part_path, size, digest.hexdigest(), offset > 0
+
+    def _discard_partial(self, url: str):
+        for path in self._partial_paths(url):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def fetch(self, url: str, expected_sha256: Optional[str] = None) -> Optional[Dict]:
+        """The mirror record {'file', 'size', 'sha256'} for url, downloading it unless already mirrored."""
+        with self.lock:
+            record = self.manifest['urls'].get(url)
+            existing = self.by_sha256.get(expected_sha256) if expected_sha256 else None
+        if record and os.path.isfile(os.path.join(self.mirror_dir, record['file'])):
+            self._count('cached')
+            return record
+        if existing and os.path.isfile(os.path.join(self.mirror_dir, existing['file'])):
+            # A recorded checksum that is already in the store needs no download at all
+            with self.lock:
+                record = self.manifest['urls'][url] = dict(existing)
+                self.stats['deduplicated'] += 1
+            return record
+        try:
+            part_path, size, digest, resumed = self._download(url)
+        except (RequestException, OSError, ValueError) as e:
+            # The partial file stays behind for the next run to resume
+            self.logger.error(f"Failed to mirror {url}: {str(e)}")
+            self._count('failed')
+            return None
+        if expected_sha256 and digest != expected_sha256:
+            self.logger.error(f"Failed to mirror {url}: SHA-256 {digest} does not match recorded {expected_sha256}")
+            self._discard_partial(url)
+            self._count('failed')
+            return None
+
+        with self.lock:
+            existing = self.by_sha256.get(digest)
+            if existing and os.path.isfile(os.path.join(self.mirror_dir, existing['file'])):
+                os.remove(part_path)
+                record = {'file': existing['file'], 'size': size, 'sha256': digest}
+                self.stats['deduplicated'] += 1
+            else:
+                record = {'file': mirror_filename(url, digest), 'size': size, 'sha256': digest}
+                os.replace(part_path, os.path.join(self.mirror_dir, record['file']))
+                self.by_sha256[digest] = record
+                self.stats['downloaded'] += 1
+            # Only a resume that produced a complete, verified file counts
+            self.stats['resumed'] += resumed
+            self.manifest['urls'][url] = record
+        self._discard_partial(url)
+        return record
+
+    def _mirror_file(self, url: str) -> Optional[str]:
+        """The mirror file a version URL refers to, either directly or through the manifest."""
+        prefix = f"{self.base_url}/"
+        if url.startswith(prefix):
+            return unquote(url[len(prefix):])
+        record = self.manifest['urls'].get(url)
+        return record['file'] if record else None
+
+    def mirror(self, store: AppStore, target: Optional[str] = None, rewrite: bool = False) -> int:
+        """Mirror every version URL not yet served from the mirror; return how many version entries changed.
+
+        Missing checksums are filled in from the download, and with rewrite the URLs point at the mirror.
+        """
+        prefix = f"{self.base_url}/"
+        pending: List[Tuple[AppEntry, Dict]] = []
+        for entry in store.load().select(target):
+            for version in entry.data.get('versions', []):
+                if version.get('url') and not version['url'].startswith(prefix):
+                    pending.append((entry, version))
+        if not pending:
+            return 0
+
+        os.makedirs(self.mirror_dir, exist_ok=True)
+        expected = {}
+        for _, version in pending:
+            expected.setdefault(version['url'], version.get('sha256'))
+        urls = list(expected)
+        if self.workers == 1 or len(urls) < 2:
+            results = {url: self.fetch(url, expected[url]) for url in urls}
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = dict(zip(urls, executor.map(lambda url: self.fetch(url, expected[url]), urls)))
+
+        changed = 0
+        for entry, version in pending:
+            record = results.get(version['url'])
+            if not record:
+                continue
+            updated = {**version, 'size': version.get('size') or record['size'], 'sha256': record['sha256']}
+            if rewrite:
+                updated['url'] = f"{prefix}{record['file']}"
+            if updated != version:
+                version.update(updated)
+                store.mark_dirty(entry.name)
+                changed += 1
+        return changed
+
+    def prune(self, store: AppStore) -> int:
+        """Delete mirrored files and partial downloads no app version refers to any more; return files removed.
+
+        Every app is considered, whatever subset was mirrored, so keep_versions trimming frees its files.
+        """
+        urls = {version['url'] for entry in store.load().select()
+                for version in entry.data.get('versions', []) if version.get('url')}
+        referenced = {self._mirror_file(url) for url in urls} - {None}
+        with self.lock:
+            owned = {record['file'] for record in self.manifest['urls'].values()}
+            self.manifest['urls'] = {url: record for url, record in self.manifest['urls'].items()
+                                     if record['file'] in referenced}
+            self.by_sha256 = {sha: record for sha, record in self.by_sha256.items() if record['file'] in referenced}
+
+        removed = 0
+        for name in sorted(owned - referenced):
+            path = os.path.join(self.mirror_dir, name)
+            if os.path.isfile(path):
+                os.remove(path)
+                removed += 1
+        if os.path.isdir(self.partial_dir):
+            for name in os.listdir(self.partial_dir):
+                if not name.endswith('.json'):
+                    continue
+                meta_path = os.path.join(self.partial_dir, name)
+                try:
+                    with open(meta_path, 'r') as f:
+                        url = json.load(f).get('url')
+                except (json.JSONDecodeError, IOError):
+                    url = None
+                if not url:
+                    os.remove(meta_path)
+                elif url not in urls:
+                    self._discard_partial(url)
+        self._count('pruned', removed)
+        return removed
+
+    def summary(self) -> str:
+        return (f"Mirror: {self.stats['downloaded']} downloaded ({self.stats['resumed']} resumed), "
+                f"{self.stats['deduplicated']} deduplicated, {self.stats['cached']} cached, "
+                f"{self.stats['failed']} failed, {self.stats['pruned']} pruned, "
+                f"{self.stats['bytes_downloaded']} bytes downloaded")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mirror release assets referenced by app.json files into static/IPA")
+    parser.add_argument("--apps", type=str, help="Comma-separated list of app names")
+    parser.add_argument("--workers", type=int, default=4, help="Number of concurrent downloads")
+    parser.add_argument("--rewrite-urls", action="store_true", help="Point mirrored version URLs at the mirror")
+    parser.add_argument("--no-prune", action="store_true", help="Keep mirrored files no version refers to")
+    parser.add_argument("--mirror-dir", type=str, help="Directory holding the mirror (default: static/IPA)")
+    parser.add_argument("--base-url", type=str, default=MIRROR_BASE_URL, help="Public URL of the mirror directory")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    store = AppStore(os.path.join(current_dir, "..", "Apps"))
+    mirror = IPAMirror(args.mirror_dir or os.path.join(current_dir, "..", "static", "IPA"), base_url=args.base_url,
+                       workers=args.workers)
+    targets = [target.strip() for target in args.apps.split(",")] if args.apps else [None]
+    changed = sum(mirror.mirror(store, target, rewrite=args.rewrite_urls) for target in targets)
+    if not args.no_prune:
+        mirror.prune(store)
+    written = store.save()
+    if not mirror.save():
+        mirror.logger.error(f"Failed to save mirror manifest {mirror.manifest_path}")
+    mirror.logger.info(f"{mirror.summary()}; updated {changed} versions in {written} app configs")
@@ -0,0 +1,151 @@
+"""JSON parsing and serialization for the scripts: orjson when it is installed, the stdlib json module otherwise.
+
+Output is byte-identical to the json.dumps calls it replaces; anything orjson would spell differently
+(escaped non-ASCII, exponent floats, huge ints, non-string keys) is handed to the stdlib instead.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import os
+import re
+from typing import Callable, Iterable, List, Optional, TypeVar
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+BACKEND = 'orjson' if orjson else 'json'
+# The stdlib writes floats below 1e-4 or from 1e16 in exponent form, orjson as 0.00001 and 1e16.
+# Matches inside strings are possible and only cost a stdlib fallback
+EXPONENT = re.compile(rb'e-?[0-9]')
+DIGITS = b'0123456789'
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def loads(data):
+    """Parse str or bytes; documents orjson rejects (NaN, huge ints) get the stdlib's result or error."""
+    if orjson:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(data)
+
+
+def _orjson_dumps(value, indent: Optional[int], ensure_ascii: bool, sort_keys: bool) -> Optional[bytes]:
+    option = orjson.OPT_SORT_KEYS if sort_keys else 0
+    if indent:
+        option |= orjson.OPT_INDENT_2
+    try:
+        raw = orjson.dumps(value, option=option)
+    except TypeError:
+        return None
+    if (ensure_ascii and not raw.isascii()) or _float_spelling_differs(raw) or (b'null' in raw and _has_nan(value)):
+        return None
+    return _reindent(raw) if indent == 4 else raw
+
+
+def _float_spelling_differs(raw: bytes) -> bool:
+    if b'0.0000' in raw:
+        return True
+    return any(m.start() and raw[m.start() - 1] in DIGITS for m in EXPONENT.finditer(raw))
+
+
+def _reindent(raw: bytes) -> bytes:
+    """Turn orjson's 2-space indentation into 4 spaces.
+
+    Line breaks and tabs inside strings are always escaped, so every raw newline is structural and tabs
+    are free to mark each line's depth, deepest first, before they are expanded.
+    """
+    depth = 1
+    while b'\n' + b'  ' * depth in raw:
+        depth += 1
+    for level in range(depth - 1, 0, -1):
+        raw = raw.replace(b'\n' + b'  ' * level, b'\n' + b'\t' * level)
+    return raw.replace(b'\t', b'    ')
+
+
+def _has_nan(value) -> bool:
+    if isinstance(value, float):
+        return value != value or value in (float('inf'), float('-inf'))
+    if isinstance(value, dict):
+        return any(_has_nan(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return any(_has_nan(v) for v in value)
+    return False
+
+
+def dumps_bytes(value, indent: Optional[int] = None, ensure_ascii: bool = True, sort_keys: bool = False) -> bytes:
+    """UTF-8 equivalent of json.dumps(value, indent=indent, ensure_ascii=..., sort_keys=...), compact when indent is None.
+
+    Unlike json.dumps, indent=None means the compact (',', ':') separators every caller here uses.
+    """
+    if orjson and indent in (None, 2, 4):
+        raw = _orjson_dumps(value, indent, ensure_ascii, sort_keys)
+        if raw is not None:
+            return raw
+    separators = None if indent else (',', ':')
+    return json.dumps(value, indent=indent, ensure_ascii=ensure_ascii, sort_keys=sort_keys,
+                      separators=separators).encode('utf-8')
+
+
+def dumps(value, indent: Optional[int] = None, ensure_ascii: bool = True, sort_keys: bool = False) -> str:
+    if orjson and indent in (None, 2, 4):
+        raw = _orjson_dumps(value, indent, ensure_ascii, sort_keys)
+        if raw is not None:
+            return raw.decode('utf-8')
+    separators = None if indent else (',', ':')
+    return json.dumps(value, indent=indent, ensure_ascii=ensure_ascii, sort_keys=sort_keys, separators=separators)
+
+
+def read_json(path: str, logger: Optional[logging.Logger] = None, label: str = 'JSON file'):
+    """Parsed contents of path, or None when it is missing or unreadable; unreadable files are logged to logger."""
+    try:
+        with open(path, 'rb') as f:
+            return loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (ValueError, OSError) as e:
+        # JSONDecodeError and UnicodeDecodeError are ValueErrors, PermissionError an OSError
+        if logger:
+            logger.error(f"Failed to load {label} {path}: {str(e)}")
+        return None
+
+
+def write_json(path: str, value, indent: Optional[int] = None, ensure_ascii: bool = True,
+               sort_keys: bool = False) -> Optional[int]:
+    """Atomically replace path with dumps_bytes(value, ...), creating its directory; returns the bytes written.
+
+    The document goes to path.tmp first, so readers and an interrupted run only ever see the old or the new
+    file. None means nothing could be written and any previous file is left as it was.
+    """
+    tmp_path = f"{path}.tmp"
+    try:
+        raw = dumps_bytes(value, indent=indent, ensure_ascii=ensure_ascii, sort_keys=sort_keys)
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        return None
+    return len(raw)
+
+
+def map_ordered(func: Callable[[T], R], items: Iterable[T], workers: Optional[int] = None) -> List[R]:
+    """func over items on a thread pool, results in input order; file reads overlap while parsing stays cheap.
+
+    Defaults to one thread per CPU (at most 8); on a single CPU the pool only adds contention, so it is skipped.
+    """
+    items = list(items)
+    workers = workers or min(8, os.cpu_count() or 1)
+    if workers == 1 or len(items) < 2:
+        return [func(item) for item in items]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(func, items))
@@ -1,14 +1,164 @@
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import json
 import logging
 import os
-from typing import Optional
+import re
+import shutil
+import time
+from typing import Optional, Tuple
 
 from PIL import Image
 
+from app_store import AppStore, stage_store
+from asset_store import SharedAssetStore
+import json_io
+from metrics import Metrics, profiled
+
+RAW_BASE_URL = "https://raw.githubusercontent.com/DRKCTRL/DRKSRC/main/Apps"
+SCREENSHOT_EXTENSIONS = ['.jpg', '.jpeg', '.png', '.webp']
+MAX_SCREENSHOTS = 4
+MANIFEST_NAME = '.assets.json'
+# Lossy screenshot variants live in their own subdirectory so they are never picked up as source screenshots
+VARIANTS = {'webp': ('WEBP', '.webp'), 'jpeg': ('JPEG', '.jpg')}
+HASH_LENGTH = 12
+HASHED_NAME = re.compile(r'^(icon|IMG_\d+)\.[0-9a-f]{%d}\.(png|webp|jpg)$' % HASH_LENGTH)
+
+
+def _needs_flattening(img: Image.Image) -> bool:
+    return img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+
+
+def _flatten_transparency(img: Image.Image) -> Image.Image:
+    """Convert to RGB to match original behavior (optional: keep transparency if desired)."""
+    if _needs_flattening(img):
+        return img.convert('RGB')
+    return img
+
+
+def file_sha256(path: str) -> str:
+    """Hash a file in fixed-size chunks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def asset_record(path: str) -> dict:
+    """Describe a processed image by hash, dimensions and mode, reading only its header."""
+    with Image.open(path) as img:
+        return {'sha256': file_sha256(path), 'size': list(img.size), 'mode': img.mode}
+
+
+def _save_variant(img: Image.Image, path: str, variant: str, quality: int):
+    """Write a lossy copy of a screenshot in the requested format."""
+    image_format = VARIANTS[variant][0]
+    if image_format == 'JPEG':
+        img = img if img.mode in ('RGB', 'L') else img.convert('RGB')
+        img.save(path, image_format, quality=quality, optimize=True, progressive=True)
+    else:
+        img.save(path, image_format, quality=quality, method=6)
+
+
+def convert_icon(app_dir: str, optimize: bool = False) -> dict:
+    """Convert the app icon to PNG 128x128 in place; runs in worker processes."""
+    preferred_icon_path = os.path.join(app_dir, 'icon.png')
+    errors = []
+
+    # Check if icon.png exists
+    if os.path.isfile(preferred_icon_path):
+        try:
+            converted = False
+            with Image.open(preferred_icon_path) as img:
+                if img.size != (128, 128):
+                    img_resized = _flatten_transparency(img.resize((128, 128), Image.Resampling.LANCZOS))
+                    img_resized.save(preferred_icon_path, 'PNG', optimize=optimize)
+                    converted = True
+            return {'found': True, 'converted': converted, 'errors': errors, 'record': asset_record(preferred_icon_path)}
+        except Exception as e:
+            errors.append(f"Failed to process existing icon.png: {str(e)}")
+            # Proceed to look for other icons
+
+    # Look for other icon files
+    for ext in ['.jpg', '.jpeg', '.webp']:
+        icon_path = os.path.join(app_dir, f'icon{ext}')
+        if os.path.isfile(icon_path):
+            try:
+                with Image.open(icon_path) as img:
+                    img = _flatten_transparency(img)
+                    # Resize to 128x128 and save as PNG for lossless quality
+                    img.resize((128, 128), Image.Resampling.LANCZOS).save(preferred_icon_path, 'PNG', optimize=optimize)
+                os.remove(icon_path)
+                return {'found': True, 'converted': True, 'errors': errors, 'record': asset_record(preferred_icon_path)}
+            except Exception as e:
+                errors.append(f"Failed to convert icon{ext}: {str(e)}")
+                continue
+
+    return {'found': False, 'converted': False, 'errors': errors, 'record': None}
+
+
+def convert_screenshot(input_path: str, staged_path: str, options: dict, variant_staged: Optional[str] = None) -> dict:
+    """Convert one screenshot to PNG (plus an optional lossy variant) at staging paths."""
+    try:
+        input_bytes = os.path.getsize(input_path)
+        with Image.open(input_path) as img:
+            img = _flatten_transparency(img)
+            max_dimension = options.get('max_dimension')
+            if max_dimension and max(img.size) > max_dimension:
+                scale = max_dimension / max(img.size)
+                size = (max(1, round(img.width * scale)), max(1, round(img.height * scale)))
+                img = img.resize(size, Image.Resampling.LANCZOS)
+            # Save as PNG for lossless quality
+            img.save(staged_path, 'PNG', optimize=options.get('optimize', False))
+            if variant_staged:
+                os.makedirs(os.path.dirname(variant_staged), exist_ok=True)
+                _save_variant(img, variant_staged, options['variant'], options.get('quality', 85))
+        return {
+            'error': None,
+            'record': asset_record(staged_path),
+            'variant_record': asset_record(variant_staged) if variant_staged else None,
+            'input_bytes': input_bytes,
+            'output_bytes': os.path.getsize(variant_staged or staged_path)
+        }
+    except Exception as e:
+        for path in (staged_path, variant_staged):
+            if path and os.path.exists(path):
+                os.remove(path)
+        return {'error': str(e), 'record': None}
+
+
+def timed_task(func, args: tuple) -> Tuple[dict, float]:
+    """Run one conversion and report how long it took inside the worker."""
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
 class AssetManager:
-    def __init__(self, apps_root: str):
+    def __init__(self, apps_root: str, jobs: int = 1, max_dimension: Optional[int] = None, optimize: bool = False,
+                 variant: Optional[str] = None, quality: int = 85, hashed_names: bool = False,
+                 metrics_path: Optional[str] = None, store: Optional[AppStore] = None, shared_dir: Optional[str] = None,
+                 near_duplicates: Optional[int] = None):
+        if not isinstance(jobs, int) or jobs < 1:
+            raise ValueError("jobs must be a positive integer")
+        if max_dimension is not None and max_dimension < 1:
+            raise ValueError("max_dimension must be a positive integer")
+        if variant is not None and variant not in VARIANTS:
+            raise ValueError(f"variant must be one of {', '.join(VARIANTS)}")
         self.apps_root = apps_root
+        self.jobs = jobs
+        # Recorded in each manifest so that changing any of these reprocesses previously skipped assets
+        self.options = {'max_dimension': max_dimension, 'optimize': optimize, 'variant': variant, 'quality': quality}
+        self.hashed_names = hashed_names
         self.logger = self._init_logger()
+        self.stats = {'converted': 0, 'skipped': 0, 'failed': 0, 'bytes_saved': 0}
+        self.metrics = Metrics('manage_assets')
+        self.metrics_path = metrics_path
+        self.store, self.owns_store = stage_store(apps_root, store)
+        # Identical images across apps are stored, converted and published once; None keeps per-app copies
+        self.shared = SharedAssetStore(shared_dir, near_duplicates=near_duplicates) if shared_dir else None
+        self.options_key = hashlib.sha256(json.dumps(self.options, sort_keys=True).encode('utf-8')).hexdigest()[:HASH_LENGTH]
 
     def _init_logger(self) -> logging.Logger:
         logger = logging.getLogger("AssetManager")
@@ -20,166 +170,379 @@ class AssetManager:
 
     def manage_icons(self, target: Optional[str] = None):
         """Manage icons and screenshots for all apps or a specific target app."""
-        for app in os.listdir(self.apps_root):
-            path = os.path.join(self.apps_root, app)
-            config_path = os.path.join(path, 'app.json')
+        with self.metrics.stage('load_configs'):
+            entries = self.store.load().select(target)
+        apps = []
+        for entry in entries:
+            app, path = entry.name, entry.dir
+            with self.metrics.stage('plan', app):
+                manifest = self._load_manifest(path)
+                if manifest.get('_options') != self.options:
+                    manifest = {'_options': manifest.get('_options')}
+                apps.append({
+                    'name': app, 'dir': path, 'data': entry.data, 'manifest': manifest,
+                    'icon': self._plan_icon(path, manifest),
+                    'screenshots': self._plan_screenshots(app, path, manifest)
+                })
 
-            if not self._valid_app_path(path, config_path, target):
-                continue
+        # Every image is converted independently; results come back in submission order so output matches a serial run
+        tasks, pending, converting = [], [], {}
+        for app in apps:
+            if app['icon'] is None:
+                # convert_icon rewrites icon.png in place, which must never write through to a shared image
+                self._detach_link(os.path.join(app['dir'], 'icon.png'))
+                tasks.append((app['name'], convert_icon, (app['dir'], self.options['optimize'])))
+                pending.append((app, None))
+            for shot in app['screenshots']:
+                if shot['skip'] or (self.shared and self._reuse_conversion(shot, converting)):
+                    continue
+                tasks.append((app['name'], convert_screenshot,
+                              (shot['input'], shot['staged'], self.options, shot['variant_staged'])))
+                pending.append((app, shot))
+        with self.metrics.stage('convert_pool'):
+            results = self._run_tasks(tasks)
+        for (app, shot), result in zip(pending, results):
+            if shot is None:
+                app['icon'] = result
+            else:
+                shot.update(result)
+        if self.shared:
+            self._copy_conversions(apps)
 
-            self._update_icon(app, config_path)
-            self._update_screenshots(app, config_path)
+        for app in apps:
+            with self.metrics.stage('finish', app['name']):
+                self._finish_app(app)
 
-    def _valid_app_path(self, path: str, config: str, target: Optional[str]) -> bool:
-        """Check if the path is valid and matches the target if specified."""
-        return os.path.isdir(path) and os.path.isfile(config) and (not target or os.path.basename(path) == target)
+        self.logger.info(f"Assets: {self.stats['converted']} converted, {self.stats['skipped']} skipped (unchanged), "
+                         f"{self.stats['failed']} failed, {self.stats['bytes_saved']} bytes saved")
 
-    def _update_icon(self, app_name: str, config_path: str):
-        """Update the icon URL in the app's config."""
-        try:
-            with open(config_path, 'r') as f:
-                data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError, PermissionError) as e:
-            self.logger.error(f"Error reading config for {app_name}: {str(e)}")
-            return
+    def finish(self):
+        """Write back changed app.json files and save the metrics report for every manage_icons call of this run."""
+        if self.owns_store:
+            with self.metrics.stage('write_configs'):
+                self.store.save()
+            self.metrics.incr('bytes_written', self.store.stats['bytes_written'])
+        for name in ('converted', 'skipped', 'failed'):
+            self.metrics.incr(f'images_{name}', self.stats[name])
+        self.metrics.incr('bytes_saved', self.stats['bytes_saved'])
+        if self.shared:
+            self.shared.prune(self.apps_root)
+            if not self.shared.save():
+                self.logger.error(f"Failed to save shared asset index {self.shared.index_path}")
+            self.metrics.incr('shared_bytes_saved', self.shared.bytes_saved())
+            self.logger.info(self.shared.summary())
+        self.logger.info(self.metrics.summary())
+        if self.metrics_path and not self.metrics.save(self.metrics_path):
+            self.logger.error(f"Failed to save metrics {self.metrics_path}")
 
-        icon_url = self._convert_and_get_icon_url(app_name, os.path.dirname(config_path))
-        data['icon'] = icon_url
-        self._save_config(config_path, data)
-        self.logger.info(f"Updated icon for {app_name}: {icon_url}")
+    def _finish_app(self, app: dict):
+        """Apply one app's conversion results to disk, its app.json and its manifest."""
+        icon_result = app['icon']
+        data = app['data']
+        published = set()
+        if self.shared:
+            self.shared.release(app['name'])
+        data['icon'] = self._finish_icon(app['name'], icon_result, published)
+        self.logger.info(f"Updated icon for {app['name']}: {data['icon']}")
+        data['screenshots'] = self._finish_screenshots(app['name'], app['screenshots'], published)
+        self.logger.info(f"Updated screenshots for {app['name']}: {len(data['screenshots'])} found")
+        self._prune_hashed(app['dir'], published)
+        self.store.mark_dirty(app['name'])
+        self._save_manifest(app['dir'], app['manifest'], self._build_manifest(icon_result, app['screenshots']))
+        self._report_savings(app['name'], app['screenshots'])
 
-    def _update_screenshots(self, app_name: str, config_path: str):
-        """Update the screenshots list in the app's config."""
-        try:
-            with open(config_path, 'r') as f:
-                data = json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError, PermissionError) as e:
-            self.logger.error(f"Error reading config for {app_name}: {str(e)}")
+    def _run_tasks(self, tasks: list) -> list:
+        """Run conversion tasks in-process or across a process pool, preserving task order."""
+        if self.jobs == 1 or len(tasks) < 2:
+            timed = [timed_task(func, args) for _, func, args in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=self.jobs) as executor:
+                futures = [executor.submit(timed_task, func, args) for _, func, args in tasks]
+                timed = [future.result() for future in futures]
+        for (app_name, _, _), (_, seconds) in zip(tasks, timed):
+            self.metrics.add_time('convert', seconds, app_name)
+        return [result for result, _ in timed]
+
+    def _load_manifest(self, app_dir: str) -> dict:
+        """Load the record of previously processed assets for an app."""
+        manifest = json_io.read_json(os.path.join(app_dir, MANIFEST_NAME))
+        return manifest if isinstance(manifest, dict) else {}
+
+    def _save_manifest(self, app_dir: str, old: dict, new: dict):
+        """Write the asset manifest, leaving the file untouched when nothing changed."""
+        new = {'_options': self.options, **new}
+        if old == new:
             return
+        path = os.path.join(app_dir, MANIFEST_NAME)
+        written = json_io.write_json(path, new, indent=4, sort_keys=True)
+        if written is None:
+            self.logger.error(f"Failed to save manifest {path}")
+        else:
+            self.metrics.incr('bytes_written', written)
 
-        screenshot_urls = self._convert_and_get_screenshot_urls(app_name, os.path.dirname(config_path))
-        data['screenshots'] = screenshot_urls
-        self._save_config(config_path, data)
-        self.logger.info(f"Updated screenshots for {app_name}: {len(screenshot_urls)} found")
+    def _build_manifest(self, icon_result: dict, screenshots: list) -> dict:
+        """Record the processed icon and screenshots that are now on disk."""
+        manifest = {}
+        if icon_result['record']:
+            manifest['icon.png'] = icon_result['record']
+        for shot in screenshots:
+            if shot['error'] is None:
+                manifest[shot['key']] = shot['record']
+                if shot['variant_output']:
+                    manifest[shot['variant_key']] = shot['variant_record']
+        return manifest
 
-    def _convert_and_get_icon_url(self, app_name: str, app_dir: str) -> str:
-        """Convert icon to PNG 128x128 and return URL, skipping if already correct."""
-        preferred_icon_path = os.path.join(app_dir, 'icon.png')
+    def _plan_icon(self, app_dir: str, manifest: dict) -> Optional[dict]:
+        """Return a finished icon result when icon.png is unchanged since it was processed, else None."""
+        icon_path = os.path.join(app_dir, 'icon.png')
+        record = manifest.get('icon.png')
+        if record and os.path.isfile(icon_path) and file_sha256(icon_path) == record.get('sha256'):
+            return {'found': True, 'converted': False, 'errors': [], 'record': record}
+        return None
 
-        # Check if icon.png exists
-        if os.path.isfile(preferred_icon_path):
-            try:
-                with Image.open(preferred_icon_path) as img:
-                    if img.size == (128, 128):
-                        # Already 128x128, no need to process
-                        return f"https://raw.githubusercontent.com/DRKCTRL/DRKSRC/main/Apps/{app_name}/icon.png"
-                    else:
-                        # Resize to 128x128
-                        img_resized = img.resize((128, 128), Image.Resampling.LANCZOS)
-                        # Convert to RGB to match original behavior (optional: keep transparency if desired)
-                        if img_resized.mode in ('RGBA', 'LA') or (img_resized.mode == 'P' and 'transparency' in img_resized.info):
-                            img_resized = img_resized.convert('RGB')
-                        img_resized.save(preferred_icon_path, 'PNG')
-                        return f"https://raw.githubusercontent.com/DRKCTRL/DRKSRC/main/Apps/{app_name}/icon.png"
-            except Exception as e:
-                self.logger.error(f"Failed to process existing icon.png for {app_name}: {str(e)}")
-                # Proceed to look for other icons
-
-        # Look for other icon files
-        other_extensions = ['.jpg', '.jpeg', '.webp']
-        for ext in other_extensions:
-            icon_path = os.path.join(app_dir, f'icon{ext}')
-            if os.path.isfile(icon_path):
+    def _finish_icon(self, app_name: str, result: dict, published: set) -> str:
+        """Log icon conversion problems and return the icon URL."""
+        for error in result['errors']:
+            self.logger.error(f"{error} for {app_name}")
+        if not result['found']:
+            self.logger.info(f"No icon found for {app_name}")
+            return ""
+        self.stats['converted' if result['converted'] else 'skipped'] += 1
+        if result['converted']:
+            self.metrics.incr('bytes_written', os.path.getsize(os.path.join(self.apps_root, app_name, 'icon.png')))
+        url, result['record'] = self._publish(app_name, 'icon.png', result['record'], published)
+        return url
+
+    def _publish(self, app_name: str, relative_path: str, record: dict, published: set) -> Tuple[str, dict]:
+        """Return the public URL of an asset and its record, which only a shared near-duplicate changes.
+
+        With a shared store the asset is published from there; otherwise it is linked to a content-hash
+        filename when enabled.
+        """
+        if self.shared:
+            return self.shared.share(app_name, relative_path, os.path.join(self.apps_root, app_name, relative_path), record)
+        self._detach_link(os.path.join(self.apps_root, app_name, relative_path))
+        if self.hashed_names:
+            stem, ext = os.path.splitext(relative_path)
+            relative_path = f"{stem}.{record['sha256'][:HASH_LENGTH]}{ext}"
+            source = os.path.join(self.apps_root, app_name, f"{stem}{ext}")
+            target = os.path.join(self.apps_root, app_name, relative_path)
+            if not os.path.exists(target):
                 try:
-                    with Image.open(icon_path) as img:
-                        # Convert to RGB to match original behavior
-                        if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-                            img = img.convert('RGB')
-                        # Resize to 128x128
-                        img_resized = img.resize((128, 128), Image.Resampling.LANCZOS)
-                        # Save as PNG for lossless quality
-                        img_resized.save(preferred_icon_path, 'PNG')
-                        # Remove original
-                        os.remove(icon_path)
-                        return f"https://raw.githubusercontent.com/DRKCTRL/DRKSRC/main/Apps/{app_name}/icon.png"
-                except Exception as e:
-                    self.logger.error(f"Failed to convert icon{ext} for {app_name}: {str(e)}")
+                    os.link(source, target)
+                except OSError:
+                    shutil.copyfile(source, target)
+            published.add(os.path.normpath(target))
+        return f"{RAW_BASE_URL}/{app_name}/{relative_path}", record
+
+    def _detach_link(self, path: str):
+        """Replace a symlink into the shared store with a private copy before the file is rewritten or published per app."""
+        if not os.path.islink(path):
+            return
+        tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.tmp")
+        try:
+            shutil.copyfile(path, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            self.logger.error(f"Failed to detach {path} from the shared store: {str(e)}")
+
+    def _reuse_conversion(self, shot: dict, converting: dict) -> bool:
+        """Satisfy a screenshot from an identical source converted earlier in this run or stored by a previous one."""
+        try:
+            shot['source_key'] = f"{file_sha256(shot['input'])}:{self.options_key}"
+        except OSError:
+            return False
+        if shot['source_key'] in converting:
+            shot['copy_of'] = converting[shot['source_key']]
+            return True
+        stored = self.shared.conversion(shot['source_key'])
+        if stored is None:
+            converting[shot['source_key']] = shot
+            return False
+        record, variant_record = stored
+        shutil.copyfile(self.shared.stored_path(record), shot['staged'])
+        if shot['variant_staged']:
+            os.makedirs(os.path.dirname(shot['variant_staged']), exist_ok=True)
+            shutil.copyfile(self.shared.stored_path(variant_record), shot['variant_staged'])
+        shot.update({'error': None, 'record': record, 'variant_record': variant_record,
+                     'input_bytes': os.path.getsize(shot['input']),
+                     'output_bytes': os.path.getsize(shot['variant_staged'] or shot['staged'])})
+        self.shared.stats['reused_conversions'] += 1
+        return True
+
+    def _copy_conversions(self, apps: list):
+        """Give screenshots whose source repeats another's in this run a copy of that one's staged output."""
+        for app in apps:
+            for shot in app['screenshots']:
+                primary = shot.pop('copy_of', None)
+                if primary is None:
+                    continue
+                if primary['error'] is not None:
+                    shot.update({'error': primary['error'], 'record': None})
                     continue
+                shutil.copyfile(primary['staged'], shot['staged'])
+                if shot['variant_staged']:
+                    os.makedirs(os.path.dirname(shot['variant_staged']), exist_ok=True)
+                    shutil.copyfile(primary['variant_staged'], shot['variant_staged'])
+                shot.update({key: primary[key] for key in ('error', 'record', 'variant_record', 'input_bytes', 'output_bytes')})
+                self.shared.stats['reused_conversions'] += 1
 
-        self.logger.info(f"No icon found for {app_name}")
-        return ""
+    def _prune_hashed(self, app_dir: str, published: set):
+        """Remove content-hash copies that no longer back a published URL."""
+        screenshots_dir = os.path.join(app_dir, 'screenshots')
+        for directory in [app_dir, screenshots_dir] + [os.path.join(screenshots_dir, v) for v in VARIANTS]:
+            if not os.path.isdir(directory):
+                continue
+            for filename in os.listdir(directory):
+                path = os.path.normpath(os.path.join(directory, filename))
+                if HASHED_NAME.match(filename) and path not in published:
+                    os.remove(path)
 
-    def _convert_and_get_screenshot_urls(self, app_name: str, app_dir: str) -> list:
-        """Convert screenshots to PNG with progressive naming, max 4, and return list of URLs."""
+    def _plan_screenshots(self, app_name: str, app_dir: str, manifest: dict) -> list:
+        """Pick up to four screenshots and assign each its progressive IMG_n.png name and staging path."""
         screenshots_dir = os.path.join(app_dir, 'screenshots')
         if not os.path.isdir(screenshots_dir):
             self.logger.info(f"No screenshots directory found for {app_name}")
             return []
 
-        supported_extensions = ['.jpg', '.jpeg', '.png', '.webp']
-        screenshot_files = []
-        
-        # Collect all valid screenshot files
-        for filename in os.listdir(screenshots_dir):
-            if any(filename.lower().endswith(ext) for ext in supported_extensions):
-                screenshot_files.append(filename)
-        
-        # Limit to 4 screenshots
-        screenshot_files = sorted(screenshot_files)[:4]
-        new_screenshot_urls = []
-        
-        # Convert and rename each screenshot
+        screenshot_files = sorted(
+            filename for filename in os.listdir(screenshots_dir)
+            if any(filename.lower().endswith(ext) for ext in SCREENSHOT_EXTENSIONS) and not HASHED_NAME.match(filename)
+        )[:MAX_SCREENSHOTS]
+
+        variant = self.options['variant']
+        plan = []
         for i, filename in enumerate(screenshot_files, 1):
-            input_path = os.path.join(screenshots_dir, filename)
             new_filename = f"IMG_{i}.png"
-            output_path = os.path.join(screenshots_dir, new_filename)
-            
-            try:
-                # Open and convert the image
-                with Image.open(input_path) as img:
-                    # Convert to RGB to match original behavior (optional: keep transparency if desired)
-                    if img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info):
-                        img = img.convert('RGB')
-                    # Save as PNG for lossless quality, keeping original dimensions
-                    img.save(output_path, 'PNG')
-                
-                # Add URL to list
-                base_url = f"https://raw.githubusercontent.com/DRKCTRL/DRKSRC/main/Apps/{app_name}/screenshots"
-                new_screenshot_urls.append(f"{base_url}/{new_filename}")
-                
-                # Remove original if different from new file
-                if input_path != output_path and os.path.exists(input_path):
-                    os.remove(input_path)
-                    
-            except Exception as e:
-                self.logger.error(f"Failed to convert screenshot {filename} for {app_name}: {str(e)}")
+            shot = {
+                'filename': filename,
+                'input': os.path.join(screenshots_dir, filename),
+                'staged': os.path.join(screenshots_dir, f".{new_filename}.tmp"),
+                'output': os.path.join(screenshots_dir, new_filename),
+                'key': f"screenshots/{new_filename}",
+                'variant_staged': None, 'variant_output': None, 'variant_key': None, 'variant_record': None,
+                'skip': False, 'error': None, 'record': None
+            }
+            if variant:
+                variant_name = f"IMG_{i}{VARIANTS[variant][1]}"
+                shot['variant_staged'] = os.path.join(screenshots_dir, variant, f".{variant_name}.tmp")
+                shot['variant_output'] = os.path.join(screenshots_dir, variant, variant_name)
+                shot['variant_key'] = f"screenshots/{variant}/{variant_name}"
+            if filename == new_filename:
+                shot['record'] = self._unchanged_record(shot['input'], manifest.get(shot['key']))
+                if shot['record'] is not None and variant:
+                    shot['variant_record'] = self._unchanged_record(shot['variant_output'], manifest.get(shot['variant_key']))
+                    shot['skip'] = shot['variant_record'] is not None
+                else:
+                    shot['skip'] = shot['record'] is not None
+            plan.append(shot)
+        return plan
+
+    def _unchanged_record(self, path: str, record: Optional[dict]) -> Optional[dict]:
+        """Return a manifest record when an image is already in its final form, without decoding pixels."""
+        try:
+            digest = file_sha256(path)
+            if record and record.get('sha256') == digest:
+                return record
+            if self.options['optimize'] or self.options['variant']:
+                return None
+            # Unknown file: Image.open only parses the header, which is enough to tell whether a re-encode would change it
+            with Image.open(path) as img:
+                max_dimension = self.options['max_dimension']
+                if max_dimension and max(img.size) > max_dimension:
+                    return None
+                if img.format == 'PNG' and not _needs_flattening(img):
+                    return {'sha256': digest, 'size': list(img.size), 'mode': img.mode}
+        except Exception:
+            pass
+        return None
+
+    def _finish_screenshots(self, app_name: str, plan: list, published: set) -> list:
+        """Move staged screenshots into place, remove replaced originals and return their URLs."""
+        # Originals are only removed once every conversion has read its input
+        outputs = {shot['output'] for shot in plan if shot['error'] is None}
+        for shot in plan:
+            if shot['error'] is None and shot['input'] not in outputs and os.path.exists(shot['input']):
+                os.remove(shot['input'])
+
+        new_screenshot_urls = []
+        for shot in plan:
+            if shot['error'] is not None:
+                self.logger.error(f"Failed to convert screenshot {shot['filename']} for {app_name}: {shot['error']}")
+                self.stats['failed'] += 1
                 continue
+            if shot['skip']:
+                self.stats['skipped'] += 1
+            else:
+                os.replace(shot['staged'], shot['output'])
+                self.metrics.incr('bytes_written', os.path.getsize(shot['output']))
+                if shot['variant_output']:
+                    os.replace(shot['variant_staged'], shot['variant_output'])
+                    self.metrics.incr('bytes_written', os.path.getsize(shot['variant_output']))
+                self.stats['converted'] += 1
+            self._remove_stale_variants(shot)
+            if shot['variant_key']:
+                if self.shared:
+                    # The unpublished PNG is shared too, so identical copies take no extra space
+                    _, shot['record'] = self.shared.share(app_name, shot['key'], shot['output'], shot['record'])
+                else:
+                    self._detach_link(shot['output'])
+                url, shot['variant_record'] = self._publish(app_name, shot['variant_key'], shot['variant_record'], published)
+            else:
+                url, shot['record'] = self._publish(app_name, shot['key'], shot['record'], published)
+            if self.shared and shot.get('source_key'):
+                self.shared.remember_conversion(shot['source_key'], shot['record'], shot['variant_record'])
+            new_screenshot_urls.append(url)
 
-        if not new_screenshot_urls:
+        if plan and not new_screenshot_urls:
             self.logger.info(f"No screenshots found or converted for {app_name}")
-            return []
-
         return new_screenshot_urls
 
-    def _save_config(self, path: str, data: dict):
-        """Save the updated config data."""
-        try:
-            with open(path, 'w') as f:
-                json.dump(data, f, indent=4)
-        except (IOError, PermissionError) as e:
-            self.logger.error(f"Failed to save config {path}: {str(e)}")
+    def _remove_stale_variants(self, shot: dict):
+        """Delete lossy copies in formats the current configuration no longer selects."""
+        screenshots_dir = os.path.dirname(shot['output'])
+        stem = os.path.splitext(os.path.basename(shot['output']))[0]
+        for variant, (_, ext) in VARIANTS.items():
+            path = os.path.join(screenshots_dir, variant, f"{stem}{ext}")
+            if variant != self.options['variant'] and os.path.exists(path):
+                os.remove(path)
+                if not os.listdir(os.path.dirname(path)):
+                    os.rmdir(os.path.dirname(path))
+
+    def _report_savings(self, app_name: str, screenshots: list):
+        """Log how many bytes this run's screenshot conversions saved for an app."""
+        converted = [shot for shot in screenshots if not shot['skip'] and shot['error'] is None]
+        if not converted:
+            return
+        before = sum(shot['input_bytes'] for shot in converted)
+        after = sum(shot['output_bytes'] for shot in converted)
+        self.stats['bytes_saved'] += before - after
+        self.logger.info(f"Optimized {app_name}: {before} -> {after} bytes ({before - after} saved)")
 
 if __name__ == "__main__":
     import argparse
 
     parser = argparse.ArgumentParser(description="Manage app assets")
     parser.add_argument("--apps", type=str, help="Comma-separated list of app names")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of processes used to convert images")
+    parser.add_argument("--max-dimension", type=int, help="Downscale screenshots so their longest side fits this many pixels")
+    parser.add_argument("--optimize", action="store_true", help="Write size-optimized PNGs")
+    parser.add_argument("--variant", choices=sorted(VARIANTS), help="Also write a lossy variant and publish it instead of the PNG")
+    parser.add_argument("--quality", type=int, default=85, help="Quality for lossy variants (1-100)")
+    parser.add_argument("--hashed-names", action="store_true", help="Publish assets under content-hash filenames for immutable caching")
+    parser.add_argument("--shared-assets", action="store_true", help="Store identical images once in static/shared and publish them from there")
+    parser.add_argument("--near-duplicates", type=int, metavar="BITS",
+                        help="With --shared-assets, replace images with an already stored look-alike whose perceptual hash "
+                             "differs by at most BITS and whose pixels match")
+    parser.add_argument("--metrics", type=str, help="Where to write the JSON metrics report (default: .cache/metrics/manage_assets.json)")
+    parser.add_argument("--profile", action="store_true", help="Write a cProfile dump next to the metrics report (parent process only)")
+    parser.set_defaults(cache_dir=None)
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    apps_dir = os.path.join(current_dir, "..", "Apps")
-    manager = AssetManager(apps_dir)
-    targets = args.apps.split(",") if args.apps else [None]
-    for target in targets:
-        manager.manage_icons(target.strip() if target else None)
\ No newline at end of file
+    # Run as the assets stage of pipeline.py, so both entry points share one wiring
+    from pipeline import Paths, parse_targets, run_pipeline
+    root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    metrics_path = Paths(root_dir).metrics(args, "manage_assets.json")
+    with profiled(os.path.splitext(metrics_path)[0] + ".prof" if args.profile else None):
+        run_pipeline(root_dir, ['assets'], parse_targets(args.apps), args)
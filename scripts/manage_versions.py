@@ -1,21 +1,261 @@
 import argparse
+from concurrent.futures import ThreadPoolExecutor
 import json
 import logging
 import os
 import sys
-from typing import Dict, Optional
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
 
 import requests
 from requests.exceptions import RequestException
-import yaml
+
+from app_store import AppEntry, AppStore, stage_store
+from http_session import pooled_session
+from ipa_metadata import IPAMetadataExtractor
+import json_io
+from metrics import Metrics, profiled
+from release_rules import CompiledRules, RulesCache, write_template
+from version_index import VersionIndex
+
+GRAPHQL_RELEASES_PER_REPO = 10
+GRAPHQL_ASSETS_PER_RELEASE = 50
+
+class ResponseCache:
+    """On-disk cache of GitHub API pages keyed by URL, revalidated with ETag/Last-Modified."""
+
+    def __init__(self, path: str, max_bytes: int = 32 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+        self.entries = self._load()
+
+    def _load(self) -> Dict:
+        entries = json_io.read_json(self.path)
+        return entries if isinstance(entries, dict) else {}
+
+    def conditional_headers(self, url: str) -> Dict:
+        with self.lock:
+            entry = self.entries.get(url)
+        if not entry:
+            return {}
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def hit(self, url: str) -> Optional[Dict]:
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is None:
+                return None
+            entry['accessed'] = time.time()
+            self.hits += 1
+            return entry
+
+    def store(self, url: str, response: requests.Response, body: List[Dict]):
+        with self.lock:
+            self.misses += 1
+            if not response.headers.get('ETag') and not response.headers.get('Last-Modified'):
+                return
+            self.entries[url] = {
+                'etag': response.headers.get('ETag'),
+                'last_modified': response.headers.get('Last-Modified'),
+                'next': response.links.get('next', {}).get('url'),
+                'body': body,
+                'accessed': time.time()
+            }
+
+    def save(self):
+        with self.lock:
+            sizes = {url: len(json.dumps(entry, separators=(',', ':'))) for url, entry in self.entries.items()}
+            total = sum(sizes.values())
+            # Evict least recently used pages until the serialized cache fits the budget
+            for url in sorted(self.entries, key=lambda u: self.entries[u].get('accessed', 0)):
+                if total <= self.max_bytes:
+                    break
+                total -= sizes[url]
+                del self.entries[url]
+                self.evicted += 1
+            return json_io.write_json(self.path, self.entries) is not None
+
+    def summary(self) -> str:
+        requests_made = self.hits + self.misses
+        ratio = (self.hits / requests_made * 100) if requests_made else 0.0
+        return (f"HTTP cache: {self.hits} hits (304), {self.misses} misses, {ratio:.1f}% hit rate, "
+                f"{len(self.entries)} entries, {self.evicted} evicted")
+
+class RateLimitExceeded(RequestException):
+    pass
+
+class UpdateScheduler:
+    """Orders apps by how likely they are to have new releases and rations requests against a budget."""
+
+    def __init__(self, records: Dict, budget: Optional[int] = None, reserve: int = 10, max_wait: int = 60):
+        self.records = records
+        self.budget = budget
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.requests_made = 0
+        # Request slots reserved by acquire() and not yet spent; each thread holds at most one
+        self.in_flight = 0
+        self.local = threading.local()
+        self.remaining: Optional[int] = None
+        self.reset: Optional[int] = None
+        self.exhausted = False
+        self.checked = 0
+        self.deferred: List[str] = []
+        self.lock = threading.Lock()
+
+    def prioritize(self, apps: List[str]) -> List[str]:
+        now = time.time()
+
+        def priority(app: str) -> Tuple:
+            record = self.records.get(app, {})
+            # Apps deferred by an earlier run or never checked resume first
+            if record.get('deferred') or not record.get('last_checked'):
+                return (0, 0.0, app)
+            staleness = now - record['last_checked']
+            change_rate = (record.get('changes', 0) + 1) / (record.get('checks', 0) + 2)
+            return (1, -staleness * change_rate, app)
+
+        return sorted(apps, key=priority)
+
+    def acquire(self) -> bool:
+        with self.lock:
+            # Every app in flight costs at least one request, so count it against the budget up front
+            if self.exhausted or (self.budget is not None and self.requests_made + self.in_flight >= self.budget):
+                return False
+            wait = 0.0
+            if self.remaining is not None and self.remaining <= self.reserve:
+                wait = (self.reset or 0) - time.time()
+                if wait > self.max_wait:
+                    self.exhausted = True
+                    return False
+                self.remaining = None
+            self.in_flight += 1
+        self.local.reserved = True
+        time.sleep(max(0.0, wait))
+        return True
+
+    def release(self):
+        if getattr(self.local, 'reserved', False):
+            self.local.reserved = False
+            with self.lock:
+                self.in_flight -= 1
+
+    def spend(self) -> bool:
+        """Claim one request against the budget before sending it.
+
+        An app's first request uses the slot acquire() reserved for it; later pages and retries must fit beside
+        the slots other apps still hold, and once one is refused no further apps are admitted.
+        """
+        with self.lock:
+            if getattr(self.local, 'reserved', False):
+                self.local.reserved = False
+                self.in_flight -= 1
+            elif self.budget is not None and self.requests_made + self.in_flight >= self.budget:
+                self.exhausted = True
+                return False
+            self.requests_made += 1
+            return True
+
+    def record_response(self, response: requests.Response, track_limit: bool = True):
+        """Track rate-limit headers; track_limit=False keeps another API's headers (GraphQL has its own
+        point-based limit) out of the REST remaining/reset state."""
+        if not track_limit:
+            return
+        with self.lock:
+            remaining = response.headers.get('X-RateLimit-Remaining')
+            reset = response.headers.get('X-RateLimit-Reset')
+            if remaining is not None and remaining.isdigit():
+                self.remaining = int(remaining)
+            if reset is not None and reset.isdigit():
+                self.reset = int(reset)
+
+    def backoff_delay(self, response: requests.Response, attempt: int) -> Optional[float]:
+        if response.status_code not in (403, 429):
+            return None
+        retry_after = response.headers.get('Retry-After')
+        if retry_after and retry_after.isdigit():
+            return float(retry_after)
+        if response.headers.get('X-RateLimit-Remaining') == '0':
+            # Each API reports its own reset; fall back to the last REST reset only when this response has none
+            reset = response.headers.get('X-RateLimit-Reset')
+            reset = int(reset) if reset and reset.isdigit() else self.reset
+            return max(0.0, (reset or 0) - time.time())
+        if response.status_code == 429:
+            return float(2 ** attempt)
+        return None
+
+    def mark_exhausted(self):
+        with self.lock:
+            self.exhausted = True
+
+    def record_check(self, app: str, changed: bool):
+        now = int(time.time())
+        with self.lock:
+            record = self.records.setdefault(app, {})
+            record['last_checked'] = now
+            record['checks'] = record.get('checks', 0) + 1
+            if changed:
+                record['last_changed'] = now
+                record['changes'] = record.get('changes', 0) + 1
+            record.pop('deferred', None)
+            self.checked += 1
+
+    def defer(self, app: str):
+        with self.lock:
+            self.records.setdefault(app, {})['deferred'] = True
+            self.deferred.append(app)
+
+    def summary(self) -> str:
+        remaining = 'unknown' if self.remaining is None else self.remaining
+        return (f"Scheduler: checked {self.checked} apps, deferred {len(self.deferred)}, "
+                f"used {self.requests_made} requests, rate limit remaining {remaining}")
 
 class VersionManager:
-    def __init__(self, apps_root: str, keep_versions: int = 10):
+    def __init__(self, apps_root: str, keep_versions: int = 10, workers: int = 1, cache_path: Optional[str] = None,
+                 state_path: Optional[str] = None, full_rescan: bool = False, budget: Optional[int] = None,
+                 max_wait: int = 60, max_retries: int = 3, backend: str = 'rest', graphql_batch_size: int = 25,
+                 metrics_path: Optional[str] = None, store: Optional[AppStore] = None,
+                 ipa_metadata: Optional[IPAMetadataExtractor] = None, rules_cache_path: Optional[str] = None):
         if not isinstance(keep_versions, int) or keep_versions < 1:
             raise ValueError("keep_versions must be a positive integer")
+        if not isinstance(workers, int) or workers < 1:
+            raise ValueError("workers must be a positive integer")
+        if backend not in ('rest', 'graphql'):
+            raise ValueError("backend must be 'rest' or 'graphql'")
         self.apps_root = apps_root
         self.keep_versions = keep_versions
+        self.workers = workers
         self.logger = self._init_logger()
+        # One keep-alive pool shared by every worker so connections to api.github.com are reused across apps
+        self.session = pooled_session(max(10, self.workers), pool_connections=1)
+        self.cache = ResponseCache(cache_path) if cache_path else None
+        self.state_path = state_path
+        self.full_rescan = full_rescan
+        self.state_lock = threading.Lock()
+        self.state = self._load_state()
+        self.max_retries = max_retries
+        self.backend = backend
+        self.graphql_batch_size = max(1, graphql_batch_size)
+        self.api_url = os.environ.get("GITHUB_API_URL", "https://api.github.com").rstrip('/')
+        self.graphql_url = os.environ.get("GITHUB_GRAPHQL_URL", f"{self.api_url}/graphql")
+        self.prefetched: Dict[str, Dict] = {}
+        self.scheduler = UpdateScheduler(self.state['apps'], budget=budget, max_wait=max_wait)
+        self.metrics = Metrics('manage_versions')
+        self.metrics_path = metrics_path
+        self.store, self.owns_store = stage_store(apps_root, store)
+        self.ipa_metadata = ipa_metadata
+        self.rules = RulesCache(rules_cache_path)
+        self.pending_metadata: List[Tuple[AppEntry, Dict]] = []
 
     def _init_logger(self) -> logging.Logger:
         logger = logging.getLogger("VersionManager")
@@ -27,68 +267,175 @@ class VersionManager:
 
     def manage(self, action: str, target: Optional[str] = None, keep: Optional[int] = None):
         self.keep_versions = max(1, keep or self.keep_versions)
-        for app in os.listdir(self.apps_root):
-            path = os.path.join(self.apps_root, app)
-            config_path = os.path.join(path, 'app.json')
+        with self.metrics.stage('load_configs'):
+            jobs = self.store.load().select(target)
 
-            if not self._valid_app_path(path, config_path, target):
-                continue
-
-            if action == 'update':
-                self._update_versions(app, config_path)
-            elif action == 'remove':
-                self._remove_versions(app, config_path)
+        if action == 'update':
+            handler = self._update_versions
+            order = {app: i for i, app in enumerate(self.scheduler.prioritize([entry.name for entry in jobs]))}
+            jobs.sort(key=lambda entry: order[entry.name])
+            if self.backend == 'graphql':
+                with self.metrics.stage('graphql_prefetch'):
+                    self._prefetch_graphql(jobs)
+        elif action == 'remove':
+            handler = self._remove_versions
+        elif action == 'init-rules':
+            self._create_rules_templates(jobs)
+            return
+        else:
+            return
 
-    def _valid_app_path(self, path: str, config: str, target: Optional[str]) -> bool:
-        return os.path.isdir(path) and os.path.isfile(config) and (not target or os.path.basename(path) == target)
+        if self.workers == 1 or len(jobs) < 2:
+            for entry in jobs:
+                self._run_job(handler, entry)
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(self._run_job, handler, entry) for entry in jobs]
+                for future in futures:
+                    future.result()
 
-    def _update_versions(self, app: str, config: str):
-        self._process_versions(app, config, update=True)
+        if self.ipa_metadata:
+            try:
+                self._annotate_versions()
+            except Exception as e:
+                # Metadata is optional; the version updates above must still reach finish() and be saved
+                self.logger.error(f"Failed to read IPA metadata: {str(e)}")
 
-    def _remove_versions(self, app: str, config: str):
-        self._process_versions(app, config, update=False)
+    def _annotate_versions(self):
+        """Attach Info.plist fields to the versions this run added, reading each IPA through Range requests."""
+        pending, self.pending_metadata = self.pending_metadata, []
+        if not pending:
+            return
+        with self.metrics.stage('ipa_metadata'):
+            results = self.ipa_metadata.extract_many(version['url'] for _, version in pending)
+        for entry, version in pending:
+            metadata = results.get(version['url'])
+            if not metadata:
+                continue
+            version['ipa'] = metadata
+            self.store.mark_dirty(entry.name)
+            if metadata.get('bundleID') and metadata['bundleID'] != entry.data.get('bundleID'):
+                self.logger.warning(f"{entry.name} {version['version']}: IPA bundle ID {metadata['bundleID']} "
+                                    f"does not match {entry.data.get('bundleID')}")
+            if metadata.get('shortVersion') and metadata['shortVersion'] != version['version']:
+                self.logger.warning(f"{entry.name} {version['version']}: IPA reports version {metadata['shortVersion']}")
 
-    def _process_versions(self, app: str, config: str, update: bool):
+    def _run_job(self, handler, entry: AppEntry):
         try:
-            with open(config, 'r') as f:
-                data = json.load(f)
-        except FileNotFoundError:
-            self.logger.error(f"Config file not found for {app}")
-            return
-        except json.JSONDecodeError:
-            self.logger.error(f"Invalid JSON in config for {app}")
+            with self.metrics.stage('app', entry.name):
+                handler(entry)
+        except Exception as e:
+            self.logger.error(f"Unexpected error processing {entry.name}: {str(e)}")
+
+    def finish(self):
+        if self.owns_store:
+            with self.metrics.stage('write_configs'):
+                self.store.save()
+            self.metrics.incr('bytes_written', self.store.stats['bytes_written'])
+        with self.metrics.stage('save_state'):
+            self._save_state()
+            self.logger.info(self.scheduler.summary())
+            if self.cache:
+                if not self.cache.save():
+                    self.logger.error(f"Failed to save HTTP cache {self.cache.path}")
+                self.logger.info(self.cache.summary())
+        if not self.rules.save():
+            self.logger.error(f"Failed to save rules cache {self.rules.cache_path}")
+        self.logger.info(self.rules.summary())
+        if self.ipa_metadata:
+            if not self.ipa_metadata.save():
+                self.logger.error(f"Failed to save IPA metadata cache {self.ipa_metadata.cache_path}")
+            self.logger.info(self.ipa_metadata.summary())
+            self.metrics.incr('ipa_range_requests', self.ipa_metadata.stats['requests'])
+            self.metrics.incr('ipa_bytes_read', self.ipa_metadata.stats['bytes_read'])
+        self.logger.info(self.metrics.summary())
+        if self.metrics_path and not self.metrics.save(self.metrics_path):
+            self.logger.error(f"Failed to save metrics {self.metrics_path}")
+
+    def _load_state(self) -> Dict:
+        state = json_io.read_json(self.state_path, self.logger, 'state') if self.state_path else None
+        if not isinstance(state, dict):
+            state = {}
+        state.setdefault('repos', {})
+        state.setdefault('apps', {})
+        return state
+
+    def _save_state(self):
+        if not self.state_path:
             return
-        except PermissionError:
-            self.logger.error(f"Permission denied accessing config for {app}")
+        with self.state_lock:
+            saved = json_io.write_json(self.state_path, self.state, indent=2, sort_keys=True)
+        if saved is None:
+            self.logger.error(f"Failed to save state {self.state_path}")
+
+    def _high_water_mark(self, repo: str) -> Optional[str]:
+        with self.state_lock:
+            return self.state['repos'].get(repo, {}).get('newest_published_at')
+
+    def _set_high_water_mark(self, repo: str, published_at: str):
+        with self.state_lock:
+            entry = self.state['repos'].setdefault(repo, {})
+            if published_at > entry.get('newest_published_at', ''):
+                entry['newest_published_at'] = published_at
+
+    def _update_versions(self, entry: AppEntry):
+        if not self.scheduler.acquire():
+            self.scheduler.defer(entry.name)
+            self.logger.warning(f"Deferred {entry.name}: request budget or rate limit exhausted")
             return
+        try:
+            self._process_versions(entry, update=True)
+        finally:
+            self.scheduler.release()
 
+    def _remove_versions(self, entry: AppEntry):
+        self._process_versions(entry, update=False)
+
+    def _process_versions(self, entry: AppEntry, update: bool):
+        app, data = entry.name, entry.data
         if not self._valid_repo(data.get('gitURLs')):
             return
 
         if update:
-            result = self._fetch_new_versions(data, os.path.dirname(config))
+            result = self._fetch_new_versions(data, entry.dir)
             if not result['success']:
                 self.logger.error(f"Failed to update {app}: {result['message']}")
+                if self.scheduler.exhausted:
+                    self.scheduler.defer(app)
+                return
+            index = result['index']
+            new_versions = [v for v in result['versions'] if index.add(v)]
+            sorted_versions = index.newest(self.keep_versions)
+            retained = {id(v) for v in sorted_versions}
+            added = [v for v in new_versions if id(v) in retained]
+            added_count = len(added)
+            self.metrics.incr('versions_added', added_count)
+            self.scheduler.record_check(app, added_count > 0)
+            if not added:
+                # Leave app.json exactly as it is; retention only applies once something new arrives
+                self.logger.info(f"No new versions for {app}")
                 return
-            new_versions = result['versions']
-            all_versions = data.get('versions', []) + new_versions
-            sorted_versions = sorted(all_versions, key=lambda x: x['date'], reverse=True)[:self.keep_versions]
+            if index.duplicates:
+                self.logger.warning(f"Dropped {index.duplicates} versions with duplicate download URLs from {app}")
             data['versions'] = sorted_versions
-            added_count = sum(1 for v in sorted_versions if v in new_versions)
+            if self.ipa_metadata:
+                with self.state_lock:
+                    self.pending_metadata.extend((entry, v) for v in added)
             self.logger.info(f"Updated {app}, added {added_count} new versions, total {len(sorted_versions)} versions")
         else:
             data['versions'] = []
             self.logger.info(f"Removed all versions for {app}")
 
-        self._save_config(config, data)
+        self.store.mark_dirty(app)
 
     def _fetch_new_versions(self, data: Dict, app_dir: str) -> Dict:
         repos = data.get('gitURLs', [])
         repos = [repos] if isinstance(repos, str) else repos
-        existing = {v['url'] for v in data.get('versions', [])}
-        versions_by_version = {}
-        rules = self._load_rules(app_dir)
-        preferred_extensions = rules.get('preferred_extensions', ['.tipa', '.ipa'])
+        scan = {
+            'rules': self.rules.load(app_dir),
+            'index': VersionIndex(data.get('versions', [])),
+            'versions': {}
+        }
 
         token = os.environ.get("GITHUB_TOKEN")
         if not token:
@@ -96,109 +443,250 @@ class VersionManager:
             return {'success': False, 'message': 'Missing GitHub token', 'versions': []}
         headers = {'Authorization': f'token {token}'}
 
+        failures: List[str] = []
+        checked = 0
         for repo in repos:
             if not self._valid_gh_url(repo):
                 continue
+            checked += 1
             owner, repo_name = repo.rstrip('/').split('/')[-2:]
-            url = f'https://api.github.com/repos/{owner}/{repo_name}/releases'
+            url = f'{self.api_url}/repos/{owner}/{repo_name}/releases'
+            # The high-water mark only proves older releases are known while the app still lists versions
+            scan['mark'] = self._high_water_mark(repo) if len(scan['index']) and not self.full_rescan else None
+            scan['newest'] = None
+            scan['seen'] = set()
+            pages = 0
+
+            prefetched = self.prefetched.get(repo)
+            if prefetched is not None:
+                # Fall back to REST paging only when the batched page could not settle the repo
+                if self._scan_releases(prefetched['releases'], scan) or not prefetched['has_next']:
+                    url = None
 
             while url:
                 try:
-                    response = requests.get(url, headers=headers, timeout=10)
-                    response.raise_for_status()
-                    releases = response.json()
-                    for release in releases:
-                        for asset in release.get('assets', []):
-                            if self._should_include_asset(asset, rules):
-                                version_str = self._format_version_number(release['tag_name'], rules)
-                                if rules.get('exclude_patterns') and any(pattern.lower() in version_str.lower() for pattern in rules['exclude_patterns']):
-                                    continue
-                                version = {
-                                    'version': version_str,
-                                    'date': release['published_at'].split('T')[0],
-                                    'size': asset['size'],
-                                    'url': asset['browser_download_url']
-                                }
-                                if version['url'] not in existing:
-                                    current = versions_by_version.get(version_str)
-                                    if not current or self._is_preferred_asset(version, current, preferred_extensions):
-                                        versions_by_version[version_str] = version
-                    url = response.links.get('next', {}).get('url')
+                    releases, next_url = self._get_releases(url, headers)
+                    pages += 1
+                    # Releases arrive newest first, so later pages can only hold known or out-of-retention entries
+                    if self._scan_releases(releases, scan):
+                        break
+                    url = next_url
+                except RateLimitExceeded as e:
+                    self.logger.warning(f"Stopped paging {repo}: {str(e)}")
+                    failures.append(f"{repo}: {str(e)}")
+                    scan['newest'] = None
+                    break
                 except RequestException as e:
                     self.logger.error(f"API error for {repo}: {str(e)}")
-                    return {'success': False, 'message': f"API error: {str(e)}", 'versions': []}
+                    failures.append(f"{repo}: {str(e)}")
+                    scan['newest'] = None
+                    break
+
+            if scan['newest']:
+                self._set_high_water_mark(repo, scan['newest'])
+            self.logger.debug(f"Fetched {pages} release pages for {repo}")
 
-        new_versions = list(versions_by_version.values())
+        if checked and len(failures) == checked:
+            return {'success': False, 'message': f"API error: {'; '.join(failures)}", 'versions': []}
+
+        new_versions = list(scan['versions'].values())
         new_count = len(new_versions)
         return {
             'success': True,
             'message': f"Fetched {new_count} new versions" if new_count > 0 else "No new versions",
-            'versions': new_versions
+            'versions': new_versions,
+            'index': scan['index']
         }
 
-    def _is_preferred_asset(self, new: Dict, current: Dict, preferred_extensions: list) -> bool:
-        new_ext = os.path.splitext(new['url'])[1].lower()
-        current_ext = os.path.splitext(current['url'])[1].lower()
-        new_priority = preferred_extensions.index(new_ext) if new_ext in preferred_extensions else len(preferred_extensions)
-        current_priority = preferred_extensions.index(current_ext) if current_ext in preferred_extensions else len(preferred_extensions)
+    def _scan_releases(self, releases: List[Dict], scan: Dict) -> bool:
+        """Merge one page of releases into scan['versions'] and report whether paging can stop."""
+        rules = scan['rules']
+        reached_known = False
+        for release in releases:
+            published_at = release['published_at']
+            if scan['newest'] is None or published_at > scan['newest']:
+                scan['newest'] = published_at
+            if scan['mark'] and published_at <= scan['mark']:
+                reached_known = True
+            assets = [asset for asset in release.get('assets', []) if rules.include_asset(asset['name'])]
+            if not assets:
+                continue
+            version_str = rules.format_version(release['tag_name'])
+            if rules.excludes(version_str):
+                continue
+            scan['seen'].add(version_str)
+            date = published_at.split('T')[0]
+            # Known by any asset URL, or by version and date for variant assets that were not picked
+            if any(scan['index'].find(url=asset['browser_download_url'], version=version_str, date=date)
+                   for asset in assets):
+                reached_known = True
+                continue
+            for asset in assets:
+                version = {
+                    'version': version_str,
+                    'date': date,
+                    'size': asset['size'],
+                    'url': asset['browser_download_url']
+                }
+                current = scan['versions'].get(version_str)
+                if not current or self._is_preferred_asset(version, current, rules):
+                    scan['versions'][version_str] = version
+        return not self.full_rescan and (reached_known or len(scan['seen']) >= self.keep_versions)
+
+    def _prefetch_graphql(self, jobs: List[AppEntry]):
+        """Look up the latest releases of every app's repos with a few batched GraphQL queries."""
+        token = os.environ.get("GITHUB_TOKEN")
+        if not token:
+            return
+        repos = []
+        for entry in jobs:
+            urls = entry.data.get('gitURLs', [])
+            for repo in [urls] if isinstance(urls, str) else urls or []:
+                if self._valid_gh_url(repo) and repo not in repos:
+                    repos.append(repo)
+
+        headers = {'Authorization': f'bearer {token}'}
+        for start in range(0, len(repos), self.graphql_batch_size):
+            batch = repos[start:start + self.graphql_batch_size]
+            if not self.scheduler.acquire():
+                self.logger.warning("Skipping remaining GraphQL batches: request budget or rate limit exhausted")
+                return
+            try:
+                self.prefetched.update(self._query_graphql_batch(batch, headers))
+            except RateLimitExceeded as e:
+                self.logger.warning(f"GraphQL rate limit reached, falling back to REST for the remaining repos: {str(e)}")
+                return
+            except (RequestException, ValueError, KeyError, TypeError) as e:
+                self.logger.error(f"GraphQL batch failed, falling back to REST for {len(batch)} repos: {str(e)}")
+            finally:
+                self.scheduler.release()
+        self.logger.info(f"Prefetched releases for {len(self.prefetched)}/{len(repos)} repos via GraphQL")
+
+    def _query_graphql_batch(self, batch: List[str], headers: Dict) -> Dict:
+        fields, variables, params = [], {}, []
+        for i, repo in enumerate(batch):
+            owner, repo_name = repo.rstrip('/').split('/')[-2:]
+            variables[f'o{i}'], variables[f'n{i}'] = owner, repo_name
+            params.append(f'$o{i}: String!, $n{i}: String!')
+            fields.append(f'r{i}: repository(owner: $o{i}, name: $n{i}) {{ ...releaseFields }}')
+        query = (
+            f"query({', '.join(params)}) {{ {' '.join(fields)} }}\n"
+            "fragment releaseFields on Repository {\n"
+            f"  releases(first: {GRAPHQL_RELEASES_PER_REPO}, orderBy: {{field: CREATED_AT, direction: DESC}}) {{\n"
+            "    pageInfo { hasNextPage }\n"
+            "    nodes { databaseId tagName publishedAt\n"
+            f"      releaseAssets(first: {GRAPHQL_ASSETS_PER_RELEASE}) {{\n"
+            "        pageInfo { hasNextPage }\n"
+            "        nodes { name size downloadUrl } } }\n"
+            "  }\n"
+            "}"
+        )
+        response = self._request(self.graphql_url, headers, payload={'query': query, 'variables': variables})
+        response.raise_for_status()
+        body = response.json()
+        result = body.get('data') or {}
+        if body.get('errors'):
+            # Missing or renamed repos fail individually; their aliases come back null and go to REST below
+            self.logger.warning(f"GraphQL batch returned {len(body['errors'])} errors: "
+                                f"{'; '.join(str(e.get('message')) for e in body['errors'][:3])}")
+
+        prefetched = {}
+        for i, repo in enumerate(batch):
+            node = result.get(f'r{i}')
+            if not node:
+                continue
+            nodes = node['releases']['nodes']
+            if any(release['releaseAssets']['pageInfo']['hasNextPage'] for release in nodes):
+                # Assets past the first page would be silently missing; REST lists them all
+                self.logger.debug(f"{repo} has releases with more than {GRAPHQL_ASSETS_PER_RELEASE} assets, using REST")
+                continue
+            releases = [
+                {
+                    'id': release.get('databaseId'),
+                    'tag_name': release['tagName'],
+                    'published_at': release['publishedAt'],
+                    'assets': [
+                        {'name': a['name'], 'size': a['size'], 'browser_download_url': a['downloadUrl']}
+                        for a in release['releaseAssets']['nodes']
+                    ]
+                }
+                for release in nodes if release.get('publishedAt')
+            ]
+            prefetched[repo] = {'releases': releases, 'has_next': node['releases']['pageInfo']['hasNextPage']}
+        return prefetched
+
+    def _get_releases(self, url: str, headers: Dict) -> Tuple[List[Dict], Optional[str]]:
+        conditional = self.cache.conditional_headers(url) if self.cache else {}
+        response = self._request(url, {**headers, **conditional})
+        if response.status_code == 304:
+            entry = self.cache.hit(url) if self.cache else None
+            if entry is not None:
+                return entry['body'], entry['next']
+            response = self._request(url, headers)
+        response.raise_for_status()
+        releases = [self._compact_release(r) for r in response.json()]
+        if self.cache:
+            self.cache.store(url, response, releases)
+        return releases, response.links.get('next', {}).get('url')
+
+    def _request(self, url: str, headers: Dict, payload: Optional[Dict] = None) -> requests.Response:
+        for attempt in range(self.max_retries + 1):
+            if not self.scheduler.spend():
+                raise RateLimitExceeded(f"Request budget of {self.scheduler.budget} spent before {url}")
+            with self.metrics.stage('http'):
+                if payload is None:
+                    response = self.session.get(url, headers=headers, timeout=10)
+                else:
+                    response = self.session.post(url, headers=headers, json=payload, timeout=30)
+            self.metrics.incr('http_requests')
+            self.metrics.incr('bytes_downloaded', len(response.content))
+            if response.status_code == 304:
+                self.metrics.incr('http_not_modified')
+            # GraphQL draws on a separate limit, so it must not throttle or exhaust the REST pager it falls back to
+            rest = payload is None
+            self.scheduler.record_response(response, track_limit=rest)
+            wait = self.scheduler.backoff_delay(response, attempt)
+            if wait is None:
+                return response
+            if attempt == self.max_retries or wait > self.scheduler.max_wait:
+                if rest:
+                    self.scheduler.mark_exhausted()
+                raise RateLimitExceeded(f"Rate limited on {url}, retry in {int(wait)}s")
+            self.logger.warning(f"Rate limited, backing off {wait:.0f}s before retrying {url}")
+            time.sleep(wait)
+        return response
+
+    def _compact_release(self, release: Dict) -> Dict:
+        return {
+            'id': release.get('id'),
+            'tag_name': release['tag_name'],
+            'published_at': release['published_at'],
+            'assets': [
+                {'name': a['name'], 'size': a['size'], 'browser_download_url': a['browser_download_url']}
+                for a in release.get('assets', [])
+            ]
+        }
+
+    def _is_preferred_asset(self, new: Dict, current: Dict, rules: CompiledRules) -> bool:
+        new_priority = rules.asset_rank(new['url'])
+        current_priority = rules.asset_rank(current['url'])
         if new_priority < current_priority:
             return True
         if new_priority == current_priority and new['size'] > current['size']:
             return True
         return False
 
-    def _load_rules(self, app_dir: str) -> Dict:
-        rules_path = os.path.join(app_dir, '.rules.yaml')
-        if not os.path.exists(rules_path):
-            template = {
-                'preferred_extensions': ['.tipa', '.ipa'],
-                'excluded_extensions': ['.zip', '.tar.gz', '.deb'],
-                'exclude_patterns': ['debug', 'beta'],
-                'strip_v_prefix': True,
-                'replace_chars': {'-': '.', '_': '.'},
-                'remove_chars': ['-beta', '-alpha', '-dev']
-            }
+    def _create_rules_templates(self, jobs: List[AppEntry]) -> int:
+        """Write a starter .rules.yaml for every selected app that has none; returns how many were created."""
+        created = 0
+        for entry in jobs:
             try:
-                with open(rules_path, 'w') as f:
-                    yaml.dump(template, f, default_flow_style=False)
-                self.logger.info(f"Created template rules file for {os.path.basename(app_dir)}")
+                if write_template(entry.dir):
+                    created += 1
+                    self.logger.info(f"Created template rules file for {entry.name}")
             except (IOError, PermissionError) as e:
-                self.logger.error(f"Failed to create rules template for {os.path.basename(app_dir)}: {str(e)}")
-            return {}
-        
-        try:
-            with open(rules_path, 'r') as f:
-                rules = yaml.safe_load(f) or {}
-            return rules if isinstance(rules, dict) else {}
-        except (yaml.YAMLError, IOError) as e:
-            self.logger.error(f"Failed to load rules for {os.path.basename(app_dir)}: {str(e)}")
-            return {}
-
-    def _should_include_asset(self, asset: Dict, rules: Dict) -> bool:
-        name = asset['name'].lower()
-        if rules.get('excluded_extensions') and any(name.endswith(ext) for ext in rules['excluded_extensions']):
-            return False
-        if rules.get('preferred_extensions'):
-            return any(name.endswith(ext) for ext in rules['preferred_extensions'])
-        return name.endswith(('.tipa', '.ipa'))
-
-    def _format_version_number(self, version: str, rules: Dict) -> str:
-        if rules.get('strip_v_prefix', False) and version.lower().startswith('v'):
-            version = version[1:]
-        if rules.get('remove_chars'):
-            for char in rules['remove_chars']:
-                version = version.replace(char, '')
-        if rules.get('replace_chars'):
-            for char, replacement in rules['replace_chars'].items():
-                version = version.replace(char, replacement)
-        return version.strip()
-
-    def _save_config(self, path: str, data: Dict):
-        try:
-            with open(path, 'w') as f:
-                json.dump(data, f, indent=4)
-        except (IOError, PermissionError) as e:
-            self.logger.error(f"Failed to save config {path}: {str(e)}")
+                self.logger.error(f"Failed to create rules template for {entry.name}: {str(e)}")
+        return created
 
     def _valid_repo(self, repo) -> bool:
         if not repo:
@@ -224,15 +712,26 @@ def int_or_float_to_int(value: str) -> int:
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Manage app versions")
-    parser.add_argument("action", choices=["update", "remove"], help="Action to perform")
+    parser.add_argument("action", choices=["update", "remove", "init-rules"],
+                        help="Action to perform; init-rules writes a template .rules.yaml for apps without one")
     parser.add_argument("--keep", type=int_or_float_to_int, default=5, help="Number of versions to keep")
     parser.add_argument("--apps", type=str, help="Comma-separated list of app names")
+    parser.add_argument("--workers", type=int, default=1, help="Number of apps to fetch concurrently")
+    parser.add_argument("--cache-dir", type=str, help="Directory for the HTTP response cache (default: .cache)")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the HTTP response cache")
+    parser.add_argument("--full-rescan", action="store_true", help="Page through every release instead of stopping at known ones")
+    parser.add_argument("--budget", type=int, help="Maximum number of API requests to spend in this run")
+    parser.add_argument("--max-wait", type=int, default=60, help="Longest rate-limit backoff to sleep through, in seconds")
+    parser.add_argument("--backend", choices=["rest", "graphql"], default="rest", help="Release lookup backend; graphql batches repos and falls back to REST")
+    parser.add_argument("--ipa-metadata", action="store_true", help="Read bundle ID, version and minimum OS of new IPAs via HTTP Range requests")
+    parser.add_argument("--metrics", type=str, help="Where to write the JSON metrics report (default: <cache dir>/metrics/manage_versions.json)")
+    parser.add_argument("--profile", action="store_true", help="Write a cProfile dump next to the metrics report")
     args = parser.parse_args()
 
     logging.basicConfig(level=logging.INFO)
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    apps_dir = os.path.join(current_dir, "..", "Apps")
-    manager = VersionManager(apps_dir)
-    targets = args.apps.split(",") if args.apps else [None]
-    for target in targets:
-        manager.manage(args.action, target.strip() if target else None, args.keep)
\ No newline at end of file
+    # Run as the versions stage of pipeline.py, so both entry points share one wiring
+    from pipeline import Paths, parse_targets, run_pipeline
+    root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    metrics_path = Paths(root_dir, args.cache_dir).metrics(args, "manage_versions.json")
+    with profiled(os.path.splitext(metrics_path)[0] + ".prof" if args.profile else None):
+        run_pipeline(root_dir, ['versions'], parse_targets(args.apps), args)
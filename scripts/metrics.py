@@ -0,0 +1,84 @@
+"""Shared run metrics for the pipeline scripts: stage timings, per-app timings, counters and optional profiling."""
+from collections import defaultdict
+from contextlib import contextmanager
+import cProfile
+from datetime import datetime, timezone
+import os
+import pstats
+import threading
+import time
+from typing import Dict, Optional
+
+import json_io
+
+
+class Metrics:
+    """Thread-safe accumulator for one script run; stages and apps may be timed concurrently from worker threads."""
+
+    def __init__(self, script: str):
+        self.script = script
+        self.started = time.perf_counter()
+        self.started_at = datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        self.lock = threading.Lock()
+        self.counters: Dict[str, int] = defaultdict(int)
+        self.stages: Dict[str, Dict] = {}
+        self.apps: Dict[str, Dict[str, float]] = defaultdict(lambda: defaultdict(float))
+
+    def incr(self, counter: str, amount: int = 1):
+        with self.lock:
+            self.counters[counter] += amount
+
+    def add_time(self, stage: str, seconds: float, app: Optional[str] = None):
+        with self.lock:
+            entry = self.stages.setdefault(stage, {'seconds': 0.0, 'calls': 0})
+            entry['seconds'] += seconds
+            entry['calls'] += 1
+            if app is not None:
+                self.apps[app][stage] += seconds
+
+    @contextmanager
+    def stage(self, stage: str, app: Optional[str] = None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(stage, time.perf_counter() - started, app)
+
+    def report(self) -> Dict:
+        with self.lock:
+            return {
+                'script': self.script,
+                'started_at': self.started_at,
+                'seconds': round(time.perf_counter() - self.started, 4),
+                'counters': dict(sorted(self.counters.items())),
+                'stages': {name: {'seconds': round(s['seconds'], 4), 'calls': s['calls']}
+                           for name, s in self.stages.items()},
+                'apps': {app: {name: round(seconds, 4) for name, seconds in stages.items()}
+                         for app, stages in sorted(self.apps.items())},
+            }
+
+    def save(self, path: str) -> bool:
+        return json_io.write_json(path, self.report(), indent=2) is not None
+
+    def summary(self) -> str:
+        report = self.report()
+        stages = ', '.join(f"{name} {s['seconds']:.2f}s" for name, s in report['stages'].items())
+        counters = ', '.join(f"{name}={value}" for name, value in report['counters'].items())
+        return f"Metrics: {report['seconds']:.2f}s total; {stages or 'no stages'}; {counters or 'no counters'}"
+
+
+@contextmanager
+def profiled(path: Optional[str]):
+    """Run the body under cProfile and dump the stats to path; a no-op when path is None."""
+    if not path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        profiler.dump_stats(path)
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Run the version, asset and compile stages in one pass over a single shared load of Apps/."""
+import argparse
+import logging
+import os
+import sys
+from typing import Optional
+
+from app_store import AppStore
+from compile_repository import RepoCompiler
+from ipa_metadata import IPAMetadataExtractor
+from ipa_mirror import IPAMirror
+from manage_assets import AssetManager, VARIANTS
+from manage_versions import VersionManager, int_or_float_to_int
+from metrics import profiled
+from version_backfill import VersionBackfill
+
+STAGES = ['versions', 'backfill', 'mirror', 'assets', 'compile']
+DEFAULT_STAGES = ['versions', 'assets', 'compile']
+
+
+class Paths:
+    """Where a run reads Apps/ and keeps its caches, state and metrics."""
+
+    def __init__(self, root_dir: str, cache_dir: Optional[str] = None):
+        self.root_dir = root_dir
+        self.apps_dir = os.path.join(root_dir, "Apps")
+        self.cache_dir = cache_dir or os.path.join(root_dir, ".cache")
+        self.metrics_dir = os.path.join(self.cache_dir, "metrics")
+
+    def cache(self, name: str) -> str:
+        return os.path.join(self.cache_dir, name)
+
+    def metrics(self, args, name: str) -> str:
+        # A stage script run on its own may point its report elsewhere with --metrics
+        return args.metrics or os.path.join(self.metrics_dir, name)
+
+
+def run_versions(store: AppStore, paths: Paths, targets: list, args):
+    ipa_metadata = None
+    if args.ipa_metadata:
+        ipa_metadata = IPAMetadataExtractor(paths.cache("ipa_metadata.json"), workers=max(4, args.workers))
+    manager = VersionManager(paths.apps_dir, workers=max(1, args.workers),
+                             cache_path=None if args.no_cache else paths.cache("releases_http_cache.json"),
+                             state_path=paths.cache("releases_state.json"), full_rescan=args.full_rescan,
+                             budget=args.budget, max_wait=args.max_wait, backend=args.backend,
+                             metrics_path=paths.metrics(args, "manage_versions.json"), store=store,
+                             ipa_metadata=ipa_metadata, rules_cache_path=paths.cache("rules_cache.json"))
+    for target in targets:
+        manager.manage(args.action, target, args.keep)
+    manager.finish()
+
+
+def run_backfill(store: AppStore, paths: Paths, targets: list, args):
+    logger = logging.getLogger("Pipeline")
+    backfill = VersionBackfill(paths.cache("version_backfill.json"), workers=max(4, args.workers),
+                               checksums=args.checksums)
+    changed = sum(backfill.backfill(store, target) for target in targets)
+    if not backfill.save():
+        logger.error(f"Failed to save backfill cache {backfill.cache_path}")
+    logger.info(f"{backfill.summary()}; updated {changed} versions")
+
+
+def run_mirror(store: AppStore, paths: Paths, targets: list, args):
+    logger = logging.getLogger("Pipeline")
+    mirror = IPAMirror(os.path.join(paths.root_dir, "static", "IPA"), workers=max(4, args.workers))
+    changed = sum(mirror.mirror(store, target, rewrite=args.rewrite_urls) for target in targets)
+    if not args.no_prune:
+        mirror.prune(store)
+    if not mirror.save():
+        logger.error(f"Failed to save mirror manifest {mirror.manifest_path}")
+    logger.info(f"{mirror.summary()}; updated {changed} versions")
+
+
+def run_assets(store: AppStore, paths: Paths, targets: list, args):
+    manager = AssetManager(paths.apps_dir, jobs=max(1, args.jobs), max_dimension=args.max_dimension,
+                           optimize=args.optimize, variant=args.variant, quality=args.quality,
+                           hashed_names=args.hashed_names,
+                           shared_dir=os.path.join(paths.root_dir, "static", "shared") if args.shared_assets else None,
+                           near_duplicates=args.near_duplicates,
+                           metrics_path=paths.metrics(args, "manage_assets.json"), store=store)
+    for target in targets:
+        manager.manage_icons(target)
+    manager.finish()
+
+
+def run_compile(store: Optional[AppStore], paths: Paths, args) -> bool:
+    compiler = RepoCompiler(root_dir=paths.root_dir, output_dir=paths.root_dir, incremental=args.incremental,
+                            cache_path=paths.cache("compile_cache.json"), compact=args.compact,
+                            gzip_output=args.gzip, metrics_path=paths.metrics(args, "compile_repository.json"),
+                            store=store, workers=args.read_workers, upstreams=not args.no_upstreams,
+                            upstream_cache_path=paths.cache("upstreams.json"), shards=args.shards)
+    result = compiler.compile_repos(args.format, args.verbose)
+    if not result['success']:
+        logging.getLogger("Pipeline").error(f"Compilation Failed: {result['error']}")
+        return False
+    return True
+
+
+STAGE_RUNNERS = {'versions': run_versions, 'backfill': run_backfill, 'mirror': run_mirror, 'assets': run_assets}
+
+
+def run_pipeline(root_dir: str, stages: list, targets: list, args) -> bool:
+    """Run the selected stages in order; every app.json is read once up front and written at most once.
+
+    manage_versions.py, manage_assets.py and compile_repository.py run their single stage through here too.
+    """
+    logger = logging.getLogger("Pipeline")
+    paths = Paths(root_dir, args.cache_dir)
+    store = None
+    # A compile-only run leaves reading Apps/ to the compiler, whose incremental cache can skip unchanged apps
+    if any(stage in STAGE_RUNNERS for stage in stages):
+        store = AppStore(paths.apps_dir).load()
+        logger.info(f"Loaded {store.stats['loaded']} app configs ({store.stats['bytes_read']} bytes)")
+        for stage in stages:
+            if stage in STAGE_RUNNERS:
+                STAGE_RUNNERS[stage](store, paths, targets, args)
+        written = store.save()
+        logger.info(f"Wrote {written} changed app configs ({store.stats['bytes_written']} bytes)")
+
+    if 'compile' in stages:
+        return run_compile(store, paths, args)
+    return True
+
+
+def parse_targets(apps: Optional[str]) -> list:
+    return [target.strip() for target in apps.split(",")] if apps else [None]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Update versions, process assets and compile the repository in one run")
+    parser.add_argument("--stages", type=str, default=",".join(DEFAULT_STAGES),
+                        help=f"Comma-separated stages to run, in pipeline order ({', '.join(STAGES)})")
+    parser.add_argument("--apps", type=str, help="Comma-separated list of app names for the versions and assets stages")
+    parser.add_argument("--cache-dir", type=str, help="Directory for caches, state and metrics (default: .cache)")
+    parser.add_argument("--profile", action="store_true", help="Write a cProfile dump of the whole run to <cache dir>/metrics/pipeline.prof")
+    # versions
+    parser.add_argument("--keep", type=int_or_float_to_int, default=5, help="Number of versions to keep")
+    parser.add_argument("--workers", type=int, default=1, help="Number of apps to fetch concurrently")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the HTTP response cache")
+    parser.add_argument("--budget", type=int, help="Maximum number of API requests to spend in this run")
+    parser.add_argument("--full-rescan", action="store_true", help="Page through every release instead of stopping at known ones")
+    parser.add_argument("--max-wait", type=int, default=60, help="Longest rate-limit backoff to sleep through, in seconds")
+    parser.add_argument("--backend", choices=["rest", "graphql"], default="rest", help="Release lookup backend")
+    parser.add_argument("--ipa-metadata", action="store_true", help="Read Info.plist fields of new IPAs via HTTP Range requests")
+    # backfill
+    parser.add_argument("--checksums", action="store_true", help="Backfill SHA-256 checksums by streaming each IPA")
+    # mirror
+    parser.add_argument("--rewrite-urls", action="store_true", help="Point mirrored version URLs at static/IPA")
+    parser.add_argument("--no-prune", action="store_true", help="Keep mirrored files no version refers to")
+    # assets
+    parser.add_argument("--jobs", type=int, default=1, help="Number of processes used to convert images")
+    parser.add_argument("--max-dimension", type=int, help="Downscale screenshots so their longest side fits this many pixels")
+    parser.add_argument("--optimize", action="store_true", help="Write size-optimized PNGs")
+    parser.add_argument("--variant", choices=sorted(VARIANTS), help="Also write a lossy variant and publish it instead of the PNG")
+    parser.add_argument("--quality", type=int, default=85, help="Quality for lossy variants (1-100)")
+    parser.add_argument("--hashed-names", action="store_true", help="Publish assets under content-hash filenames")
+    parser.add_argument("--shared-assets", action="store_true", help="Store identical images once in static/shared")
+    parser.add_argument("--near-duplicates", type=int, metavar="BITS",
+                        help="With --shared-assets, also share images within BITS of perceptual hash distance")
+    # compile
+    parser.add_argument("-i", "--incremental", action="store_true", help="Reuse cached app records for unchanged apps")
+    parser.add_argument("--compact", action="store_true", help="Write feeds without indentation")
+    parser.add_argument("--gzip", action="store_true", help="Also write a precompressed .json.gz next to each feed")
+    parser.add_argument("--no-upstreams", action="store_true", help="Skip importing apps from the upstream feeds in repo-info.json")
+    parser.add_argument("--shards", action="store_true", help="Also write per-app shards, an index and a delta under shards/")
+    # Options only the single-stage scripts expose
+    parser.set_defaults(action='update', metrics=None, format=None, verbose=False, read_workers=None)
+    args = parser.parse_args()
+
+    stages = [stage.strip() for stage in args.stages.split(",") if stage.strip()]
+    unknown = [stage for stage in stages if stage not in STAGES]
+    if unknown:
+        parser.error(f"Unknown stages: {', '.join(unknown)} (choose from {', '.join(STAGES)})")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    targets = parse_targets(args.apps)
+    profile_path = os.path.join(args.cache_dir or os.path.join(root_dir, ".cache"), "metrics", "pipeline.prof")
+    with profiled(profile_path if args.profile else None):
+        success = run_pipeline(root_dir, stages, targets, args)
+    sys.exit(0 if success else 1)
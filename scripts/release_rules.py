@@ -0,0 +1,173 @@
+"""Per-app .rules.yaml files compiled once into matchers, cached by content hash and shared across threads."""
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Dict, Optional
+
+import yaml
+
+import json_io
+
+RULES_FILE = '.rules.yaml'
+DEFAULT_EXTENSIONS = ('.tipa', '.ipa')
+TEMPLATE = {
+    'preferred_extensions': ['.tipa', '.ipa'],
+    'excluded_extensions': ['.zip', '.tar.gz', '.deb'],
+    'exclude_patterns': ['debug', 'beta'],
+    'strip_v_prefix': True,
+    'replace_chars': {'-': '.', '_': '.'},
+    'remove_chars': ['-beta', '-alpha', '-dev']
+}
+
+
+class CompiledRules:
+    """Release rules with every list and mapping turned into a suffix tuple, lookup table or regex up front.
+
+    Results match the original per-asset list scans exactly; formatted tags are memoized because every
+    asset of a release carries the same tag.
+    """
+
+    def __init__(self, rules: Dict):
+        self.rules = rules
+        self.excluded_extensions = tuple(rules.get('excluded_extensions') or ())
+        preferred = rules.get('preferred_extensions')
+        self.included_extensions = tuple(preferred) if preferred else DEFAULT_EXTENSIONS
+        ranking = rules.get('preferred_extensions', list(DEFAULT_EXTENSIONS)) or ()
+        self.extension_rank: Dict[str, int] = {}
+        for rank, ext in enumerate(ranking):
+            self.extension_rank.setdefault(ext, rank)
+        self.unranked = len(ranking)
+
+        self.strip_v_prefix = bool(rules.get('strip_v_prefix', False))
+        self.remove_chars = tuple(rules.get('remove_chars') or ())
+        replace = dict(rules.get('replace_chars') or {})
+        self.translation = None
+        # One str.translate pass equals the chain of replaces only for single characters whose
+        # replacements do not themselves contain a character a later replace would rewrite
+        if all(len(char) == 1 for char in replace) and not any(c in value for value in replace.values() for c in replace):
+            self.translation = str.maketrans(replace) if replace else None
+            replace = {}
+        self.replace_chars = tuple(replace.items())
+
+        patterns = [pattern.lower() for pattern in rules.get('exclude_patterns') or ()]
+        self.exclude = re.compile('|'.join(map(re.escape, patterns))) if patterns else None
+        # Shared by worker threads; a racing duplicate computation is harmless
+        self.formatted: Dict[str, str] = {}
+
+    def include_asset(self, name: str) -> bool:
+        name = name.lower()
+        if self.excluded_extensions and name.endswith(self.excluded_extensions):
+            return False
+        return name.endswith(self.included_extensions)
+
+    def asset_rank(self, url: str) -> int:
+        """Position of the URL's extension in preferred_extensions; lower is preferred."""
+        return self.extension_rank.get(os.path.splitext(url)[1].lower(), self.unranked)
+
+    def format_version(self, tag: str) -> str:
+        version = self.formatted.get(tag)
+        if version is not None:
+            return version
+        version = tag
+        if self.strip_v_prefix and version.lower().startswith('v'):
+            version = version[1:]
+        for char in self.remove_chars:
+            version = version.replace(char, '')
+        if self.translation:
+            version = version.translate(self.translation)
+        for char, replacement in self.replace_chars:
+            version = version.replace(char, replacement)
+        version = version.strip()
+        self.formatted[tag] = version
+        return version
+
+    def excludes(self, version: str) -> bool:
+        return bool(self.exclude and self.exclude.search(version.lower()))
+
+
+class RulesCache:
+    """Compiled rules by content hash; parsed YAML is persisted so unchanged files skip PyYAML on later runs."""
+
+    def __init__(self, cache_path: Optional[str] = None):
+        self.cache_path = cache_path
+        self.logger = logging.getLogger("RulesCache")
+        self.lock = threading.Lock()
+        self.parsed = self._load()
+        self.compiled: Dict[str, CompiledRules] = {}
+        self.dirty = False
+        self.stats = {'parsed': 0, 'cached': 0, 'missing': 0}
+        self.empty = CompiledRules({})
+
+    def _load(self) -> Dict:
+        cache = json_io.read_json(self.cache_path, self.logger, 'rules cache') if self.cache_path else None
+        return cache if isinstance(cache, dict) else {}
+
+    def save(self) -> bool:
+        if not self.cache_path or not self.dirty:
+            return True
+        with self.lock:
+            # Drop rules no app used this run so the cache does not grow with every edit
+            parsed = {digest: rules for digest, rules in self.parsed.items() if digest in self.compiled}
+        if json_io.write_json(self.cache_path, parsed, sort_keys=True) is None:
+            return False
+        self.dirty = False
+        return True
+
+    def load(self, app_dir: str) -> CompiledRules:
+        """Compiled rules for an app; a missing or unreadable file means no rules, as before."""
+        rules_path = os.path.join(app_dir, RULES_FILE)
+        try:
+            with open(rules_path, 'rb') as f:
+                raw = f.read()
+        except FileNotFoundError:
+            with self.lock:
+                self.stats['missing'] += 1
+            return self.empty
+        except IOError as e:
+            self.logger.error(f"Failed to load rules for {os.path.basename(app_dir)}: {str(e)}")
+            return self.empty
+
+        digest = hashlib.sha256(raw).hexdigest()
+        with self.lock:
+            compiled = self.compiled.get(digest)
+            rules = self.parsed.get(digest)
+            self.stats['cached' if compiled or rules is not None else 'parsed'] += 1
+        if compiled:
+            return compiled
+        if rules is None:
+            try:
+                rules = yaml.safe_load(raw) or {}
+            except yaml.YAMLError as e:
+                self.logger.error(f"Failed to load rules for {os.path.basename(app_dir)}: {str(e)}")
+                return self.empty
+            rules = rules if isinstance(rules, dict) else {}
+        compiled = CompiledRules(rules)
+        with self.lock:
+            compiled = self.compiled.setdefault(digest, compiled)
+            if digest not in self.parsed:
+                try:
+                    # Rules that do not survive JSON unchanged (dates, non-string keys) are re-parsed next run
+                    persistable = json.loads(json.dumps(rules)) == rules
+                except (TypeError, ValueError):
+                    persistable = False
+                if persistable:
+                    self.parsed[digest] = rules
+                    self.dirty = True
+        return compiled
+
+    def summary(self) -> str:
+        return (f"Rules: {self.stats['parsed']} parsed, {self.stats['cached']} cached, "
+                f"{self.stats['missing']} apps without rules")
+
+
+def write_template(app_dir: str) -> bool:
+    """Create a starter .rules.yaml for an app that has none; returns whether one was written."""
+    rules_path = os.path.join(app_dir, RULES_FILE)
+    if os.path.exists(rules_path):
+        return False
+    with open(rules_path, 'w') as f:
+        yaml.dump(TEMPLATE, f, default_flow_style=False)
+    return True
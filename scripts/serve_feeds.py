@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+"""Serve the compiled feeds from memory, plus Apps/ and static/, recompiling only apps whose app.json changed."""
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+import gzip
+import hashlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import logging
+import mimetypes
+import os
+from pathlib import Path
+import shutil
+import threading
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from compile_repository import AppRecord, CONFIG, JSONFragment, RepoCompiler
+
+# Every asset URL in app.json and the feeds hangs off this prefix; --local-urls points it at this server instead
+RAW_ROOT = CONFIG["NO_ICON_PATH"].split('/static/')[0]
+SERVED_DIRS = ('Apps', 'static')
+COMPRESSIBLE = ('application/json', 'text/', 'image/svg+xml')
+MIN_GZIP_SIZE = 1024
+
+
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows gzip; a coding listed with q=0 is refused, as is anything unlisted."""
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(','):
+        coding, *params = [part.strip() for part in item.split(';')]
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding.lower()] = quality
+    for coding in ('gzip', 'x-gzip', '*'):
+        if coding in qualities:
+            return qualities[coding] > 0
+    return False
+
+
+@dataclass(frozen=True)
+class Feed:
+    body: bytes
+    gzipped: bytes
+    etag: str
+
+
+class FragmentCompiler(RepoCompiler):
+    """RepoCompiler whose feed entries are serialized once per app record and reused until that app changes."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fragments: Dict[Tuple[AppRecord, str], JSONFragment] = {}
+
+    def _create_entry(self, app: AppRecord, fmt: str) -> JSONFragment:
+        key = (app, fmt)
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            fragment = JSONFragment(self._json_fragment(super()._create_entry(app, fmt), 2))
+            self.fragments[key] = fragment
+        return fragment
+
+    def forget(self, apps: List[AppRecord]):
+        for app in apps:
+            for fmt in CONFIG["OUTPUT_FILES"]:
+                self.fragments.pop((app, fmt), None)
+
+
+class FeedStore:
+    """In-memory feeds kept current by polling app.json and repo-info.json stats."""
+
+    def __init__(self, root_dir: str, compact: bool = False, base_url: Optional[str] = None, upstreams: bool = True,
+                 upstream_cache_path: Optional[str] = None):
+        self.root_dir = Path(root_dir).resolve()
+        self.apps_dir = self.root_dir / 'Apps'
+        self.repo_path = self.root_dir / 'repo-info.json'
+        self.base_url = base_url
+        self.compiler = FragmentCompiler(root_dir=str(self.root_dir), compact=compact, upstreams=upstreams,
+                                         upstream_cache_path=upstream_cache_path)
+        self.logger = logging.getLogger("FeedServer")
+        self.records: Dict[str, Tuple[Tuple[int, int], Optional[AppRecord]]] = {}
+        self.imported: List[AppRecord] = []
+        self.repo_stat: Optional[Tuple[int, int]] = None
+        self.repo_config: Optional[Dict] = None
+        self.week: Optional[Tuple[int, int]] = None
+        self.feeds: Dict[str, Feed] = {}
+        self.lock = threading.Lock()
+
+    def refresh(self) -> bool:
+        """Re-read changed configs and rebuild the feeds; returns whether anything changed."""
+        with self.lock:
+            changed = self._scan()
+            week = datetime.now().isocalendar()[:2]
+            if not changed and week == self.week and self.feeds:
+                return False
+            self.week = week
+            self._build()
+            return True
+
+    def _stat(self, path: Path) -> Optional[Tuple[int, int]]:
+        try:
+            stat = path.stat()
+        except (FileNotFoundError, NotADirectoryError):
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _scan(self) -> bool:
+        changed = False
+        repo_stat = self._stat(self.repo_path)
+        if repo_stat != self.repo_stat:
+            self.repo_stat = repo_stat
+            self.repo_config = self.compiler.load_config(self.repo_path) if repo_stat else None
+            changed = True
+
+        seen = set()
+        names = sorted(p.name for p in self.apps_dir.iterdir() if p.is_dir()) if self.apps_dir.is_dir() else []
+        for name in names:
+            stat = self._stat(self.apps_dir / name / 'app.json')
+            if stat is None:
+                continue
+            seen.add(name)
+            previous = self.records.get(name)
+            if previous and previous[0] == stat:
+                continue
+            config = self.compiler.load_config(self.apps_dir / name / 'app.json')
+            record = AppRecord.from_config(config) if isinstance(config, dict) and config.get("bundleID") else None
+            if previous and previous[1]:
+                self.compiler.forget([previous[1]])
+            self.records[name] = (stat, record)
+            self.logger.info(f"{'Reloaded' if previous else 'Loaded'} {name}")
+            changed = True
+
+        for name in set(self.records) - seen:
+            _, record = self.records.pop(name)
+            if record:
+                self.compiler.forget([record])
+            self.logger.info(f"Removed {name}")
+            changed = True
+        if changed:
+            # Keep feed order identical to compile_repository.py, which walks Apps/ alphabetically
+            self.records = dict(sorted(self.records.items()))
+        return changed
+
+    def _build(self):
+        if not self.repo_config:
+            self.logger.error(f"Missing/invalid repo config {self.repo_path}")
+            self.feeds = {}
+            return
+        apps = [record for _, record in self.records.values() if record]
+        # Upstream records are re-imported (conditionally) on every build, so drop the previous ones' fragments
+        self.compiler.forget(self.imported)
+        catalog, self.imported, _ = self.compiler.build_catalog(self.repo_config, apps)
+        feeds = {}
+        for fmt, name in CONFIG["OUTPUT_FILES"].items():
+            parts: List[str] = []
+            self.compiler.render(fmt, catalog, parts.append)
+            text = ''.join(parts)
+            if self.base_url:
+                text = text.replace(RAW_ROOT, self.base_url)
+            body = text.encode('utf-8')
+            feeds[name] = Feed(
+                body, gzip.compress(body, compresslevel=6, mtime=0), f'"{hashlib.sha256(body).hexdigest()[:32]}"')
+        self.feeds = feeds
+        self.logger.info(f"Compiled {len(catalog.apps)} apps into {len(feeds)} feeds")
+
+    def watch(self, interval: float, stop: threading.Event):
+        while not stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                self.logger.error(f"Refresh failed: {str(e)}")
+
+
+def make_handler(store: FeedStore):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        server_version = "DRKSRCFeeds/1.0"
+
+        def log_message(self, format, *args):
+            store.logger.debug(f"{self.address_string()} {format % args}")
+
+        def do_HEAD(self):
+            self.serve(head=True)
+
+        def do_GET(self):
+            self.serve(head=False)
+
+        def serve(self, head: bool):
+            path = unquote(urlparse(self.path).path).lstrip('/')
+            feed = store.feeds.get(path)
+            if feed is not None:
+                self.send_feed(feed, head)
+                return
+            file_path = self.resolve(path)
+            if file_path is None:
+                self.send_error(404)
+                return
+            self.send_file(file_path, head)
+
+        def resolve(self, path: str) -> Optional[Path]:
+            if path == 'repo-info.json':
+                return store.repo_path if store.repo_path.is_file() else None
+            if path.split('/', 1)[0] not in SERVED_DIRS:
+                return None
+            file_path = (store.root_dir / path).resolve()
+            # Refuse anything that escapes the served directories, e.g. through '..' or symlinks
+            if not any(file_path.is_relative_to(store.root_dir / d) for d in SERVED_DIRS) or not file_path.is_file():
+                return None
+            return file_path
+
+        def not_modified(self, etag: str) -> bool:
+            tags = [tag.strip() for tag in self.headers.get('If-None-Match', '').split(',')]
+            if etag not in tags and '*' not in tags:
+                return False
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return True
+
+        def send_feed(self, feed: Feed, head: bool):
+            if self.not_modified(feed.etag):
+                return
+            body = feed.gzipped if accepts_gzip(self.headers.get('Accept-Encoding', '')) else feed.body
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("ETag", feed.etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            if body is feed.gzipped:
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if not head:
+                self.wfile.write(body)
+
+        def send_file(self, path: Path, head: bool):
+            stat = path.stat()
+            etag = f'W/"{stat.st_mtime_ns:x}-{stat.st_size:x}"'
+            if self.not_modified(etag):
+                return
+            content_type = mimetypes.guess_type(path.name)[0] or 'application/octet-stream'
+            compress = (stat.st_size >= MIN_GZIP_SIZE and content_type.startswith(COMPRESSIBLE)
+                        and accepts_gzip(self.headers.get('Accept-Encoding', '')))
+            body = gzip.compress(path.read_bytes(), compresslevel=6, mtime=0) if compress else None
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Vary", "Accept-Encoding")
+            if compress:
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(body) if compress else stat.st_size))
+            self.end_headers()
+            if head:
+                return
+            if compress:
+                self.wfile.write(body)
+                return
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, self.wfile)
+
+    return Handler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve the repository feeds and assets locally, recompiling on change")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--interval", type=float, default=1.0, help="Seconds between checks for changed app.json files")
+    parser.add_argument("--no-watch", action="store_true", help="Compile once at startup and never recompile")
+    parser.add_argument("--compact", action="store_true", help="Serve feeds without indentation")
+    parser.add_argument("--local-urls", action="store_true", help="Point asset URLs in the feeds at this server instead of GitHub")
+    parser.add_argument("--no-upstreams", action="store_true", help="Do not merge the upstream feeds listed in repo-info.json")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log every request")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s - %(levelname)s - %(message)s')
+    root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+    httpd = ThreadingHTTPServer((args.host, args.port), None)
+    host, port = httpd.server_address[:2]
+    store = FeedStore(root_dir, compact=args.compact, base_url=f"http://{host}:{port}" if args.local_urls else None,
+                      upstreams=not args.no_upstreams)
+    store.refresh()
+    httpd.RequestHandlerClass = make_handler(store)
+    httpd.daemon_threads = True
+
+    stop = threading.Event()
+    if not args.no_watch:
+        threading.Thread(target=store.watch, args=(args.interval, stop), daemon=True).start()
+    store.logger.info(f"Serving {', '.join(store.feeds)} on http://{host}:{port}/")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        httpd.server_close()
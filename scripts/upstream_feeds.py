@@ -0,0 +1,234 @@
+"""Import apps from other AltStore, TrollApps or Scarlet feeds, fetched concurrently with conditional requests.
+
+Upstreams are listed in repo-info.json; "format" is detected from the feed when omitted and "apps"
+limits the import to those bundle IDs:
+
+    "upstreams": [
+        {"url": "https://example.com/altstore.json", "apps": ["com.example.app"]},
+        {"url": "https://example.com/scarlet.json", "format": "scarlet"}
+    ]
+"""
+from concurrent.futures import ThreadPoolExecutor
+import gzip
+import hashlib
+import http.client
+import json
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+import urllib.error
+import urllib.request
+import zlib
+
+import json_io
+
+FORMATS = ('altstore', 'trollapps', 'scarlet')
+USER_AGENT = 'DRKSRC-compiler'
+
+
+def _date(value) -> str:
+    return value.split('T')[0] if isinstance(value, str) else ''
+
+
+def _screenshots(value) -> List[str]:
+    """AltStore lists plain URLs, {'imageURL': ...} dicts, or both grouped by device."""
+    if isinstance(value, dict):
+        value = value.get('iphone') or next(iter(value.values()), [])
+    urls = []
+    for item in value if isinstance(value, list) else []:
+        url = item.get('imageURL') if isinstance(item, dict) else item
+        if isinstance(url, str) and url:
+            urls.append(url)
+    return urls
+
+
+def from_altstore(app: Dict) -> Dict:
+    """Map an AltStore or TrollApps feed entry onto the app.json schema."""
+    versions = app.get('versions')
+    if not isinstance(versions, list):
+        # Pre-2.0 sources describe a single version with top-level fields
+        versions = [{'version': app.get('version'), 'date': app.get('versionDate'),
+                     'downloadURL': app.get('downloadURL'), 'size': app.get('size')}] if app.get('downloadURL') else []
+    config = {
+        'name': app.get('name'),
+        'bundleID': app.get('bundleIdentifier'),
+        'devName': app.get('developerName'),
+        'subtitle': app.get('subtitle'),
+        'description': app.get('localizedDescription'),
+        'category': app.get('category'),
+        'icon': app.get('iconURL'),
+        'screenshots': _screenshots(app.get('screenshots') or app.get('screenshotURLs')),
+        'versions': [],
+    }
+    for version in versions:
+        if not isinstance(version, dict) or not version.get('downloadURL'):
+            continue
+        entry = {
+            'version': version.get('version') or 'Unknown',
+            'date': _date(version.get('date')),
+            'size': version.get('size') or 0,
+            'url': version['downloadURL'],
+        }
+        if version.get('sha256'):
+            entry['sha256'] = version['sha256']
+        config['versions'].append(entry)
+    return {key: value for key, value in config.items() if value not in (None, '')}
+
+
+def from_scarlet(app: Dict, category: str) -> Dict:
+    """Map a Scarlet feed entry, which only carries its latest version, onto the app.json schema."""
+    config = {
+        'name': app.get('name'),
+        'bundleID': app.get('bundleID'),
+        'devName': app.get('dev'),
+        'description': app.get('description'),
+        'category': app.get('category') or category,
+        'icon': app.get('icon'),
+        'screenshots': _screenshots(app.get('screenshots')),
+        'versions': [{'version': app.get('version') or 'Unknown', 'date': '', 'size': 0, 'url': app['down']}]
+        if app.get('down') else [],
+        'scarletDebs': app.get('debs'),
+    }
+    config = {key: value for key, value in config.items() if value not in (None, '')}
+    if 'enableBackup' in app:
+        config['scarletBackup'] = app['enableBackup']
+    return config
+
+
+def detect_format(feed: Dict) -> Optional[str]:
+    if 'META' in feed:
+        return 'scarlet'
+    if isinstance(feed.get('apps'), list):
+        return 'trollapps' if 'news' in feed and not feed.get('featuredApps') else 'altstore'
+    return None
+
+
+def map_feed(feed: Dict, fmt: str) -> List[Dict]:
+    """Every entry of a parsed feed as an app.json dict, in feed order; entries without a bundle ID are dropped."""
+    if fmt == 'scarlet':
+        apps = [from_scarlet(app, category) for category, entries in feed.items()
+                if category != 'META' and isinstance(entries, list)
+                for app in entries if isinstance(app, dict)]
+    else:
+        apps = [from_altstore(app) for app in feed.get('apps', []) if isinstance(app, dict)]
+    return [app for app in apps if app.get('bundleID')]
+
+
+class UpstreamFeeds:
+    """Conditional, concurrent fetches of upstream feeds, caching each feed's mapped entries by URL."""
+
+    def __init__(self, cache_path: Optional[str] = None, workers: int = 8, timeout: int = 30):
+        self.cache_path = cache_path
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.logger = logging.getLogger("UpstreamFeeds")
+        self.lock = threading.Lock()
+        self.cache = self._load()
+        self.stats = {'fetched': 0, 'not_modified': 0, 'unchanged': 0, 'failed': 0, 'bytes_downloaded': 0}
+
+    def _load(self) -> Dict:
+        cache = json_io.read_json(self.cache_path, self.logger, 'upstream cache') if self.cache_path else None
+        return cache if isinstance(cache, dict) else {}
+
+    def save(self) -> bool:
+        if not self.cache_path:
+            return True
+        with self.lock:
+            return json_io.write_json(self.cache_path, self.cache, ensure_ascii=False) is not None
+
+    def _count(self, stat: str, amount: int = 1):
+        with self.lock:
+            self.stats[stat] += amount
+
+    def _fetch(self, upstream: Dict) -> Optional[Dict]:
+        """The cache entry for one upstream: refreshed on 200, reused on 304, stale (or None) when the fetch fails."""
+        url = upstream['url']
+        with self.lock:
+            cached = self.cache.get(url)
+        request = urllib.request.Request(url, headers={'Accept-Encoding': 'gzip', 'User-Agent': USER_AGENT})
+        if cached and cached.get('etag'):
+            request.add_header('If-None-Match', cached['etag'])
+        if cached and cached.get('last_modified'):
+            request.add_header('If-Modified-Since', cached['last_modified'])
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                body = response.read()
+                headers = response.headers
+            self._count('bytes_downloaded', len(body))
+            if headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cached:
+                self._count('not_modified')
+                return cached
+            self.logger.error(f"Failed to fetch upstream {url}: HTTP {e.code}")
+            self._count('failed')
+            return cached
+        except (urllib.error.URLError, OSError, EOFError, http.client.HTTPException, ValueError, zlib.error) as e:
+            # Truncated reads (IncompleteRead) and bad gzip bodies are as transient as a dropped connection
+            self.logger.error(f"Failed to fetch upstream {url}: {str(e) or type(e).__name__}")
+            self._count('failed')
+            return cached
+
+        digest = hashlib.sha256(body).hexdigest()
+        validators = {'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+        fmt = upstream.get('format')
+        if cached and cached.get('sha256') == digest and (not fmt or cached.get('format') == fmt):
+            # A server without validators still costs a download, but not a re-parse
+            self._count('unchanged')
+            return {**cached, **validators}
+        try:
+            feed = json_io.loads(body)
+        except (json.JSONDecodeError, UnicodeDecodeError) as e:
+            self.logger.error(f"Invalid JSON from upstream {url}: {str(e)}")
+            self._count('failed')
+            return cached
+        fmt = fmt or (detect_format(feed) if isinstance(feed, dict) else None)
+        if fmt not in FORMATS or not isinstance(feed, dict):
+            self.logger.error(f"Unrecognized feed format from upstream {url}")
+            self._count('failed')
+            return cached
+        self._count('fetched')
+        return {**validators, 'sha256': digest, 'format': fmt, 'apps': map_feed(feed, fmt)}
+
+    def fetch(self, upstreams: List[Dict]) -> List[Tuple[Dict, Optional[Dict]]]:
+        """(upstream, cache entry) pairs in configuration order; invalid upstream entries are skipped."""
+        valid = [u for u in upstreams if isinstance(u, dict) and isinstance(u.get('url'), str)]
+        if len(valid) != len(upstreams):
+            self.logger.warning(f"Ignoring {len(upstreams) - len(valid)} upstream entries without a url")
+        if self.workers == 1 or len(valid) < 2:
+            results = [self._fetch(upstream) for upstream in valid]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.workers, len(valid))) as executor:
+                results = list(executor.map(self._fetch, valid))
+        with self.lock:
+            for upstream, entry in zip(valid, results):
+                if entry is not None:
+                    self.cache[upstream['url']] = entry
+        return list(zip(valid, results))
+
+    def import_apps(self, upstreams: List[Dict], local_ids: set) -> Tuple[List[Dict], List[str]]:
+        """App configs to add to the catalog and one digest per upstream for build signatures.
+
+        Local apps win on bundle ID conflicts, and earlier upstreams win over later ones.
+        """
+        seen = set(local_ids)
+        imported, digests = [], []
+        for upstream, entry in self.fetch(upstreams):
+            digests.append(f"{upstream['url']}:{entry.get('sha256') if entry else None}")
+            if not entry:
+                continue
+            wanted = upstream.get('apps')
+            wanted = set(wanted) if isinstance(wanted, list) else None
+            for app in entry['apps']:
+                bundle_id = app['bundleID']
+                if (wanted is not None and bundle_id not in wanted) or bundle_id in seen:
+                    continue
+                seen.add(bundle_id)
+                imported.append(app)
+        return imported, digests
+
+    def summary(self) -> str:
+        return (f"Upstreams: {self.stats['fetched']} fetched, {self.stats['not_modified']} not modified, "
+                f"{self.stats['unchanged']} unchanged, {self.stats['failed']} failed, "
+                f"{self.stats['bytes_downloaded']} bytes downloaded")
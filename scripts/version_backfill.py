@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""Fill in missing version sizes with HEAD requests and, optionally, SHA-256 checksums by streaming each IPA."""
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import logging
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import requests
+from requests.exceptions import RequestException
+
+from app_store import AppEntry, AppStore
+from http_session import pooled_session
+import json_io
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class VersionBackfill:
+    """Pooled, URL-cached lookups of download sizes and checksums for app.json version entries."""
+
+    def __init__(self, cache_path: Optional[str] = None, workers: int = 8, checksums: bool = False,
+                 session: Optional[requests.Session] = None):
+        self.cache_path = cache_path
+        self.workers = max(1, workers)
+        self.checksums = checksums
+        self.logger = logging.getLogger("VersionBackfill")
+        self.lock = threading.Lock()
+        self.cache = self._load()
+        self.session = session or pooled_session(max(10, self.workers))
+        self.stats = {'sizes': 0, 'checksums': 0, 'cached': 0, 'failed': 0, 'bytes_streamed': 0}
+
+    def _load(self) -> Dict:
+        cache = json_io.read_json(self.cache_path, self.logger, 'backfill cache') if self.cache_path else None
+        return cache if isinstance(cache, dict) else {}
+
+    def save(self) -> bool:
+        if not self.cache_path:
+            return True
+        with self.lock:
+            return json_io.write_json(self.cache_path, self.cache, indent=2, sort_keys=True) is not None
+
+    def _content_length(self, url: str) -> int:
+        response = self.session.head(url, allow_redirects=True, timeout=30)
+        response.raise_for_status()
+        length = response.headers.get('Content-Length')
+        if length and length.isdigit() and int(length) > 0:
+            return int(length)
+        # Some hosts omit the length on HEAD; a one-byte range still reports the total in Content-Range
+        response = self.session.get(url, headers={'Range': 'bytes=0-0'}, timeout=30, stream=True)
+        try:
+            response.raise_for_status()
+            total = response.headers.get('Content-Range', '').rpartition('/')[2]
+        finally:
+            response.close()
+        if not total.isdigit():
+            raise ValueError("server reported no content length")
+        return int(total)
+
+    def _stream_sha256(self, url: str) -> Tuple[int, str]:
+        digest = hashlib.sha256()
+        size = 0
+        with self.session.get(url, timeout=60, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(CHUNK_SIZE):
+                digest.update(chunk)
+                size += len(chunk)
+        with self.lock:
+            self.stats['bytes_streamed'] += size
+        return size, digest.hexdigest()
+
+    def lookup(self, url: str) -> Optional[Dict]:
+        """Return {'size': ...} plus 'sha256' when checksums are on, from the cache or the network."""
+        with self.lock:
+            cached = dict(self.cache.get(url, {}))
+        if cached.get('size') and (not self.checksums or cached.get('sha256')):
+            with self.lock:
+                self.stats['cached'] += 1
+            return cached
+        try:
+            if self.checksums:
+                # Streaming yields the exact size too, so no separate HEAD is needed
+                size, sha256 = self._stream_sha256(url)
+                result = {**cached, 'size': size, 'sha256': sha256}
+            else:
+                result = {**cached, 'size': self._content_length(url)}
+        except (RequestException, ValueError) as e:
+            self.logger.error(f"Failed to backfill {url}: {str(e)}")
+            with self.lock:
+                self.stats['failed'] += 1
+            return None
+        with self.lock:
+            self.cache[url] = result
+            self.stats['checksums' if self.checksums else 'sizes'] += 1
+        return result
+
+    def backfill(self, store: AppStore, target: Optional[str] = None) -> int:
+        """Complete version entries missing a size (or checksum); return how many entries changed."""
+        pending: List[Tuple[AppEntry, Dict]] = []
+        for entry in store.load().select(target):
+            for version in entry.data.get('versions', []):
+                if version.get('url') and (not version.get('size') or (self.checksums and not version.get('sha256'))):
+                    pending.append((entry, version))
+        if not pending:
+            return 0
+
+        urls = list(dict.fromkeys(version['url'] for _, version in pending))
+        if self.workers == 1 or len(urls) < 2:
+            results = {url: self.lookup(url) for url in urls}
+        else:
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = dict(zip(urls, executor.map(self.lookup, urls)))
+
+        changed = 0
+        for entry, version in pending:
+            result = results.get(version['url'])
+            if not result:
+                continue
+            if version.get('size') and version['size'] != result['size']:
+                self.logger.warning(f"{entry.name} {version.get('version')}: recorded size {version['size']} "
+                                    f"differs from download size {result['size']}")
+            updated = {**version, 'size': version.get('size') or result['size']}
+            if result.get('sha256'):
+                updated['sha256'] = result['sha256']
+            if updated != version:
+                version.update(updated)
+                store.mark_dirty(entry.name)
+                changed += 1
+        return changed
+
+    def summary(self) -> str:
+        return (f"Backfill: {self.stats['sizes']} sizes and {self.stats['checksums']} checksums fetched, "
+                f"{self.stats['cached']} cached, {self.stats['failed']} failed, "
+                f"{self.stats['bytes_streamed']} bytes streamed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill missing version sizes and checksums in app.json files")
+    parser.add_argument("--apps", type=str, help="Comma-separated list of app names")
+    parser.add_argument("--checksums", action="store_true", help="Also compute SHA-256 by streaming each IPA")
+    parser.add_argument("--workers", type=int, default=8, help="Number of downloads to check concurrently")
+    parser.add_argument("--cache-dir", type=str, help="Directory for the backfill cache (default: .cache)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    cache_dir = args.cache_dir or os.path.join(current_dir, "..", ".cache")
+    store = AppStore(os.path.join(current_dir, "..", "Apps"))
+    backfill = VersionBackfill(os.path.join(cache_dir, "version_backfill.json"), workers=args.workers,
+                               checksums=args.checksums)
+    targets = [target.strip() for target in args.apps.split(",")] if args.apps else [None]
+    changed = sum(backfill.backfill(store, target) for target in targets)
+    written = store.save()
+    if not backfill.save():
+        backfill.logger.error(f"Failed to save backfill cache {backfill.cache_path}")
+    backfill.logger.info(f"{backfill.summary()}; updated {changed} versions in {written} app configs")
@@ -0,0 +1,122 @@
+"""Version ordering, deduplication and retention for one app's app.json version list."""
+from bisect import bisect_right
+import heapq
+from operator import itemgetter
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+SEGMENT = re.compile(r'\d+|[a-z]+')
+# Words that mark a release as coming before the plain version they are attached to (1.2.rc1 < 1.2)
+PRE_RELEASE = {'dev': 0, 'a': 1, 'alpha': 1, 'b': 2, 'beta': 2, 'c': 3, 'pre': 3, 'preview': 3, 'rc': 3}
+# Each segment is (rank, number, word): pre-release words < end of version < other words < numbers
+END = (1, 0, '')
+
+
+def version_key(version: str) -> Tuple:
+    """Comparable key for a version string as produced by CompiledRules.format_version.
+
+    Numbers compare numerically and trailing zeros are ignored, so '1.10' > '1.9' and '1.0' == '1.0.0';
+    separators and a leading 'v' are ignored. Tags without any digits (nightly, latest) only compare
+    meaningfully with each other; VersionIndex places them by release date instead.
+    """
+    text = version.strip().lower()
+    if text.startswith('v') and text[1:2].isdigit():
+        text = text[1:]
+    parts = SEGMENT.findall(text)
+    segments = []
+    for part in parts + ['']:
+        if part.isdigit():
+            segments.append((3, int(part), ''))
+            continue
+        # Zeros that end a numeric run carry no meaning: 2.0.rc1 is 2.rc1 and 1.0.0 is 1
+        while segments and segments[-1] == (3, 0, ''):
+            segments.pop()
+        if part in PRE_RELEASE:
+            segments.append((0, PRE_RELEASE[part], ''))
+        elif part:
+            segments.append((2, 0, part))
+    return (*segments, END)
+
+
+def is_numbered(key: Tuple) -> bool:
+    return any(segment[0] == 3 for segment in key)
+
+
+class VersionIndex:
+    """One app's versions keyed by download URL and normalized version, each parsed once into a sort key.
+
+    Only entries sharing a download URL are duplicates: a version may ship several assets (a .tipa next to
+    an .ipa, variant builds), and all of them are kept. The normalized version and date only tell whether
+    a newly fetched release is already known.
+    """
+
+    def __init__(self, versions: Iterable[Dict] = ()):
+        self.by_url: Dict[str, Dict] = {}
+        # First entry indexed for each normalized version
+        self.by_key: Dict[Tuple, Dict] = {}
+        self.ranked: List[Tuple[Tuple, str, Dict]] = []
+        self.rolling = 0
+        self.duplicates = 0
+        for version in versions:
+            if not self.add(version):
+                self.duplicates += 1
+
+    def __len__(self) -> int:
+        return len(self.ranked)
+
+    def find(self, url: Optional[str] = None, version: Optional[str] = None,
+             date: Optional[str] = None) -> Optional[Dict]:
+        """The indexed entry with this download URL, if any.
+
+        Without a URL the normalized version alone decides; with one, a version match also needs the same
+        date, so a rolling tag (nightly, latest) republished with a new asset is not mistaken for the old one.
+        """
+        if url and url in self.by_url:
+            return self.by_url[url]
+        if version is None:
+            return None
+        found = self.by_key.get(version_key(version))
+        if found and url and found.get('date') != date:
+            return None
+        return found
+
+    def add(self, version: Dict) -> bool:
+        """Index a version entry unless its download URL is already present; returns whether it was added."""
+        key = version_key(version.get('version', ''))
+        url = version.get('url')
+        if url and url in self.by_url:
+            return False
+        if url:
+            self.by_url[url] = version
+        self.by_key.setdefault(key, version)
+        if not is_numbered(key):
+            self.rolling += 1
+        self.ranked.append((key, version.get('date', ''), version))
+        return True
+
+    def _ranking(self) -> List[Tuple[Tuple, str, Dict]]:
+        """(key, date, entry) with each tag without digits keyed as the newest numbered version released
+        by its date, so a rolling nightly ranks above the releases it supersedes and below later ones."""
+        if not self.rolling:
+            return self.ranked
+        numbered = sorted((date, key) for key, date, _ in self.ranked if is_numbered(key))
+        dates = [date for date, _ in numbered]
+        newest_by: List[Tuple] = []
+        for _, key in numbered:
+            newest_by.append(max(key, newest_by[-1]) if newest_by else key)
+        ranking = []
+        for key, date, version in self.ranked:
+            if not is_numbered(key):
+                position = bisect_right(dates, date)
+                key = newest_by[position - 1] if position else ()
+            ranking.append((key, date, version))
+        return ranking
+
+    def newest(self, count: Optional[int] = None) -> List[Dict]:
+        """Entries ordered newest first by (version, date), limited to count; ties keep insertion order."""
+        ranking = self._ranking()
+        if count is None or count >= len(ranking):
+            ordered = sorted(ranking, key=itemgetter(0, 1), reverse=True)
+        else:
+            ordered = heapq.nlargest(count, ranking, key=itemgetter(0, 1))
+        return [version for _, _, version in ordered]
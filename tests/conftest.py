@@ -0,0 +1,70 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import re
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
+
+RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Base for per-test request handlers; server.calls records (method, path, headers) of every request."""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def record(self):
+        with self.server.lock:
+            self.server.calls.append((self.command, self.path, dict(self.headers)))
+
+    def send_body(self, body: bytes, status: int = 200, headers=None):
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_ranged(self, body: bytes, headers=None):
+        """Serve body honouring a single Range header, like a release download CDN."""
+        match = RANGE.match(self.headers.get("Range", ""))
+        if not match or not (match.group(1) or match.group(2)):
+            self.send_body(body, 200, {"Accept-Ranges": "bytes", **(headers or {})})
+            return
+        first, last = match.groups()
+        if not first:
+            start, end = max(0, len(body) - int(last)), len(body) - 1
+        else:
+            start, end = int(first), min(len(body) - 1, int(last)) if last else len(body) - 1
+        if start > end:
+            self.send_body(b"", 416, {"Content-Range": f"bytes */{len(body)}"})
+            return
+        self.send_body(body[start:end + 1], 206,
+                       {"Content-Range": f"bytes {start}-{end}/{len(body)}", "Accept-Ranges": "bytes",
+                        **(headers or {})})
+
+
+@pytest.fixture
+def serve():
+    """Start a local stand-in server for a StubHandler subclass; returns the server, whose .url is its base URL."""
+    servers = []
+
+    def start(handler):
+        httpd = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        httpd.daemon_threads = True
+        httpd.calls = []
+        httpd.lock = threading.Lock()
+        httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+        threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+        servers.append(httpd)
+        return httpd
+
+    yield start
+    for httpd in servers:
+        httpd.shutdown()
+        httpd.server_close()
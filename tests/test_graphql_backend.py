@@ -0,0 +1,160 @@
+import json
+import re
+
+import pytest
+
+from conftest import StubHandler
+from manage_versions import GRAPHQL_ASSETS_PER_RELEASE, VersionManager
+
+RELEASES_PATH = re.compile(r"^/repos/([^/]+)/([^/]+)/releases$")
+
+
+def release(repo: str, tag: str, day: int, assets=1):
+    names = ["app.ipa"] + [f"app-{i}.ipa" for i in range(1, assets)]
+    return {
+        "id": day,
+        "tag_name": tag,
+        "published_at": f"2024-01-{day:02d}T00:00:00Z",
+        "assets": [{"name": name, "size": 100 + i, "browser_download_url": f"https://example.com/{repo}/{tag}/{name}"}
+                   for i, name in enumerate(names)],
+    }
+
+
+class GitHubHandler(StubHandler):
+    """REST and GraphQL release endpoints over server.releases; server.graphql_errors lists repos that fail."""
+
+    def do_GET(self):
+        self.record()
+        match = RELEASES_PATH.match(self.path)
+        if not match:
+            self.send_body(b"", 404)
+            return
+        body = json.dumps(self.server.releases[match.group(2)]).encode()
+        self.send_body(body, 200, {"Content-Type": "application/json", "X-RateLimit-Remaining": "4000"})
+
+    def do_POST(self):
+        self.record()
+        payload = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.server.graphql_status != 200:
+            self.send_body(b'{"message": "rate limited"}', self.server.graphql_status,
+                           {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "9999999999"})
+            return
+        first = int(re.search(r"releases\(first: (\d+)", payload["query"]).group(1))
+        per_release = int(re.search(r"releaseAssets\(first: (\d+)", payload["query"]).group(1))
+        data, errors = {}, []
+        variables = payload["variables"]
+        for key in [k for k in variables if k.startswith("o")]:
+            name = variables[f"n{key[1:]}"]
+            if name in self.server.graphql_errors:
+                data[f"r{key[1:]}"] = None
+                errors.append({"message": f"Could not resolve to a Repository with the name '{name}'."})
+                continue
+            nodes = [{
+                "databaseId": r["id"], "tagName": r["tag_name"], "publishedAt": r["published_at"],
+                "releaseAssets": {
+                    "pageInfo": {"hasNextPage": len(r["assets"]) > per_release},
+                    "nodes": [{"name": a["name"], "size": a["size"], "downloadUrl": a["browser_download_url"]}
+                              for a in r["assets"][:per_release]],
+                },
+            } for r in self.server.releases[name][:first]]
+            data[f"r{key[1:]}"] = {"releases": {"pageInfo": {"hasNextPage": len(self.server.releases[name]) > first},
+                                                "nodes": nodes}}
+        body = {"data": data, **({"errors": errors} if errors else {})}
+        # GraphQL's point budget is reported in the same headers as the REST limit
+        self.send_body(json.dumps(body).encode(), 200,
+                       {"Content-Type": "application/json", "X-RateLimit-Remaining": "1",
+                        "X-RateLimit-Reset": "9999999999"})
+
+
+@pytest.fixture
+def github(serve, monkeypatch, tmp_path):
+    server = serve(GitHubHandler)
+    server.releases = {}
+    server.graphql_errors = set()
+    server.graphql_status = 200
+    monkeypatch.setenv("GITHUB_TOKEN", "test-token")
+    monkeypatch.setenv("GITHUB_API_URL", server.url)
+    monkeypatch.setenv("GITHUB_GRAPHQL_URL", f"{server.url}/graphql")
+    apps = tmp_path / "Apps"
+    apps.mkdir()
+
+    def add_app(name: str, releases):
+        server.releases[name] = releases
+        (apps / name).mkdir()
+        (apps / name / "app.json").write_text(json.dumps({"gitURLs": [f"https://github.com/example/{name}"],
+                                                          "versions": []}))
+
+    server.add_app = add_app
+    server.apps = apps
+    return server
+
+
+def run(github, **options):
+    manager = VersionManager(str(github.apps), backend="graphql", max_wait=0, **options)
+    manager.manage("update")
+    manager.finish()
+    return manager
+
+
+def versions(github, name):
+    return json.loads((github.apps / name / "app.json").read_text())["versions"]
+
+
+def calls(github, method):
+    return [path for command, path, _ in github.calls if command == method]
+
+
+def test_repos_are_batched_and_settled_without_rest(github):
+    for i in range(5):
+        github.add_app(f"app{i}", [release(f"app{i}", "1.1", 2), release(f"app{i}", "1.0", 1)])
+    run(github, graphql_batch_size=2)
+    assert len(calls(github, "POST")) == 3
+    assert calls(github, "GET") == []
+    assert [v["version"] for v in versions(github, "app3")] == ["1.1", "1.0"]
+
+
+def test_partial_errors_fall_back_to_rest_for_failed_repos_only(github):
+    github.add_app("good", [release("good", "2.0", 3)])
+    github.add_app("renamed", [release("renamed", "3.0", 4)])
+    github.graphql_errors.add("renamed")
+    run(github)
+    assert calls(github, "GET") == ["/repos/example/renamed/releases"]
+    assert [v["version"] for v in versions(github, "good")] == ["2.0"]
+    assert [v["version"] for v in versions(github, "renamed")] == ["3.0"]
+
+
+def test_failed_batch_falls_back_to_rest(github):
+    github.add_app("alpha", [release("alpha", "1.0", 1)])
+    github.add_app("beta", [release("beta", "2.0", 2)])
+    github.graphql_status = 502
+    run(github)
+    assert len(calls(github, "POST")) == 1
+    assert sorted(calls(github, "GET")) == ["/repos/example/alpha/releases", "/repos/example/beta/releases"]
+    assert [v["version"] for v in versions(github, "beta")] == ["2.0"]
+
+
+def test_failed_batch_falls_back_to_rest_without_exhausting_the_budget(github):
+    github.add_app("alpha", [release("alpha", "1.0", 1)])
+    github.add_app("beta", [release("beta", "1.0", 1)])
+    github.graphql_status = 403
+    manager = run(github)
+    assert sorted(calls(github, "GET")) == ["/repos/example/alpha/releases", "/repos/example/beta/releases"]
+    assert not manager.scheduler.exhausted
+    assert manager.scheduler.deferred == []
+    assert [v["version"] for v in versions(github, "beta")] == ["1.0"]
+
+
+def test_graphql_rate_limit_headers_stay_out_of_the_rest_scheduler(github):
+    github.add_app("alpha", [release("alpha", "1.0", 1)])
+    manager = run(github)
+    assert len(calls(github, "POST")) == 1
+    assert manager.scheduler.remaining is None
+    assert manager.scheduler.reset is None
+
+
+def test_releases_with_truncated_assets_use_rest(github):
+    github.add_app("many", [release("many", "1.0", 1, assets=GRAPHQL_ASSETS_PER_RELEASE + 1)])
+    github.add_app("few", [release("few", "1.0", 1)])
+    manager = run(github)
+    assert list(manager.prefetched) == ["https://github.com/example/few"]
+    assert calls(github, "GET") == ["/repos/example/many/releases"]
@@ -0,0 +1,94 @@
+import io
+import plistlib
+import zipfile
+
+from conftest import StubHandler
+from ipa_metadata import IPAMetadataExtractor
+from manage_versions import VersionManager
+from version_index import VersionIndex
+
+
+def make_ipa(plist: bytes, payload: bytes = b"\0" * 200_000) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("Payload/Demo.app/Demo", payload, compress_type=zipfile.ZIP_STORED)
+        archive.writestr("Payload/Demo.app/Info.plist", plist, compress_type=zipfile.ZIP_DEFLATED)
+    return buffer.getvalue()
+
+
+INFO = {"CFBundleIdentifier": "com.example.demo", "CFBundleShortVersionString": "1.2",
+        "CFBundleVersion": "42", "MinimumOSVersion": "14.0"}
+FILES = {
+    "/binary.ipa": make_ipa(plistlib.dumps(INFO, fmt=plistlib.FMT_BINARY)),
+    "/xml.ipa": make_ipa(plistlib.dumps(INFO)),
+    "/corrupt-xml.ipa": make_ipa(b'<?xml version="1.0"?><plist version="1.0"><dict><key>CF</key><string>x</dict>'),
+    "/corrupt-binary.ipa": make_ipa(b"bplist00" + b"\xff" * 40),
+    "/not-a-zip.ipa": b"\0" * 50_000,
+}
+
+
+class IPAHandler(StubHandler):
+    def do_GET(self):
+        self.record()
+        if self.path.startswith("/download/"):
+            self.send_body(b"", 302, {"Location": self.path.replace("/download/", "/objects/", 1)})
+        elif self.path.startswith("/objects/") and self.path[len("/objects"):] in FILES:
+            self.send_ranged(FILES[self.path[len("/objects"):]])
+        else:
+            self.send_body(b"", 404)
+
+
+def test_reads_binary_and_xml_plists_through_range_requests(serve, tmp_path):
+    server = serve(IPAHandler)
+    extractor = IPAMetadataExtractor(str(tmp_path / "ipa_metadata.json"), workers=2)
+    urls = [f"{server.url}/download/binary.ipa", f"{server.url}/download/xml.ipa"]
+    results = extractor.extract_many(urls)
+    expected = {"bundleID": "com.example.demo", "shortVersion": "1.2", "buildVersion": "42", "minOSVersion": "14.0"}
+    assert results == {url: expected for url in urls}
+    assert all(call[2].get("Range") for call in server.calls)
+    assert extractor.stats["bytes_read"] < sum(len(FILES[p]) for p in ("/binary.ipa", "/xml.ipa")) / 4
+
+
+def test_corrupt_plists_are_cached_failures(serve, tmp_path):
+    server = serve(IPAHandler)
+    cache_path = str(tmp_path / "ipa_metadata.json")
+    extractor = IPAMetadataExtractor(cache_path, workers=2)
+    urls = [f"{server.url}/download/corrupt-xml.ipa", f"{server.url}/download/corrupt-binary.ipa",
+            f"{server.url}/download/not-a-zip.ipa"]
+    assert extractor.extract_many(urls) == dict.fromkeys(urls)
+    assert extractor.stats["failed"] == 3
+    assert all("error" in extractor.cache[url] for url in urls)
+    assert extractor.save()
+
+    requests_before = len(server.calls)
+    reloaded = IPAMetadataExtractor(cache_path)
+    assert reloaded.extract_many(urls) == dict.fromkeys(urls)
+    assert reloaded.stats["cached"] == 3
+    assert len(server.calls) == requests_before
+
+
+def test_network_errors_are_not_cached(serve, tmp_path):
+    server = serve(IPAHandler)
+    extractor = IPAMetadataExtractor(str(tmp_path / "ipa_metadata.json"))
+    url = f"{server.url}/download/missing.ipa"
+    assert extractor.extract(url) is None
+    assert url not in extractor.cache
+
+
+class FailingExtractor(IPAMetadataExtractor):
+    def extract_many(self, urls):
+        list(urls)
+        raise RuntimeError("boom")
+
+
+def test_metadata_failure_does_not_abort_the_update(monkeypatch, tmp_path):
+    app_dir = tmp_path / "Demo"
+    app_dir.mkdir()
+    (app_dir / "app.json").write_text('{"gitURLs": ["https://github.com/example/demo"], "versions": []}')
+    manager = VersionManager(str(tmp_path), ipa_metadata=FailingExtractor())
+    new = {"version": "1.0", "date": "2024-01-01", "size": 1, "url": "https://example.com/demo.ipa"}
+    monkeypatch.setattr(manager, "_fetch_new_versions",
+                        lambda data, app_dir: {"success": True, "versions": [new], "index": VersionIndex()})
+    manager.manage("update")
+    manager.finish()
+    assert '"https://example.com/demo.ipa"' in (app_dir / "app.json").read_text()
@@ -0,0 +1,124 @@
+import hashlib
+import os
+import random
+
+import pytest
+
+from conftest import StubHandler
+from ipa_mirror import IPAMirror
+
+SIZE = 300_000
+
+
+class DownloadHandler(StubHandler):
+    """Serves server.body with an ETag and Range/If-Range; server.cut_after drops the next response early."""
+
+    def do_GET(self):
+        self.record()
+        body = self.server.body
+        etag = '"%s"' % hashlib.sha1(body).hexdigest()
+        start = 0
+        range_header = self.headers.get("Range", "")
+        if range_header.startswith("bytes=") and self.headers.get("If-Range", etag) == etag:
+            start = int(range_header[len("bytes="):].rstrip("-"))
+            if start >= len(body):
+                self.send_body(b"", 416, {"Content-Range": f"bytes */{len(body)}"})
+                return
+        self.send_response(206 if start else 200)
+        if start:
+            self.send_header("Content-Range", f"bytes {start}-{len(body) - 1}/{len(body)}")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(body) - start))
+        self.end_headers()
+        payload = body[start:]
+        if self.server.cut_after is not None:
+            payload, self.server.cut_after = payload[:self.server.cut_after], None
+            self.close_connection = True
+        self.wfile.write(payload)
+
+
+def content(seed: str, size: int = SIZE) -> bytes:
+    return random.Random(seed).randbytes(size)
+
+
+@pytest.fixture
+def server(serve):
+    server = serve(DownloadHandler)
+    server.body = content("v1")
+    server.cut_after = None
+    return server
+
+
+def ranges(server):
+    return [(headers.get("Range"), headers.get("If-Range")) for _, _, headers in server.calls]
+
+
+def stored(mirror, record) -> bytes:
+    with open(os.path.join(mirror.mirror_dir, record["file"]), "rb") as f:
+        return f.read()
+
+
+def test_interrupted_download_resumes_with_a_range_request(server, tmp_path):
+    url = f"{server.url}/App/1.0/App.ipa"
+    server.cut_after = 100_000
+    mirror = IPAMirror(str(tmp_path / "IPA"))
+    assert mirror.fetch(url) is None
+    assert mirror.stats["resumed"] == 0
+    part_path, _ = mirror._partial_paths(url)
+    partial = os.path.getsize(part_path)
+    # Everything that arrived before the drop, short of the last network read, is kept
+    assert 100_000 - 16 * 1024 <= partial <= 100_000
+
+    mirror = IPAMirror(str(tmp_path / "IPA"))
+    record = mirror.fetch(url)
+    assert stored(mirror, record) == server.body
+    assert record["sha256"] == hashlib.sha256(server.body).hexdigest()
+    assert mirror.stats["resumed"] == 1
+    assert mirror.stats["bytes_downloaded"] == SIZE - partial
+    assert ranges(server)[-1][0] == f"bytes={partial}-"
+    assert not os.path.exists(part_path)
+
+
+def test_changed_file_fails_if_range_and_starts_over(server, tmp_path):
+    url = f"{server.url}/App/1.0/App.ipa"
+    server.cut_after = 100_000
+    mirror = IPAMirror(str(tmp_path / "IPA"))
+    assert mirror.fetch(url) is None
+
+    server.body = content("v2")
+    mirror = IPAMirror(str(tmp_path / "IPA"))
+    record = mirror.fetch(url)
+    assert stored(mirror, record) == server.body
+    assert mirror.stats["resumed"] == 0
+    assert mirror.stats["bytes_downloaded"] == SIZE
+    assert ranges(server)[-1][1] is not None
+
+
+def test_partial_longer_than_the_remote_file_restarts_after_416(server, tmp_path):
+    url = f"{server.url}/App/1.0/App.ipa"
+    server.cut_after = 100_000
+    mirror = IPAMirror(str(tmp_path / "IPA"))
+    assert mirror.fetch(url) is None
+
+    # Same validator, but the partial now reaches past the end of the file
+    part_path, _ = mirror._partial_paths(url)
+    with open(part_path, "ab") as f:
+        f.write(b"\0" * SIZE)
+    partial = os.path.getsize(part_path)
+    mirror = IPAMirror(str(tmp_path / "IPA"))
+    record = mirror.fetch(url)
+    assert stored(mirror, record) == server.body
+    assert mirror.stats["resumed"] == 0
+    assert [range_header for range_header, _ in ranges(server)[-2:]] == [f"bytes={partial}-", None]
+
+
+def test_resume_is_counted_only_once_the_file_verifies(server, tmp_path):
+    url = f"{server.url}/App/1.0/App.ipa"
+    server.cut_after = 100_000
+    mirror = IPAMirror(str(tmp_path / "IPA"))
+    assert mirror.fetch(url) is None
+
+    mirror = IPAMirror(str(tmp_path / "IPA"))
+    assert mirror.fetch(url, expected_sha256="0" * 64) is None
+    assert mirror.stats["resumed"] == 0
+    assert mirror.stats["failed"] == 1
@@ -0,0 +1,33 @@
+import json
+import logging
+
+import json_io
+
+
+def test_write_json_matches_json_dumps_and_replaces_atomically(tmp_path):
+    path = str(tmp_path / "cache" / "state.json")
+    value = {"b": [1, 2.5, "é"], "a": {"nested": None}}
+    written = json_io.write_json(path, value, indent=2, sort_keys=True)
+    raw = (tmp_path / "cache" / "state.json").read_bytes()
+    assert raw == json.dumps(value, indent=2, sort_keys=True).encode()
+    assert written == len(raw)
+    assert not (tmp_path / "cache" / "state.json.tmp").exists()
+    assert json_io.read_json(path) == value
+
+
+def test_failed_write_keeps_the_previous_file(tmp_path):
+    path = tmp_path / "cache.json"
+    path.write_text('{"old": true}')
+    # A directory where the temp file should go makes the write fail before anything is replaced
+    (tmp_path / "cache.json.tmp").mkdir()
+    assert json_io.write_json(str(path), {"new": True}) is None
+    assert json_io.read_json(str(path)) == {"old": True}
+
+
+def test_read_json_missing_and_corrupt_files(tmp_path, caplog):
+    assert json_io.read_json(str(tmp_path / "missing.json")) is None
+    corrupt = tmp_path / "corrupt.json"
+    corrupt.write_bytes(b'{"truncated": ')
+    with caplog.at_level(logging.ERROR):
+        assert json_io.read_json(str(corrupt), logging.getLogger("test"), "test cache") is None
+    assert "Failed to load test cache" in caplog.text
@@ -0,0 +1,89 @@
+import gzip
+import json
+import urllib.request
+
+import pytest
+
+from compile_repository import RepoCompiler
+from conftest import StubHandler
+from serve_feeds import FeedStore, accepts_gzip, make_handler
+
+UPSTREAM = {
+    "name": "Upstream",
+    "apps": [{"name": "Remote", "bundleIdentifier": "com.example.remote", "developerName": "Example",
+              "versions": [{"version": "2.0", "date": "2024-02-01T00:00:00Z", "size": 20,
+                            "downloadURL": "https://example.com/remote.ipa"}]},
+             {"name": "Shadowed", "bundleIdentifier": "com.example.local", "developerName": "Example",
+              "versions": [{"version": "9.9", "date": "2024-02-01T00:00:00Z", "size": 20,
+                            "downloadURL": "https://example.com/shadowed.ipa"}]}],
+}
+
+
+class UpstreamHandler(StubHandler):
+    def do_GET(self):
+        self.record()
+        self.send_body(json.dumps(UPSTREAM).encode(), 200, {"Content-Type": "application/json", "ETag": '"u1"'})
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("gzip", True),
+    ("gzip, deflate, br", True),
+    ("br;q=1.0, gzip;q=0.5", True),
+    ("GZIP; Q=0.1", True),
+    ("gzip;q=0", False),
+    ("gzip; q=0.000, identity", False),
+    ("x-gzip", True),
+    ("*", True),
+    ("*;q=0", False),
+    ("gzip;q=0, *", False),
+    ("deflate, br", False),
+    ("identity", False),
+    ("", False),
+])
+def test_accepts_gzip_honours_q_values(header, expected):
+    assert accepts_gzip(header) is expected
+
+
+@pytest.fixture
+def root(serve, tmp_path):
+    upstream = serve(UpstreamHandler)
+    (tmp_path / "repo-info.json").write_text(json.dumps(
+        {"name": "Test", "upstreams": [{"url": f"{upstream.url}/altstore.json"}]}))
+    app_dir = tmp_path / "Apps" / "Local"
+    app_dir.mkdir(parents=True)
+    (app_dir / "app.json").write_text(json.dumps(
+        {"name": "Local", "bundleID": "com.example.local", "devName": "Example",
+         "versions": [{"version": "1.0", "date": "2024-01-01", "size": 10, "url": "https://example.com/local.ipa"}]}))
+    return tmp_path
+
+
+def test_served_feeds_match_compiled_feeds_with_upstreams(root, tmp_path_factory):
+    output_dir = tmp_path_factory.mktemp("out")
+    assert RepoCompiler(root_dir=str(root), output_dir=str(output_dir)).compile_repos()["success"]
+
+    store = FeedStore(str(root))
+    store.refresh()
+    for name, feed in store.feeds.items():
+        assert feed.body == (output_dir / name).read_bytes()
+    bundle_ids = [app["bundleIdentifier"] for app in json.loads(store.feeds["altstore.json"].body)["apps"]]
+    assert bundle_ids == ["com.example.local", "com.example.remote"]
+
+
+def test_no_upstreams_serves_local_apps_only(root):
+    store = FeedStore(str(root), upstreams=False)
+    store.refresh()
+    bundle_ids = [app["bundleIdentifier"] for app in json.loads(store.feeds["altstore.json"].body)["apps"]]
+    assert bundle_ids == ["com.example.local"]
+
+
+def test_refused_gzip_gets_the_identity_body(root, serve):
+    store = FeedStore(str(root), upstreams=False)
+    store.refresh()
+    server = serve(make_handler(store))
+    feed = store.feeds["altstore.json"]
+    for header, encoding, body in [("gzip;q=0", None, feed.body), ("gzip;q=0.8", "gzip", feed.gzipped)]:
+        request = urllib.request.Request(f"{server.url}/altstore.json", headers={"Accept-Encoding": header})
+        with urllib.request.urlopen(request) as response:
+            assert response.headers.get("Content-Encoding") == encoding
+            assert response.read() == body
+    assert gzip.decompress(feed.gzipped) == feed.body
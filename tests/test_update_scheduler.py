@@ -0,0 +1,77 @@
+import json
+import re
+
+import pytest
+
+from conftest import StubHandler
+from manage_versions import VersionManager
+
+PAGE_PATH = re.compile(r"^/repos/example/([^/]+)/releases(?:\?page=(\d+))?$")
+PAGES = 3
+
+
+class PagedHandler(StubHandler):
+    """REST releases endpoint serving PAGES pages of one release each, linked with Link: rel="next"."""
+
+    def do_GET(self):
+        self.record()
+        match = PAGE_PATH.match(self.path)
+        if not match:
+            self.send_body(b"", 404)
+            return
+        name, page = match.group(1), int(match.group(2) or 1)
+        day = PAGES + 1 - page
+        body = [{"id": day, "tag_name": f"1.{day}", "published_at": f"2024-01-{day:02d}T00:00:00Z",
+                 "assets": [{"name": "app.ipa", "size": 100,
+                             "browser_download_url": f"https://example.com/{name}/1.{day}/app.ipa"}]}]
+        headers = {"Content-Type": "application/json"}
+        if page < PAGES:
+            headers["Link"] = f'<{self.server.url}/repos/example/{name}/releases?page={page + 1}>; rel="next"'
+        self.send_body(json.dumps(body).encode(), 200, headers)
+
+
+@pytest.fixture
+def apps(serve, monkeypatch, tmp_path):
+    server = serve(PagedHandler)
+    monkeypatch.setenv("GITHUB_TOKEN", "test-token")
+    monkeypatch.setenv("GITHUB_API_URL", server.url)
+    for name in ("alpha", "beta", "gamma"):
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "app.json").write_text(json.dumps({"gitURLs": [f"https://github.com/example/{name}"],
+                                                              "versions": []}))
+    server.root = tmp_path
+    return server
+
+
+def run(apps, **options):
+    manager = VersionManager(str(apps.root), max_wait=0, **options)
+    manager.manage("update")
+    manager.finish()
+    return manager
+
+
+def versions(apps, name):
+    return [v["version"] for v in json.loads((apps.root / name / "app.json").read_text())["versions"]]
+
+
+def test_later_pages_are_gated_on_the_budget(apps):
+    manager = run(apps, budget=PAGES + 1)
+    assert len(apps.calls) == PAGES + 1
+    assert manager.scheduler.requests_made == PAGES + 1
+    assert versions(apps, "alpha") == ["1.3", "1.2", "1.1"]
+    assert versions(apps, "beta") == []
+    assert manager.scheduler.deferred == ["beta", "gamma"]
+
+
+@pytest.mark.parametrize("budget", [1, 2, 5, 8])
+def test_concurrent_paging_never_exceeds_the_budget(apps, budget):
+    manager = run(apps, budget=budget, workers=3, full_rescan=True)
+    assert len(apps.calls) <= budget
+    assert manager.scheduler.requests_made == len(apps.calls)
+    assert manager.scheduler.in_flight == 0
+
+
+def test_unlimited_run_pages_every_app_to_the_end(apps):
+    manager = run(apps)
+    assert len(apps.calls) == 3 * PAGES
+    assert manager.scheduler.deferred == []
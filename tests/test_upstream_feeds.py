@@ -0,0 +1,64 @@
+import gzip
+import json
+
+import pytest
+
+from conftest import StubHandler
+from upstream_feeds import UpstreamFeeds
+
+FEED = {
+    "name": "Example",
+    "apps": [{"name": "Demo", "bundleIdentifier": "com.example.demo", "developerName": "Example",
+              "versions": [{"version": "1.0", "date": "2024-01-01T00:00:00Z", "size": 10,
+                            "downloadURL": "https://example.com/demo.ipa"}]}],
+}
+RAW = json.dumps(FEED).encode()
+
+
+class FeedHandler(StubHandler):
+    """Serves the feed normally until server.mode switches it to a broken response."""
+
+    def do_GET(self):
+        self.record()
+        mode = self.server.mode
+        if mode == "ok":
+            self.send_body(gzip.compress(RAW), 200, {"Content-Encoding": "gzip", "ETag": '"v1"'})
+        elif mode == "truncated-gzip":
+            self.send_body(gzip.compress(RAW)[:-12], 200, {"Content-Encoding": "gzip"})
+        elif mode == "mislabelled-gzip":
+            self.send_body(RAW, 200, {"Content-Encoding": "gzip"})
+        elif mode == "incomplete-read":
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(RAW) + 100))
+            self.end_headers()
+            self.wfile.write(RAW[:20])
+            self.close_connection = True
+
+
+@pytest.mark.parametrize("mode", ["truncated-gzip", "mislabelled-gzip", "incomplete-read"])
+def test_broken_responses_fall_back_to_the_cached_feed(serve, tmp_path, mode):
+    server = serve(FeedHandler)
+    server.mode = "ok"
+    upstreams = [{"url": f"{server.url}/altstore.json"}]
+    cache_path = str(tmp_path / "upstreams.json")
+    feeds = UpstreamFeeds(cache_path)
+    apps, _ = feeds.import_apps(upstreams, set())
+    assert [app["bundleID"] for app in apps] == ["com.example.demo"]
+    assert feeds.save()
+
+    server.mode = mode
+    feeds = UpstreamFeeds(cache_path)
+    apps, _ = feeds.import_apps(upstreams, set())
+    assert [app["bundleID"] for app in apps] == ["com.example.demo"]
+    assert feeds.stats["failed"] == 1
+
+
+def test_broken_response_without_cache_imports_nothing(serve):
+    server = serve(FeedHandler)
+    server.mode = "truncated-gzip"
+    feeds = UpstreamFeeds(workers=2)
+    upstreams = [{"url": f"{server.url}/a.json"}, {"url": f"{server.url}/b.json"}]
+    apps, digests = feeds.import_apps(upstreams, set())
+    assert apps == []
+    assert len(digests) == 2
+    assert feeds.stats["failed"] == 2
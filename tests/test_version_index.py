@@ -0,0 +1,138 @@
+from manage_versions import VersionManager
+from version_index import VersionIndex, version_key
+
+
+def version(number, url, date='2024-11-23', size=1):
+    return {'version': number, 'date': date, 'size': size, 'url': url}
+
+
+def test_version_key_orders_numerically_and_ignores_trailing_zeros():
+    assert version_key('1.10') > version_key('1.9')
+    assert version_key('v1.0') == version_key('1.0.0')
+    assert version_key('1.2.rc1') < version_key('1.2')
+    assert version_key('nightly') < version_key('0.1')
+
+
+def test_same_version_assets_with_different_urls_are_kept():
+    index = VersionIndex([
+        version('6.0.2', 'https://example.com/PureKFD.ipa'),
+        version('6.0.2', 'https://example.com/PureKFD.noSparse.ipa'),
+        version('6.0.2', 'https://example.com/PureKFD.ipa'),
+    ])
+    assert len(index) == 2
+    assert index.duplicates == 1
+    assert [v['url'] for v in index.newest()] == ['https://example.com/PureKFD.ipa',
+                                                  'https://example.com/PureKFD.noSparse.ipa']
+
+
+def test_find_matches_url_or_normalized_version_and_date():
+    index = VersionIndex([version('v2.0', 'https://example.com/a.ipa')])
+    assert index.find(url='https://example.com/a.ipa')
+    assert index.find(version='2.0.0')
+    assert index.find(url='https://example.com/b.tipa', version='2.0.0', date='2024-11-23')
+    assert index.find(url='https://example.com/b.tipa', version='2.0.0', date='2024-12-01') is None
+    assert index.find(url='https://example.com/b.tipa', version='2.1', date='2024-11-23') is None
+
+
+def test_newest_orders_by_version_then_date():
+    index = VersionIndex([
+        version('1.9', 'https://example.com/1.9.ipa', date='2024-03-01'),
+        version('1.10', 'https://example.com/1.10.ipa', date='2024-02-01'),
+        version('1.10.1', 'https://example.com/1.10.1.ipa', date='2024-02-01'),
+    ])
+    assert [v['version'] for v in index.newest(2)] == ['1.10.1', '1.10']
+
+
+def test_rolling_tag_ranks_by_release_date():
+    index = VersionIndex([
+        version('nightly', 'https://example.com/nightly.ipa', date='2025-04-08'),
+        version('3.3.1', 'https://example.com/3.3.1.ipa', date='2025-03-16'),
+        version('3.3.0', 'https://example.com/3.3.0.ipa', date='2025-03-14'),
+        version('3.2.0', 'https://example.com/3.2.0.ipa', date='2025-01-15'),
+    ])
+    assert [v['version'] for v in index.newest()] == ['nightly', '3.3.1', '3.3.0', '3.2.0']
+    assert [v['version'] for v in index.newest(2)] == ['nightly', '3.3.1']
+
+    index.add(version('3.4.0', 'https://example.com/3.4.0.ipa', date='2025-05-01'))
+    index.add(version('latest', 'https://example.com/latest.ipa', date='2024-12-01'))
+    assert [v['version'] for v in index.newest()] == ['3.4.0', 'nightly', '3.3.1', '3.3.0', '3.2.0', 'latest']
+    assert [v['version'] for v in index.newest(3)] == ['3.4.0', 'nightly', '3.3.1']
+
+
+class FakeStore:
+    def __init__(self):
+        self.dirty = []
+
+    def mark_dirty(self, name):
+        self.dirty.append(name)
+
+
+class FakeEntry:
+    def __init__(self, data):
+        self.name = 'PureKFD'
+        self.dir = '.'
+        self.data = data
+
+
+def manager_with(monkeypatch, tmp_path, fetched):
+    manager = VersionManager(str(tmp_path), keep_versions=10)
+    manager.store = FakeStore()
+
+    def fake_fetch(data, app_dir):
+        return {'success': True, 'versions': fetched, 'index': VersionIndex(data['versions'])}
+
+    monkeypatch.setattr(manager, '_fetch_new_versions', fake_fetch)
+    return manager
+
+
+def test_update_without_new_versions_leaves_config_untouched(monkeypatch, tmp_path):
+    versions = [
+        version('6.0.2', 'https://example.com/PureKFD.ipa'),
+        version('6.0.2', 'https://example.com/PureKFD.noSparse.ipa'),
+        version('6.0.2', 'https://example.com/PureKFD.ipa'),
+    ]
+    entry = FakeEntry({'gitURLs': ['https://github.com/Lrdsnow/PureKFD'], 'versions': list(versions)})
+    manager = manager_with(monkeypatch, tmp_path, [])
+    manager._process_versions(entry, update=True)
+    assert entry.data['versions'] == versions
+    assert manager.store.dirty == []
+
+
+def test_update_keeps_same_version_variants(monkeypatch, tmp_path):
+    versions = [
+        version('6.0.2', 'https://example.com/PureKFD.ipa'),
+        version('6.0.2', 'https://example.com/PureKFD.noSparse.ipa'),
+    ]
+    new = version('6.0.3', 'https://example.com/6.0.3/PureKFD.ipa', date='2024-12-01')
+    entry = FakeEntry({'gitURLs': ['https://github.com/Lrdsnow/PureKFD'], 'versions': list(versions)})
+    manager = manager_with(monkeypatch, tmp_path, [new])
+    manager._process_versions(entry, update=True)
+    assert entry.data['versions'] == [new] + versions
+    assert manager.store.dirty == ['PureKFD']
+
+
+def release(tag, date, *names):
+    return {'tag_name': tag, 'published_at': f'{date}T00:00:00Z',
+            'assets': [{'name': name, 'size': 1, 'browser_download_url': f'https://example.com/{date}/{name}'}
+                       for name in names]}
+
+
+def scan_releases(tmp_path, versions, releases):
+    manager = VersionManager(str(tmp_path), keep_versions=10)
+    scan = {'rules': manager.rules.load(str(tmp_path)), 'index': VersionIndex(versions), 'versions': {},
+            'mark': None, 'newest': None, 'seen': set()}
+    return manager._scan_releases(releases, scan), scan['versions']
+
+
+def test_republished_rolling_tag_is_a_new_release(tmp_path):
+    known = [version('nightly', 'https://example.com/2025-04-08/App.ipa', date='2025-04-08')]
+    done, found = scan_releases(tmp_path, known, [release('nightly', '2025-04-20', 'App.ipa')])
+    assert not done
+    assert [v['url'] for v in found.values()] == ['https://example.com/2025-04-20/App.ipa']
+
+
+def test_release_known_by_one_asset_stops_the_scan(tmp_path):
+    known = [version('3.3.1', 'https://example.com/2025-03-16/App.ipa', date='2025-03-16')]
+    done, found = scan_releases(tmp_path, known, [release('3.3.1', '2025-03-16', 'App.tipa', 'App.ipa')])
+    assert done
+    assert found == {}